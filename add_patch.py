@@ -1,33 +1,39 @@
 #!/usr/bin/env python3
 """
 Add new patch to Better Chromium
-Usage: ./add_patch.py <patch-file> [patch-name]
+Usage: ./add_patch.py <patch-file> [patch-name] [--profile NAME]
 """
 
+import argparse
 import sys
 import shutil
 from pathlib import Path
 
+from build_profiles import add_profile_argument, load_profile
+from impact_index import SRC_DIR, print_patch_estimates
+
 
 def main():
     """Add a patch to the patch series."""
-    if len(sys.argv) < 2:
-        print("Usage: ./add_patch.py <patch-file> [optional-name]")
-        print()
-        print("Example:")
-        print("  ./add_patch.py /path/to/my.patch")
-        print("  ./add_patch.py /path/to/my.patch my-feature")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(
+        description="Add a patch to the series",
+        epilog="Example: ./add_patch.py /path/to/my.patch my-feature",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("patch_file", type=Path, help="patch to add")
+    parser.add_argument("name", nargs="?", help="name in patches/ (default: the file name)")
+    add_profile_argument(parser)
+    args = parser.parse_args()
     
     script_dir = Path(__file__).parent.resolve()
     patches_dir = script_dir / "patches"
     series_file = patches_dir / "series"
     
-    patch_file = Path(sys.argv[1])
+    patch_file = args.patch_file
     
     # Determine patch name
-    if len(sys.argv) >= 3:
-        patch_name = sys.argv[2]
+    if args.name:
+        patch_name = args.name
     else:
         patch_name = patch_file.name
     
@@ -66,8 +72,14 @@ def main():
             f.write(f"# Quilt patch series\n\n{patch_name}\n")
         print(f"✓ Created series file with patch")
     
+    # Show how much of the build this patch will invalidate
+    print()
+    print("Estimated rebuild cost:")
+    out_dir = SRC_DIR / load_profile(args.profile).out_dir
+    print_patch_estimates(out_dir, [patch_name], patches_dir)
+    
     print()
-    print("Now run: ./quick_rebuild.py")
+    print("Now run: ./quick_rebuild.py (--dry-run to preview)")
 
 
 if __name__ == "__main__":
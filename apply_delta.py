@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Apply a Better Chromium delta release to an installed tree
+Checks every file of the installed release against the hashes the delta
+was made from, rebuilds changed files with zstd --patch-from, checks the
+results against the new release's hashes and only then swaps them in.
+Needs nothing but Python and zstd, so it can run on any installed machine.
+
+Usage: ./apply_delta.py <delta.tar> <better-chromium dir>
+"""
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tarfile
+import tempfile
+from pathlib import Path
+
+from integrity import hash_files
+
+DELTA_FORMAT = 1
+
+
+def mismatches(root, expected):
+    """Return the names under root whose SHA-256 differs from expected."""
+    return sorted(
+        name for name, digests in hash_files(root, expected)
+        if digests is None or digests["sha256"] != expected[name]
+    )
+
+
+def _safe_name(name):
+    return not name.startswith("/") and ".." not in name.split("/")
+
+
+def apply_delta(delta_path, install_dir):
+    """Update install_dir in place; return True on success."""
+    with tempfile.TemporaryDirectory(prefix="better-chromium-apply-") as tmp:
+        tmp = Path(tmp)
+        content = tmp / "delta"
+        with tarfile.open(delta_path) as tar:
+            for member in tar:
+                if member.isfile() and _safe_name(member.name):
+                    target = content / member.name
+                    target.parent.mkdir(parents=True, exist_ok=True)
+                    with tar.extractfile(member) as src, open(target, "wb") as out:
+                        shutil.copyfileobj(src, out)
+        delta = json.loads((content / "delta.json").read_text())
+        if delta["format"] != DELTA_FORMAT:
+            print(f"❌ Unsupported delta format {delta['format']}")
+            return False
+        names = delta["patched"] + delta["added"] + delta["deleted"]
+        if not all(_safe_name(name) for name in names):
+            print("❌ Delta names files outside the install directory")
+            return False
+
+        # The delta only reproduces the new release from the exact old one
+        print(f"Verifying {len(delta['from'])} installed files...")
+        bad = mismatches(install_dir, delta["from"])
+        if bad:
+            print("❌ Installed files do not match the release this delta was made from:")
+            for name in bad[:20]:
+                print(f"  {name}")
+            return False
+
+        print(f"Rebuilding {len(delta['patched'])} changed and {len(delta['added'])} new files...")
+        # Stage next to the install so the final renames are atomic
+        staged = install_dir / ".delta-staging"
+        shutil.rmtree(staged, ignore_errors=True)
+        for name in delta["patched"]:
+            target = staged / name
+            target.parent.mkdir(parents=True, exist_ok=True)
+            subprocess.run([
+                "zstd", "-q", "-d", "-f", f"--long={delta['window_log'][name]}",
+                f"--patch-from={install_dir / name}",
+                str(content / "patches" / f"{name}.zst"), "-o", str(target),
+            ], check=True)
+        for name in delta["added"]:
+            target = staged / name
+            target.parent.mkdir(parents=True, exist_ok=True)
+            subprocess.run([
+                "zstd", "-q", "-d", "-f", str(content / "files" / f"{name}.zst"), "-o", str(target),
+            ], check=True)
+
+        bad = mismatches(staged, {name: delta["to"][name] for name in delta["patched"] + delta["added"]})
+        if bad:
+            print("❌ Rebuilt files do not match the new release, nothing was changed:")
+            for name in bad[:20]:
+                print(f"  {name}")
+            shutil.rmtree(staged)
+            return False
+
+        for name in delta["patched"] + delta["added"]:
+            target = install_dir / name
+            target.parent.mkdir(parents=True, exist_ok=True)
+            (staged / name).chmod(delta["modes"][name])
+            os.replace(staged / name, target)
+        for name in delta["deleted"]:
+            (install_dir / name).unlink(missing_ok=True)
+        shutil.rmtree(staged)
+
+    print(f"✓ Updated {install_dir}: {len(delta['patched'])} patched, "
+          f"{len(delta['added'])} added, {len(delta['deleted'])} removed")
+    return True
+
+
+def main():
+    """Apply a delta release."""
+    if len(sys.argv) != 3:
+        print("Usage: ./apply_delta.py <delta.tar> <better-chromium dir>")
+        sys.exit(1)
+    if shutil.which("zstd") is None:
+        print("❌ zstd is required to apply deltas")
+        sys.exit(1)
+    try:
+        ok = apply_delta(Path(sys.argv[1]), Path(sys.argv[2]))
+    except (OSError, ValueError, KeyError, tarfile.TarError, subprocess.CalledProcessError) as e:
+        print(f"❌ Could not apply delta: {e}")
+        ok = False
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,59 @@
 #!/usr/bin/env python3
 """
 Better Chromium Build Script
-Handles full Chromium build with quilt patch management
+Handles full Chromium build with quilt-compatible patch management
 Following official Chromium build instructions:
 https://chromium.googlesource.com/chromium/src/+/HEAD/docs/linux/build_instructions.md
 """
 
+import argparse
 import os
+import pprint
 import sys
 import subprocess
+import re
 import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-import multiprocessing
+
+from build_profiles import add_profile_argument, content_args, load_profiles, profile_args
+from build_stages import run_stages, stage
+from build_stats import log_offset, print_summary, record_build
+from deps_trim import TRIM_ENABLED, all_profiles, gclient_overrides, measure_excluded, record_timing
+from fingerprint import compute_fingerprint, save_fingerprint
+from compile_cache import print_build_report, read_stats
+from job_scheduler import MACHINE_GN_ARGS, gn_job_args, run_ninja, split_jobs
+from patch_series import hash_file, series_hashes
+from patching import apply_series
+from source_cache import (
+    CACHE_DIR, CACHE_ENABLED, cache_env, clone_from_cache, gclient_config, sync_args,
+)
+from source_tarball import expected_sha256, extract_tarball, tarball_location
 
 # Configuration
 SCRIPT_DIR = Path(__file__).parent.resolve()
 PATCHES_DIR = SCRIPT_DIR / "patches"
 CHROMIUM_DIR = SCRIPT_DIR / "chromium-src"
 DEPOT_TOOLS_DIR = SCRIPT_DIR / "depot_tools"
-OUT_DIR = "out/Default"
+CHROMIUM_VERSION = "144.0.7521.1"
+
+# Arch Linux build dependencies
+PACKAGES = [
+    "python", "perl", "gcc", "gcc-libs", "bison", "flex", "gperf", "pkgconfig",
+    "nss", "alsa-lib", "glib2", "gtk3", "nspr", "freetype2", "cairo", "dbus",
+    "xorg-server-xvfb", "xorg-xdpyinfo", "ninja", "git", "libxss", "libxtst",
+    "libgnome-keyring", "cups", "libpulse", "ttf-liberation", "xdg-utils",
+    "mesa", "libva", "libvdpau", "libxslt", "libexif", "libxrandr", "libxt",
+    "libxcb", "libxkbcommon", "libxkbfile", "libxinerama", "libxi", "libxext",
+    "libxfixes", "libxdamage", "at-spi2-core", "imagemagick", "quilt",
+    "ccache"
+]
+
+DEPOT_TOOLS_URL = "https://chromium.googlesource.com/chromium/tools/depot_tools.git"
+CHROMIUM_URL = "https://chromium.googlesource.com/chromium/src.git"
+
+TARGET_OS = ["linux"]
 
 # Disable depot_tools auto-update to avoid rate limiting
 os.environ["DEPOT_TOOLS_UPDATE"] = "0"
@@ -53,17 +88,7 @@ def install_dependencies():
     """Install build dependencies for Arch Linux."""
     print("Installing build dependencies...")
     
-    packages = [
-        "python", "perl", "gcc", "gcc-libs", "bison", "flex", "gperf", "pkgconfig",
-        "nss", "alsa-lib", "glib2", "gtk3", "nspr", "freetype2", "cairo", "dbus",
-        "xorg-server-xvfb", "xorg-xdpyinfo", "ninja", "git", "libxss", "libxtst",
-        "libgnome-keyring", "cups", "libpulse", "ttf-liberation", "xdg-utils",
-        "mesa", "libva", "libvdpau", "libxslt", "libexif", "libxrandr", "libxt",
-        "libxcb", "libxkbcommon", "libxkbfile", "libxinerama", "libxi", "libxext",
-        "libxfixes", "libxdamage", "at-spi2-core", "imagemagick", "quilt"
-    ]
-    
-    cmd = ["sudo", "pacman", "-Syu", "--needed", "--noconfirm"] + packages
+    cmd = ["sudo", "pacman", "-Syu", "--needed", "--noconfirm"] + PACKAGES
     run_command(cmd)
     print("✓ Dependencies installed")
 
@@ -74,7 +99,7 @@ def setup_depot_tools():
         print("Cloning depot_tools...")
         cmd = [
             "git", "clone", "--depth=1",
-            "https://chromium.googlesource.com/chromium/tools/depot_tools.git",
+            DEPOT_TOOLS_URL,
             str(DEPOT_TOOLS_DIR)
         ]
         result = run_command(cmd, check=False)
@@ -84,66 +109,112 @@ def setup_depot_tools():
         print("✓ depot_tools cloned successfully")
     else:
         print("✓ depot_tools already exists")
-    
-    # Add depot_tools to PATH
-    os.environ["PATH"] = f"{DEPOT_TOOLS_DIR}:{os.environ['PATH']}"
 
 
-def fetch_chromium():
-    """Fetch Chromium source code."""
+def gclient_content():
+    """Return the .gclient: the src solution, trimmed for every profile's gn args."""
+    custom_deps, custom_vars, custom_hooks = gclient_overrides(all_profiles())
+    solution = {
+        "name": "src",
+        "url": CHROMIUM_URL,
+        "managed": False,
+        "custom_deps": custom_deps,
+        "custom_vars": custom_vars,
+        "custom_hooks": custom_hooks,
+    }
+    return (
+        f"solutions = {pprint.pformat([solution], sort_dicts=False)}\n"
+        f"target_os = {TARGET_OS!r}\n"
+        + gclient_config()
+    )
+
+
+def sync_dependencies():
+    """Run gclient sync for the checked out version, timing it for the trim report."""
+    print(f"Syncing dependencies for version {CHROMIUM_VERSION}...")
+    # Size up excluded deps an untrimmed sync left, before -D removes them
+    measure_excluded()
+    start = time.monotonic()
+    # Several dependencies are fetched at a time
+    run_command(["gclient", "sync", "--no-history", "-D"] + sync_args(), cwd=CHROMIUM_DIR)
+    record_timing("sync", time.monotonic() - start)
+    if not TRIM_ENABLED:
+        measure_excluded()
+
+
+def bootstrap_from_tarball(source, sha256=None):
+    """Unpack a release source tarball into src/, in place of git and gclient sync."""
+    location = tarball_location(source, CHROMIUM_VERSION)
+    print(f"Bootstrapping Chromium {CHROMIUM_VERSION} from {location}...")
+    try:
+        digest = expected_sha256(location, sha256)
+        size, seconds = extract_tarball(location, CHROMIUM_DIR / "src", digest)
+    except (OSError, ValueError) as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    print(f"✓ Verified and unpacked {size / 1024 ** 2:.0f} MiB in {seconds:.0f}s "
+          f"({size / 1024 ** 2 / max(seconds, 1e-6):.0f} MiB/s)")
+
+
+def fetch_chromium(source_tarball=None, source_sha256=None):
+    """Fetch Chromium source code, from git or a release source tarball."""
     CHROMIUM_DIR.mkdir(parents=True, exist_ok=True)
     
+    # Keep .gclient current so hooks pick up changed custom_vars
+    gclient_file = CHROMIUM_DIR / ".gclient"
+    content = gclient_content()
+    changed = not gclient_file.exists() or gclient_file.read_text() != content
+    gclient_file.write_text(content)
+    
     src_dir = CHROMIUM_DIR / "src"
-    if not src_dir.exists():
-        print("Fetching Chromium source for version 144.0.7521.1 (shallow clone)...")
-        print("This will take a while but only downloads the specific version...")
+    if not src_dir.exists() and source_tarball:
+        # The tarball already contains every dependency, so there is nothing to sync
+        bootstrap_from_tarball(source_tarball, source_sha256)
+    elif not src_dir.exists():
+        if CACHE_ENABLED:
+            # Version bumps and new workspaces only download what the cache lacks
+            print(f"Fetching Chromium {CHROMIUM_VERSION} through the git cache at {CACHE_DIR}...")
+            try:
+                clone_from_cache(CHROMIUM_URL, CHROMIUM_VERSION, src_dir)
+            except (ValueError, subprocess.CalledProcessError) as e:
+                print(f"❌ {e}")
+                sys.exit(1)
+            print("✓ Chromium source checked out from the cache")
+        else:
+            print(f"Fetching Chromium source for version {CHROMIUM_VERSION} (shallow clone)...")
+            print("This will take a while but only downloads the specific version...")
+            
+            # Shallow clone just the specific tag
+            src_dir.mkdir(parents=True, exist_ok=True)
+            print(f"Cloning Chromium at tag {CHROMIUM_VERSION} (shallow)...")
+            run_command([
+                "git", "clone", 
+                "--depth=1", 
+                "--branch", CHROMIUM_VERSION,
+                "--single-branch",
+                CHROMIUM_URL,
+                "."
+            ], cwd=src_dir)
+            print("✓ Chromium source cloned (shallow)")
         
-        # Create .gclient file for gclient sync
-        os.chdir(CHROMIUM_DIR)
-        gclient_content = """solutions = [
-  {
-    "name": "src",
-    "url": "https://chromium.googlesource.com/chromium/src.git",
-    "managed": False,
-    "custom_deps": {},
-    "custom_vars": {},
-  },
-]
-target_os = ["linux"]
-"""
-        with open(".gclient", "w") as f:
-            f.write(gclient_content)
-        
-        # Shallow clone just the specific tag
-        src_dir.mkdir(parents=True, exist_ok=True)
-        os.chdir(src_dir)
-        print("Cloning Chromium at tag 144.0.7521.1 (shallow)...")
-        run_command([
-            "git", "clone", 
-            "--depth=1", 
-            "--branch", "144.0.7521.1",
-            "--single-branch",
-            "https://chromium.googlesource.com/chromium/src.git",
-            "."
-        ])
-        print("✓ Chromium source cloned (shallow)")
-        
-        # Sync dependencies for this specific version
-        print("Syncing dependencies for version 144.0.7521.1...")
-        os.chdir(CHROMIUM_DIR)
-        run_command(["gclient", "sync", "--no-history", "-D"])
+        sync_dependencies()
+    elif changed and (src_dir / ".git").exists():
+        # Apply a changed trim: fetch newly needed deps, delete excluded ones
+        print("✓ Chromium source already exists, but its dependency set changed")
+        sync_dependencies()
+    elif changed:
+        # A tree unpacked from a tarball has no git checkouts for gclient to sync
+        print("✓ Chromium source already exists (from a source tarball)")
+        print("⚠ Its dependency set changed, but only gclient checkouts can be synced;")
+        print(f"  remove {src_dir} and rerun with --source-tarball to re-bootstrap "
+              f"from the {CHROMIUM_VERSION} tarball")
     else:
         print("✓ Chromium source already exists")
-        os.chdir(src_dir)
 
 
 def apply_patches_with_quilt():
-    """Apply patches using quilt."""
+    """Apply patches into a quilt-compatible .pc stack."""
     src_dir = CHROMIUM_DIR / "src"
-    os.chdir(src_dir)
-    
-    # Set up quilt environment
-    os.environ["QUILT_PATCHES"] = str(PATCHES_DIR)
     
     # Check if patches exist
     series_file = PATCHES_DIR / "series"
@@ -151,30 +222,22 @@ def apply_patches_with_quilt():
         print("⚠ No patches/series file found, skipping patch application")
         return
     
-    # Check if any patches have been applied already
-    result = run_command(["quilt", "applied"], check=False)
-    if result.returncode == 0:
-        print("Patches already applied, popping all...")
-        run_command(["quilt", "pop", "-a"], check=False)
-    
-    # Apply all patches
-    print("Applying patches with quilt...")
-    result = run_command(["quilt", "push", "-a"], check=False)
-    
-    if result.returncode == 0:
+    # Re-apply only the patches that changed since they were last pushed
+    print("Applying patches...")
+    if apply_series(src_dir, PATCHES_DIR):
         print("✓ All patches applied successfully")
-    elif result.returncode == 2:
-        print("✓ Some patches already applied or no patches to apply")
     else:
-        print("⚠ Warning: Some patches may have failed to apply")
+        print("❌ Fix or refresh the failing patches and rerun")
+        sys.exit(1)
 
 
 def run_gclient_hooks():
     """Run gclient hooks."""
     print("Running gclient hooks...")
     src_dir = CHROMIUM_DIR / "src"
-    os.chdir(src_dir)
-    run_command(["gclient", "runhooks"])
+    start = time.monotonic()
+    run_command(["gclient", "runhooks"], cwd=src_dir)
+    record_timing("hooks", time.monotonic() - start)
     print("✓ Hooks completed")
 
 
@@ -183,101 +246,185 @@ def ensure_depot_tools_ready():
     print("Ensuring depot_tools is initialized...")
     depot_tools_bootstrap = DEPOT_TOOLS_DIR / "ensure_bootstrap"
     if depot_tools_bootstrap.exists():
-        os.chdir(DEPOT_TOOLS_DIR)
-        run_command([str(depot_tools_bootstrap)])
+        run_command([str(depot_tools_bootstrap)], cwd=DEPOT_TOOLS_DIR)
         print("✓ depot_tools initialized")
 
 
-def configure_build():
-    """Configure build with gn."""
-    print("Configuring build with optimized flags...")
+def build_args(out_path, profile):
+    """Return the profile's gn args plus the machine-specific link pool."""
+    return profile_args(profile) + gn_job_args(out_path)
+
+
+def args_gn_matches(out_path, args):
+    """Check whether out_path/args.gn sets exactly these args.
+
+    Machine-sized args are left out: they follow free memory and job
+    history, and regenerating for them alone would invalidate the build.
+    """
+    try:
+        text = (out_path / "args.gn").read_text()
+    except OSError:
+        return False
+    current = dict(re.findall(r'(\w+)\s*=\s*("[^"]*"|\S+)', text))
+    wanted = dict(arg.split("=", 1) for arg in args)
+    for key in MACHINE_GN_ARGS:
+        current.pop(key, None)
+        wanted.pop(key, None)
+    return current == wanted
+
+
+def configure_build(profile):
+    """Configure the profile's out directory with gn if its args changed."""
     src_dir = CHROMIUM_DIR / "src"
-    os.chdir(src_dir)
-    
-    build_args = [
-        # Build type
-        "is_debug=false",
-        
-        # Optimization
-        "is_component_build=false",
-        "symbol_level=0",
-        "blink_symbol_level=0",
-        "enable_nacl=false",
-        
-        # Linker optimization
-        "use_mold=true",
-        
-        # Security (disable for faster builds)
-        "is_cfi=false",
-        
-        # Disable unnecessary features
-        "enable_resource_allowlist_generation=false",
-        "enable_precompiled_headers=false",
-        
-        # Compiler optimizations
-        "optimize_webui=true",
-        "enable_iterator_debugging=false",
-        
-        # Remove dev/test features
-        "remove_webcore_debug_symbols=true",
-        "enable_reading_list=false",
-        "enable_service_discovery=false",
-        "enable_hangout_services_extension=false",
-        
-        # Performance
-        "use_remoteexec=false",
-        "enable_print_preview=true",
-        
-        # JavaScript optimization
-        "v8_symbol_level=0",
-        "v8_enable_debugging_features=false",
-    ]
+    out_path = src_dir / profile.out_dir
+    args = build_args(out_path, profile)
+    if args_gn_matches(out_path, args) and (out_path / "build.ninja").exists():
+        print(f"✓ {profile.out_dir} already configured for {profile.name}")
+        return
     
-    args_str = " ".join(build_args)
-    cmd = ["gn", "gen", OUT_DIR, f"--args={args_str}"]
-    run_command(cmd)
+    print(f"Configuring {profile.out_dir} for the {profile.name} profile...")
+    cmd = ["gn", "gen", profile.out_dir, f"--args={' '.join(args)}"]
+    run_command(cmd, cwd=src_dir)
     print("✓ Build configured")
 
 
-def build_chromium():
-    """Build Chromium with ninja."""
-    print("Building Chromium...")
+def build_profile(profile, jobs=None, label=None):
+    """Build one profile's out directory and return ninja's exit code."""
+    out_path = CHROMIUM_DIR / "src" / profile.out_dir
+    fingerprint = compute_fingerprint(CHROMIUM_VERSION, content_args(profile))
+    offset = log_offset(out_path)
+    returncode = run_ninja(out_path, ["chrome"], jobs=jobs, label=label)
+    record_build(out_path, offset, fingerprint, returncode)
+    if returncode == 0:
+        save_fingerprint(out_path, fingerprint)
+    return returncode
+
+
+def run_builds(profiles):
+    """Build every profile, concurrently when there are several; return {name: exit code}."""
     src_dir = CHROMIUM_DIR / "src"
-    os.chdir(src_dir)
+    if len(profiles) == 1:
+        print(f"Building Chromium ({profiles[0].name})...")
+        return {profiles[0].name: build_profile(profiles[0])}
 
-    cpu_count = multiprocessing.cpu_count()
+    # Split the machine between the variants instead of each taking all of it.
+    # Generated sources are not shared: each out dir's gen/ follows its own gn
+    # args, so codegen runs per variant. Compiles run from the out dir with
+    # relative paths, so a generated file both variants produce identically
+    # hits the shared ccache and is only compiled once.
+    print(f"Building {len(profiles)} variants from one source tree...")
+    out_paths = {p.name: src_dir / p.out_dir for p in profiles}
+    jobs = split_jobs(list(out_paths.values()), ["chrome"])
+    cache_before = read_stats()
+    with ThreadPoolExecutor(max_workers=len(profiles)) as pool:
+        futures = {
+            p.name: pool.submit(build_profile, p, jobs[out_paths[p.name]], p.name)
+            for p in profiles
+        }
+        results = {name: future.result() for name, future in futures.items()}
+    print_build_report(cache_before, read_stats())
+    return results
 
-    num_jobs = cpu_count * 2
-    
-    print(f"Building with {num_jobs} parallel jobs...")
+
+def build_chromium(profiles):
+    """Build Chromium for every profile, concurrently when there are several."""
+    src_dir = CHROMIUM_DIR / "src"
+    results = run_builds(profiles)
     
-    cmd = ["ninja", "-C", OUT_DIR, f"-j{num_jobs}", "chrome"]
-    run_command(cmd)
+    for profile in profiles:
+        if len(profiles) > 1:
+            print(f"\n{profile.name}:")
+        print_summary(src_dir / profile.out_dir)
+    failed = {name: code for name, code in results.items() if code != 0}
+    if failed:
+        for name, code in failed.items():
+            print(f"❌ {name} failed with exit code {code}")
+        sys.exit(next(iter(failed.values())))
     
-    binary_path = src_dir / OUT_DIR / "chrome"
     print()
     print("=" * 48)
     print("Chromium build complete!")
-    print(f"Binary location: {binary_path}")
-    print(f"Run with: {binary_path}")
+    for profile in profiles:
+        print(f"Binary location: {src_dir / profile.out_dir / 'chrome'}")
     print("=" * 48)
 
 
+def parse_args():
+    """Parse command line options."""
+    parser = argparse.ArgumentParser(description="Full Better Chromium build")
+    parser.add_argument(
+        "--force", action="store_true",
+        help="run every stage even if its inputs are unchanged",
+    )
+    parser.add_argument(
+        "--source-tarball", metavar="PATH|URL",
+        default=os.environ.get("BETTER_CHROMIUM_SOURCE_TARBALL"),
+        help="set up a fresh checkout from a release source tarball (file, directory "
+             "or mirror URL) instead of git and gclient sync",
+    )
+    parser.add_argument(
+        "--source-sha256", metavar="HEX",
+        help="expected SHA-256 of the source tarball (default: its .hashes file)",
+    )
+    add_profile_argument(parser, multiple=True)
+    return parser.parse_args()
+
+
 def main():
     """Main build orchestration."""
+    args = parse_args()
+    profiles = load_profiles(args.profiles)
+    
     print("=" * 48)
     print("Better Chromium - Full Build")
     print("=" * 48)
     print()
     
-    install_dependencies()
-    setup_depot_tools()
-    fetch_chromium()
-    apply_patches_with_quilt()
-    run_gclient_hooks()
-    ensure_depot_tools_ready()
-    configure_build()
-    build_chromium()
+    # depot_tools must be on PATH whether or not its stage runs
+    os.environ["PATH"] = f"{DEPOT_TOOLS_DIR}:{os.environ['PATH']}"
+    # Every git, gclient and cipd fetch reads through the shared cache
+    os.environ.update(cache_env())
+    
+    src_dir = CHROMIUM_DIR / "src"
+    stages = [
+        # sudo may prompt for a password, so nothing runs alongside it
+        stage("install_dependencies", install_dependencies,
+              inputs=lambda: PACKAGES, exclusive=True),
+        stage("setup_depot_tools", setup_depot_tools,
+              inputs=lambda: [DEPOT_TOOLS_URL],
+              outputs=lambda: [DEPOT_TOOLS_DIR]),
+        stage("ensure_depot_tools_ready", ensure_depot_tools_ready,
+              deps=["setup_depot_tools"],
+              inputs=lambda: [hash_file(DEPOT_TOOLS_DIR / "ensure_bootstrap")]),
+        stage("fetch_chromium",
+              lambda: fetch_chromium(args.source_tarball, args.source_sha256),
+              deps=["install_dependencies", "setup_depot_tools"],
+              inputs=lambda: [CHROMIUM_VERSION, gclient_content()],
+              outputs=lambda: [src_dir / "DEPS"]),
+        stage("apply_patches", apply_patches_with_quilt,
+              deps=["fetch_chromium"],
+              inputs=lambda: series_hashes(PATCHES_DIR),
+              outputs=lambda: [src_dir / ".pc" / "applied-patches"]),
+        stage("run_gclient_hooks", run_gclient_hooks,
+              deps=["apply_patches", "ensure_depot_tools_ready"],
+              inputs=lambda: [hash_file(src_dir / "DEPS")]),
+    ]
+    for profile in profiles:
+        out_path = src_dir / profile.out_dir
+        stages.append(stage(
+            f"configure_build-{profile.name}",
+            lambda profile=profile: configure_build(profile),
+            deps=["run_gclient_hooks"],
+            inputs=lambda profile=profile: profile_args(profile),
+            outputs=lambda out_path=out_path: [out_path / "args.gn", out_path / "build.ninja"],
+        ))
+    # ninja does its own up-to-date checks, so always hand it the build
+    stages.append(stage(
+        "build_chromium", lambda: build_chromium(profiles),
+        deps=[f"configure_build-{profile.name}" for profile in profiles],
+    ))
+    run_stages(stages, CHROMIUM_DIR / ".stamps", force=args.force,
+               max_workers=max(2, len(profiles)))
 
 
 if __name__ == "__main__":
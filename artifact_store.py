@@ -0,0 +1,441 @@
+#!/usr/bin/env python3
+"""
+Artifact store for Better Chromium builds
+Keeps built browsers content-addressed by what they were built from (the
+Chromium version, the patch series and the gn args), so an identical build
+is restored instead of recompiled. Files are stored once by SHA-256 and
+shared between artifacts; the oldest artifacts are evicted to stay under a
+size limit. The store is a directory, or an HTTP server with the same
+layout such as the one `serve` starts.
+
+Usage: ./artifact_store.py [list | evict | serve [--port PORT]]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from fingerprint import save_fingerprint
+from patch_series import hash_file
+from patching import apply_series
+from release_files import collect_files, file_mode
+
+# Configuration (overridable from the environment)
+STORE_URL = os.environ.get(
+    "BETTER_CHROMIUM_ARTIFACT_STORE",
+    str(Path.home() / ".cache" / "better-chromium" / "artifacts"),
+)
+STORE_SIZE = os.environ.get("BETTER_CHROMIUM_ARTIFACT_STORE_SIZE", "20G")
+STORE_ENABLED = os.environ.get("BETTER_CHROMIUM_ARTIFACTS", "1") != "0"
+
+# Objects nobody references yet may belong to a publish still in progress
+ORPHAN_GRACE = 3600
+DIGEST = re.compile(r"^[0-9a-f]{64}$")
+SIZE_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+MIB = 1024 ** 2
+
+
+def parse_size(text):
+    """Convert a size such as 20G into bytes."""
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([KMGT]?)i?B?\s*", text, re.IGNORECASE)
+    if not match:
+        raise ValueError(f"invalid size: {text}")
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2).upper()])
+
+
+def artifact_key(fingerprint):
+    """Return the store key for a build fingerprint."""
+    data = json.dumps(fingerprint, sort_keys=True).encode()
+    return hashlib.sha256(data).hexdigest()
+
+
+class DirectoryStore:
+    """Artifacts in a local directory: objects/<sha256> and manifests/<key>.json."""
+
+    def __init__(self, root):
+        self.root = Path(root)
+
+    def __str__(self):
+        return str(self.root)
+
+    def _object(self, digest):
+        return self.root / "objects" / digest[:2] / digest
+
+    def _manifest(self, key):
+        return self.root / "manifests" / f"{key}.json"
+
+    def has_object(self, digest):
+        return self._object(digest).exists()
+
+    def put_object(self, digest, path):
+        """Store a file under its digest."""
+        with open(path, "rb") as f:
+            self.put_stream(digest, f)
+
+    def put_stream(self, digest, stream, length=None):
+        """Store data read from a stream, checking that it matches its digest."""
+        target = self._object(digest)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = target.with_name(f"{target.name}.{os.getpid()}.tmp")
+        hasher = hashlib.sha256()
+        remaining = length
+        with open(tmp_path, "wb") as out:
+            while remaining is None or remaining > 0:
+                chunk = stream.read(1 << 20 if remaining is None else min(1 << 20, remaining))
+                if not chunk:
+                    break
+                hasher.update(chunk)
+                out.write(chunk)
+                if remaining is not None:
+                    remaining -= len(chunk)
+        if hasher.hexdigest() != digest:
+            tmp_path.unlink()
+            raise ValueError(f"object {digest[:12]} does not match its digest")
+        tmp_path.replace(target)
+
+    def open_object(self, digest):
+        return open(self._object(digest), "rb")
+
+    def object_size(self, digest):
+        return self._object(digest).stat().st_size
+
+    def get_manifest(self, key):
+        """Load an artifact's manifest and mark it as recently used."""
+        path = self._manifest(key)
+        try:
+            with open(path) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        os.utime(path)
+        return manifest
+
+    def put_manifest(self, key, manifest):
+        path = self._manifest(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f, indent=2)
+            f.write("\n")
+        tmp_path.replace(path)
+
+    def manifests(self):
+        """Return (key, manifest) for every artifact, least recently used first."""
+        paths = sorted(self.root.glob("manifests/*.json"), key=lambda p: p.stat().st_mtime)
+        result = []
+        for path in paths:
+            try:
+                with open(path) as f:
+                    result.append((path.stem, json.load(f)))
+            except (OSError, ValueError):
+                continue
+        return result
+
+    def evict(self, limit):
+        """Drop least recently used artifacts until objects fit in limit bytes.
+
+        Returns (artifacts removed, bytes freed).
+        """
+        refs = {}
+        entries = self.manifests()
+        for _, manifest in entries:
+            for digest in {f["sha256"] for f in manifest["files"]}:
+                refs[digest] = refs.get(digest, 0) + 1
+
+        now = time.time()
+        sizes = {}
+        freed = 0
+        for path in self.root.glob("objects/*/*"):
+            if not DIGEST.match(path.name):
+                continue
+            stat = path.stat()
+            if path.name in refs:
+                sizes[path.name] = stat.st_size
+            elif now - stat.st_mtime > ORPHAN_GRACE:
+                path.unlink()
+                freed += stat.st_size
+
+        total = sum(sizes.values())
+        removed = 0
+        for key, manifest in entries:
+            if total <= limit:
+                break
+            self._manifest(key).unlink()
+            removed += 1
+            for digest in {f["sha256"] for f in manifest["files"]}:
+                refs[digest] -= 1
+                if refs[digest] == 0 and digest in sizes:
+                    self._object(digest).unlink()
+                    total -= sizes[digest]
+                    freed += sizes[digest]
+        return removed, freed
+
+
+class HttpStore:
+    """Artifacts behind an HTTP server using the directory store's layout."""
+
+    def __init__(self, url):
+        self.url = url.rstrip("/")
+
+    def __str__(self):
+        return self.url
+
+    def _request(self, path, method="GET", data=None, headers=None):
+        request = urllib.request.Request(
+            f"{self.url}/{path}", data=data, method=method, headers=headers or {}
+        )
+        return urllib.request.urlopen(request, timeout=60)
+
+    def has_object(self, digest):
+        try:
+            with self._request(f"objects/{digest}", method="HEAD"):
+                return True
+        except urllib.error.HTTPError as e:
+            if e.code == 404:
+                return False
+            raise
+
+    def put_object(self, digest, path):
+        with open(path, "rb") as f:
+            headers = {"Content-Length": str(os.fstat(f.fileno()).st_size)}
+            with self._request(f"objects/{digest}", method="PUT", data=f, headers=headers):
+                pass
+
+    def open_object(self, digest):
+        return self._request(f"objects/{digest}")
+
+    def get_manifest(self, key):
+        try:
+            with self._request(f"manifests/{key}.json") as response:
+                return json.load(response)
+        except urllib.error.HTTPError as e:
+            if e.code == 404:
+                return None
+            raise
+
+    def put_manifest(self, key, manifest):
+        data = json.dumps(manifest).encode()
+        headers = {"Content-Type": "application/json"}
+        with self._request(f"manifests/{key}.json", method="PUT", data=data, headers=headers):
+            pass
+
+    def evict(self, limit):
+        # The server enforces its own size limit after every publish
+        return 0, 0
+
+
+def open_store(url=STORE_URL):
+    """Return the store for a directory path or an http(s) URL."""
+    if url.startswith(("http://", "https://")):
+        return HttpStore(url)
+    return DirectoryStore(Path(url).expanduser())
+
+
+def publish(out_dir, fingerprint, store=None):
+    """Upload an out directory's release payload under its fingerprint."""
+    if not STORE_ENABLED:
+        return None
+    store = store or open_store()
+    key = artifact_key(fingerprint)
+    files = []
+    uploaded = 0
+    try:
+        for name in collect_files(out_dir):
+            path = out_dir / name
+            digest = hash_file(path)
+            files.append({
+                "path": name, "sha256": digest,
+                "size": path.stat().st_size, "mode": file_mode(name),
+            })
+            if not store.has_object(digest):
+                store.put_object(digest, path)
+                uploaded += path.stat().st_size
+        store.put_manifest(key, {
+            "fingerprint": fingerprint,
+            "created": time.time(),
+            "files": files,
+        })
+        store.evict(parse_size(STORE_SIZE))
+    except (OSError, ValueError, urllib.error.URLError) as e:
+        print(f"⚠ Could not publish to artifact store {store}: {e}")
+        return None
+
+    total = sum(f["size"] for f in files)
+    print(f"✓ Published {len(files)} files ({total / MIB:.0f} MiB, "
+          f"{uploaded / MIB:.0f} MiB new) to artifact store as {key[:12]}")
+    return key
+
+
+def _fetch(store, digest, dest):
+    """Copy an object into place atomically, verifying its digest."""
+    tmp_path = dest.with_name(f".{dest.name}.restore")
+    hasher = hashlib.sha256()
+    with store.open_object(digest) as src, open(tmp_path, "wb") as out:
+        for chunk in iter(lambda: src.read(1 << 20), b""):
+            hasher.update(chunk)
+            out.write(chunk)
+    if hasher.hexdigest() != digest:
+        tmp_path.unlink()
+        raise ValueError(f"artifact object {digest[:12]} is corrupt")
+    return tmp_path
+
+
+def restore(out_dir, fingerprint, store=None, src_dir=None):
+    """Restore a build matching fingerprint into out_dir; return True on success.
+
+    With src_dir, the patch stack there is first brought in line with the
+    series: restored files are newer than every source, so ninja would
+    otherwise take them as built from whatever patches the tree still has.
+    """
+    if not STORE_ENABLED:
+        return False
+    store = store or open_store()
+    key = artifact_key(fingerprint)
+    try:
+        manifest = store.get_manifest(key)
+        if manifest is None:
+            return False
+        if src_dir is not None and not apply_series(src_dir):
+            print("⚠ Source tree does not match the series, not restoring")
+            return False
+        print(f"Restoring build {key[:12]} from artifact store {store}...")
+        fetched = 0
+        for entry in manifest["files"]:
+            dest = out_dir / entry["path"]
+            if dest.exists() and hash_file(dest) == entry["sha256"]:
+                continue
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = _fetch(store, entry["sha256"], dest)
+            tmp_path.chmod(entry["mode"])
+            tmp_path.replace(dest)
+            fetched += entry["size"]
+    except (OSError, ValueError, KeyError, urllib.error.URLError) as e:
+        print(f"⚠ Could not restore from artifact store {store}: {e}")
+        return False
+
+    save_fingerprint(out_dir, fingerprint)
+    print(f"✓ Restored {len(manifest['files'])} files ({fetched / MIB:.0f} MiB fetched)")
+    return True
+
+
+class StoreHandler(BaseHTTPRequestHandler):
+    """Serves a DirectoryStore over HTTP for HttpStore clients."""
+
+    store = None
+    limit = None
+    PATH = re.compile(r"^/(objects/[0-9a-f]{64}|manifests/[0-9a-f]{64}\.json)$")
+
+    def _route(self):
+        match = self.PATH.match(self.path)
+        if not match:
+            self.send_error(404)
+            return None, None
+        kind, _, name = match.group(1).partition("/")
+        return kind, name.removesuffix(".json")
+
+    def _send_object(self, digest, body):
+        try:
+            size = self.store.object_size(digest)
+        except OSError:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", str(size))
+        self.end_headers()
+        if body:
+            with self.store.open_object(digest) as f:
+                shutil.copyfileobj(f, self.wfile)
+
+    def _send_manifest(self, key, body):
+        manifest = self.store.get_manifest(key)
+        if manifest is None:
+            self.send_error(404)
+            return
+        data = json.dumps(manifest).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        if body:
+            self.wfile.write(data)
+
+    def do_HEAD(self):
+        kind, name = self._route()
+        if kind == "objects":
+            self._send_object(name, body=False)
+        elif kind == "manifests":
+            self._send_manifest(name, body=False)
+
+    def do_GET(self):
+        kind, name = self._route()
+        if kind == "objects":
+            self._send_object(name, body=True)
+        elif kind == "manifests":
+            self._send_manifest(name, body=True)
+
+    def do_PUT(self):
+        kind, name = self._route()
+        if kind is None:
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            if kind == "objects":
+                self.store.put_stream(name, self.rfile, length)
+            else:
+                self.store.put_manifest(name, json.loads(self.rfile.read(length)))
+                self.store.evict(self.limit)
+        except ValueError as e:
+            self.send_error(400, str(e))
+            return
+        self.send_response(201)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+
+def serve(root, port):
+    """Serve a directory store over HTTP until interrupted."""
+    StoreHandler.store = DirectoryStore(root)
+    StoreHandler.limit = parse_size(STORE_SIZE)
+    server = ThreadingHTTPServer(("127.0.0.1", port), StoreHandler)
+    print(f"Serving artifact store {root} on http://127.0.0.1:{port}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+def main():
+    """List, evict or serve the artifact store."""
+    parser = argparse.ArgumentParser(description="Manage the build artifact store")
+    parser.add_argument("command", nargs="?", default="list", choices=["list", "evict", "serve"])
+    parser.add_argument("--port", type=int, default=8765, help="port for serve")
+    args = parser.parse_args()
+
+    store = open_store()
+    if not isinstance(store, DirectoryStore):
+        print(f"❌ {store} is remote; run this on the machine that serves it")
+        return
+    if args.command == "serve":
+        serve(store.root, args.port)
+    elif args.command == "evict":
+        removed, freed = store.evict(parse_size(STORE_SIZE))
+        print(f"✓ Evicted {removed} artifacts, freed {freed / MIB:.0f} MiB")
+    else:
+        for key, manifest in reversed(store.manifests()):
+            fingerprint = manifest["fingerprint"]
+            size = sum(f["size"] for f in manifest["files"])
+            created = time.strftime("%Y-%m-%d %H:%M", time.localtime(manifest["created"]))
+            print(f"{key[:12]}  {created}  {fingerprint['chromium_version']}  "
+                  f"{len(fingerprint['series'])} patches  {size / MIB:.0f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,90 +4,114 @@ Better Chromium - Master build orchestrator
 Automatically detects what needs to be done
 """
 
+import argparse
 import sys
 import subprocess
 from pathlib import Path
 import os
 
+from arch_build import CHROMIUM_VERSION
+from artifact_store import restore
+from build_profiles import add_profile_argument, content_args, load_profile
+from build_stats import print_summary
+from fingerprint import compute_fingerprint, load_fingerprint, describe_changes
+from patch_watch import watch
+
 # Configuration
 SCRIPT_DIR = Path(__file__).parent.resolve()
 CHROMIUM_DIR = SCRIPT_DIR / "chromium-src"
 PATCHES_DIR = SCRIPT_DIR / "patches"
 
 
-def run_script(script_name):
+def run_script(script_name, *args):
     """Execute a Python script."""
     script_path = SCRIPT_DIR / script_name
-    print(f"\nExecuting: {script_name}")
+    print(f"\nExecuting: {script_name} {' '.join(args)}")
     print("=" * 60)
-    result = subprocess.run([sys.executable, str(script_path)])
+    result = subprocess.run([sys.executable, str(script_path)] + list(args))
     sys.exit(result.returncode)
 
 
-def get_mtime(path):
-    """Get modification time of a file."""
-    try:
-        return path.stat().st_mtime
-    except:
-        return 0
+def parse_args():
+    """Parse command line options."""
+    parser = argparse.ArgumentParser(description="Build whatever is out of date")
+    parser.add_argument(
+        "--watch", action="store_true",
+        help="stay resident and rebuild whenever patches/ changes",
+    )
+    add_profile_argument(parser)
+    return parser.parse_args()
 
 
 def main():
     """Main build orchestration."""
+    args = parse_args()
+    profile = load_profile(args.profile)
+    profile_option = ("--profile", profile.name)
+    
     print("=" * 60)
     print("Better Chromium - Build Orchestrator")
     print("=" * 60)
     print()
     
     src_dir = CHROMIUM_DIR / "src"
-    binary_path = src_dir / "out" / "Default" / "chrome"
+    binary_path = src_dir / profile.out_dir / "chrome"
     
     # Check if initial setup is needed
     if not src_dir.exists():
         print("🔍 Chromium source not found")
         print("Running full build setup (this will take a while)...")
         print()
-        run_script("arch_build.py")
+        run_script("arch_build.py", *profile_option)
+    
+    if args.watch:
+        watch([profile])
+        return
+    
+    current = compute_fingerprint(CHROMIUM_VERSION, content_args(profile))
     
     # Check if binary exists
-    if not binary_path.exists():
+    if not binary_path.exists() and not restore(binary_path.parent, current, src_dir=src_dir):
         print("🔍 Binary not found")
         print("Running full build...")
         print()
-        run_script("arch_build.py")
-    
-    # Check if patches have changed
-    print("🔍 Checking for new patches...")
-    binary_mtime = get_mtime(binary_path)
-    patches_mtime = 0
-    
-    # Check all patch files
-    for patch_file in PATCHES_DIR.glob("*.patch"):
-        patch_mtime = get_mtime(patch_file)
-        if patch_mtime > patches_mtime:
-            patches_mtime = patch_mtime
+        run_script("arch_build.py", *profile_option)
     
-    # Check series file
-    series_file = PATCHES_DIR / "series"
-    if series_file.exists():
-        series_mtime = get_mtime(series_file)
-        if series_mtime > patches_mtime:
-            patches_mtime = series_mtime
+    # Check if any build input has changed
+    print("🔍 Checking for changed build inputs...")
+    previous = load_fingerprint(binary_path.parent)
+    changes = describe_changes(previous, current) if previous != current else []
     
-    if patches_mtime > binary_mtime:
-        print("✓ New patches detected")
+    if changes:
+        print("✓ Changes detected:")
+        for change in changes:
+            print(f"  - {change}")
+        
+        if previous is not None and previous.get("chromium_version") != CHROMIUM_VERSION:
+            print("Running full build for new Chromium version...")
+            print()
+            run_script("arch_build.py", *profile_option)
+        
+        # An identical build may already be in the artifact store
+        if restore(binary_path.parent, current, src_dir=src_dir):
+            print()
+            print(f"Binary restored ({profile.name}): {binary_path}")
+            return
+        
         print("Running quick rebuild...")
         print()
-        run_script("quick_rebuild.py")
+        run_script("quick_rebuild.py", *profile_option)
     else:
         print("✓ No changes detected")
         print()
-        print(f"Binary is up to date: {binary_path}")
+        print(f"Binary is up to date ({profile.name}): {binary_path}")
+        print_summary(binary_path.parent)
         print()
         print("Options:")
         print("  ./quick_rebuild.py    - Rebuild with current patches")
         print("  ./add_patch.py <file> - Add a new patch")
         print("  ./release.py          - Create release package")
+        print("  ./build_profiles.py   - List build profiles (use --profile NAME)")
         print()
         print("To run Chromium:")
         print(f"  {binary_path}")
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Build profiles for Better Chromium
+Each profile in profiles/<name>.json names its gn args, optional extra
+compiler flags and its own out directory, so different configurations never
+share or clobber each other's outputs.
+
+Usage: ./build_profiles.py [profile]
+"""
+
+import argparse
+import json
+from collections import namedtuple
+from pathlib import Path
+
+from compile_cache import cache_available, gn_cache_args
+
+# Configuration
+SCRIPT_DIR = Path(__file__).parent.resolve()
+PROFILES_DIR = SCRIPT_DIR / "profiles"
+CFLAGS_WRAPPER = SCRIPT_DIR / "cflags_wrapper.sh"
+DEFAULT_PROFILE = "dev-fast"
+
+# variant names the CPU target in release tarballs, e.g. x86_64-v3
+Profile = namedtuple(
+    "Profile", ["name", "description", "out_dir", "gn_args", "cflags", "variant"]
+)
+
+
+def list_profiles():
+    """Return the names of all defined profiles."""
+    return sorted(path.stem for path in PROFILES_DIR.glob("*.json"))
+
+
+def _merge_args(base, overrides):
+    """Combine two gn arg lists, letting later values win per key."""
+    merged = {}
+    for arg in list(base) + list(overrides):
+        merged[arg.split("=", 1)[0].strip()] = arg
+    return list(merged.values())
+
+
+def load_profile(name, _chain=()):
+    """Load a profile, resolving the profile it extends."""
+    if name in _chain:
+        raise ValueError(f"build profile {name} extends itself")
+    try:
+        with open(PROFILES_DIR / f"{name}.json") as f:
+            data = json.load(f)
+    except OSError:
+        raise ValueError(
+            f"unknown build profile: {name} (available: {', '.join(list_profiles())})"
+        )
+
+    gn_args, cflags, variant = [], [], "x86_64"
+    if "extends" in data:
+        parent = load_profile(data["extends"], _chain + (name,))
+        gn_args, cflags, variant = parent.gn_args, parent.cflags, parent.variant
+    return Profile(
+        name,
+        data.get("description", ""),
+        data.get("out_dir", f"out/{name}"),
+        _merge_args(gn_args, data.get("gn_args", [])),
+        cflags + list(data.get("cflags", [])),
+        data.get("variant", variant),
+    )
+
+
+def profile_args(profile):
+    """Return a profile's gn args with its compiler flags and the cache wired in."""
+    if not profile.cflags:
+        return profile.gn_args + gn_cache_args()
+    chain = " ccache" if cache_available() else ""
+    wrapper = f"{CFLAGS_WRAPPER} {' '.join(profile.cflags)} --{chain}"
+    return profile.gn_args + [f'cc_wrapper="{wrapper}"']
+
+
+def content_args(profile):
+    """Return what decides a profile's output: its gn args and compiler flags.
+
+    Unlike profile_args this leaves out the cache and wrapper paths, which
+    change how a build runs but not the binary it produces.
+    """
+    if not profile.cflags:
+        return list(profile.gn_args)
+    return profile.gn_args + [f"cflags={' '.join(profile.cflags)}"]
+
+
+def add_profile_argument(parser, multiple=False):
+    """Add the shared --profile option to a script's argument parser."""
+    if multiple:
+        parser.add_argument(
+            "--profile", action="append", dest="profiles", choices=list_profiles(),
+            help=f"build profile from profiles/ (default: {DEFAULT_PROFILE}); "
+                 "repeat to handle several variants in one run",
+        )
+    else:
+        parser.add_argument(
+            "--profile", default=DEFAULT_PROFILE, choices=list_profiles(),
+            help=f"build profile from profiles/ (default: {DEFAULT_PROFILE})",
+        )
+
+
+def load_profiles(names):
+    """Load the profiles named on the command line, or the default one."""
+    return [load_profile(name) for name in dict.fromkeys(names or [DEFAULT_PROFILE])]
+
+
+def main():
+    """List the build profiles or show one in detail."""
+    parser = argparse.ArgumentParser(description="Show Better Chromium build profiles")
+    parser.add_argument("profile", nargs="?", choices=list_profiles(), help="profile to show")
+    args = parser.parse_args()
+
+    if args.profile is None:
+        for name in list_profiles():
+            profile = load_profile(name)
+            print(f"{name:<20} {profile.out_dir:<24} {profile.description}")
+        return
+
+    profile = load_profile(args.profile)
+    print(f"{profile.name}: {profile.description}")
+    print(f"Out directory: {profile.out_dir}")
+    print(f"Release variant: {profile.variant}")
+    print("gn args:")
+    for arg in profile_args(profile):
+        print(f"  {arg}")
+
+
+if __name__ == "__main__":
+    main()
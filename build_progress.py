@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Live build progress for Better Chromium
+Plans the remaining steps with `ninja -n`, weights each one by its duration
+in earlier builds, and shows an ETA, throughput and the bottleneck stage
+while ninja runs.
+"""
+
+import os
+import re
+import shutil
+import subprocess
+import sys
+import time
+from statistics import median
+
+from ninja_graph import read_ninja_log
+
+NINJA_STATUS = "[%f/%t] "
+STATUS_LINE = re.compile(r"^\[(\d+)/(\d+)\] (\S+)(?: (\S+))?")
+
+COMPILE_VERBS = ("CC", "CXX", "OBJC", "OBJCXX", "ASM")
+LINK_VERBS = ("LINK", "SOLINK", "SOLINK_MODULE", "AR")
+
+# Relative weights used when there is no timing history yet
+DEFAULT_WEIGHTS = {"compile": 5.0, "link": 60.0, "other": 1.0}
+REPORT_INTERVAL = 30
+
+
+def _kind(verb):
+    if verb in COMPILE_VERBS:
+        return "compile"
+    if verb in LINK_VERBS:
+        return "link"
+    return "other"
+
+
+def _output(target):
+    """Return the output path named in a description, if it names one."""
+    if not target or target.startswith("//"):
+        return None
+    return target[2:] if target.startswith("./") else target
+
+
+def parse_status(line):
+    """Return (finished, total, kind, output) for a ninja status line."""
+    match = STATUS_LINE.match(line)
+    if not match:
+        return None
+    finished, total, verb, target = match.groups()
+    return int(finished), int(total), _kind(verb), _output(target)
+
+
+def ninja_env():
+    """Environment that makes ninja print parseable status lines."""
+    env = dict(os.environ)
+    env["NINJA_STATUS"] = NINJA_STATUS
+    return env
+
+
+def plan_edges(out_dir, targets):
+    """Return [(kind, output)] for every step ninja would run, or None."""
+    try:
+        result = subprocess.run(
+            ["ninja", "-C", str(out_dir), "-n"] + list(targets),
+            capture_output=True, text=True, errors="replace", env=ninja_env(),
+        )
+    except OSError:
+        return None
+    if result.returncode != 0:
+        return None
+    planned = []
+    for line in result.stdout.splitlines():
+        status = parse_status(line)
+        if status:
+            planned.append(status[2:])
+    return planned
+
+
+def _format_duration(seconds):
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m{seconds % 60:02d}s"
+    return f"{seconds}s"
+
+
+class BuildProgress:
+    """Tracks finished steps and predicts the remaining build time."""
+
+    def __init__(self, out_dir, targets, label=None):
+        print(f"Planning build{f' ({label})' if label else ''}...")
+        planned = plan_edges(out_dir, targets) or []
+        history = read_ninja_log(out_dir)
+
+        known = {"compile": [], "link": [], "other": []}
+        for kind, output in planned:
+            entry = history.get(output) if output else None
+            if entry is not None:
+                known[kind].append((entry[1] - entry[0]) / 1000)
+        self.has_history = any(known.values())
+        typical = {
+            kind: median(samples) if samples else DEFAULT_WEIGHTS[kind]
+            for kind, samples in known.items()
+        }
+        if not self.has_history:
+            print("  No timing history yet, using typical step costs for the ETA")
+
+        # Remaining work: named outputs plus anonymous steps per kind
+        self.remaining = {}
+        self.anonymous = {"compile": [], "link": [], "other": []}
+        for kind, output in planned:
+            entry = history.get(output) if output else None
+            weight = (entry[1] - entry[0]) / 1000 if entry else typical[kind]
+            if output:
+                self.remaining[output] = (kind, weight)
+            else:
+                self.anonymous[kind].append(weight)
+        self.typical = typical
+
+        self.start = time.monotonic()
+        self.last_report = self.start
+        self.finished = 0
+        self.total = len(planned)
+        self.done_weight = 0.0
+        # Concurrent builds share the terminal, so they prefix lines instead
+        self.label = label
+        self.prefix = f"[{label}] " if label else ""
+        self.tty = sys.stdout.isatty() and label is None
+
+    def _complete(self, kind, output):
+        entry = self.remaining.pop(output, None) if output else None
+        if entry is not None:
+            self.done_weight += entry[1]
+        elif self.anonymous[kind]:
+            self.done_weight += self.anonymous[kind].pop()
+        else:
+            self.done_weight += self.typical[kind]
+
+    def remaining_weights(self):
+        weights = {kind: sum(w) for kind, w in self.anonymous.items()}
+        for kind, weight in self.remaining.values():
+            weights[kind] += weight
+        return weights
+
+    def eta(self):
+        """Return predicted seconds left, or None before there is a rate."""
+        elapsed = time.monotonic() - self.start
+        if self.done_weight <= 0 or elapsed < 5:
+            return None
+        weights = self.remaining_weights()
+        rate = self.done_weight / elapsed
+        # Links run in a small pool at the end, so count them mostly serially
+        return (weights["compile"] + weights["other"]) / rate + weights["link"]
+
+    def status(self):
+        """Return a one-line progress summary."""
+        elapsed = time.monotonic() - self.start
+        parts = [f"{self.finished}/{self.total} steps"]
+        if elapsed >= 1:
+            parts.append(f"{self.finished / elapsed * 60:.0f}/min")
+        eta = self.eta()
+        parts.append(f"ETA {_format_duration(eta)}" if eta is not None else "ETA --")
+        weights = self.remaining_weights()
+        left = sum(weights.values())
+        if left > 0:
+            stage = max(weights, key=weights.get)
+            parts.append(f"bottleneck: {stage} ({weights[stage] / left:.0%} of remaining)")
+        return " | ".join(parts)
+
+    def _emit(self, text):
+        # One write per line keeps concurrent builds from splitting lines
+        sys.stdout.write(f"{self.prefix}{text}\n")
+        sys.stdout.flush()
+
+    def feed(self, line):
+        """Consume one line of ninja output and echo it with progress."""
+        line = line.rstrip("\n")
+        status = parse_status(line)
+        if status is None:
+            if self.tty:
+                sys.stdout.write("\r\033[K")
+            self._emit(line)
+            return
+
+        finished, total, kind, output = status
+        self.total = max(self.total, total)
+        for _ in range(max(0, finished - self.finished)):
+            self._complete(kind, output)
+            output = None
+        self.finished = max(self.finished, finished)
+
+        now = time.monotonic()
+        if self.tty:
+            width = shutil.get_terminal_size().columns
+            text = f"{self.status()}  {line}"
+            sys.stdout.write("\r\033[K" + text[:max(20, width - 1)])
+            sys.stdout.flush()
+        else:
+            self._emit(line)
+            if now - self.last_report >= REPORT_INTERVAL:
+                self._emit(f"⏱ {self.status()}")
+                self.last_report = now
+
+    def finish(self):
+        """End the live display and report the final throughput."""
+        if self.tty:
+            sys.stdout.write("\r\033[K")
+        elapsed = time.monotonic() - self.start
+        print(f"⏱ {self.prefix}{self.finished} steps in {_format_duration(elapsed)}", flush=True)
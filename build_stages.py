@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Stage graph runner for the Better Chromium full build
+Each stage records a stamp hashed over its inputs and its dependencies'
+stamps; unchanged stages are skipped, a failed build resumes from the
+stage that failed, and stages whose dependencies are done run concurrently.
+Stages share the process, so they pass cwd= to commands rather than chdir.
+"""
+
+import hashlib
+import json
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# inputs: callable returning strings to hash, or None to always run
+# outputs: callable returning paths that must exist for a skip to be safe
+# exclusive: run with no other stage alongside, e.g. one that may prompt
+Stage = namedtuple("Stage", ["name", "func", "deps", "inputs", "outputs", "exclusive"])
+
+
+def stage(name, func, deps=(), inputs=None, outputs=None, exclusive=False):
+    """Declare a build stage."""
+    return Stage(name, func, tuple(deps), inputs, outputs, exclusive)
+
+
+def _stamp_hash(stage_def, dep_hashes):
+    digest = hashlib.sha256(stage_def.name.encode())
+    for value in stage_def.inputs():
+        digest.update(b"\0" + str(value).encode())
+    for dep in stage_def.deps:
+        digest.update(b"\0" + dep_hashes[dep].encode())
+    return digest.hexdigest()
+
+
+def _read_stamp(stamp_dir, name):
+    try:
+        with open(stamp_dir / f"{name}.stamp") as f:
+            return json.load(f).get("hash")
+    except (OSError, ValueError):
+        return None
+
+
+def _write_stamp(stamp_dir, name, value):
+    stamp_dir.mkdir(parents=True, exist_ok=True)
+    with open(stamp_dir / f"{name}.stamp", "w") as f:
+        json.dump({"hash": value}, f)
+        f.write("\n")
+
+
+def run_stages(stages, stamp_dir, force=False, max_workers=2):
+    """Run stages in dependency order, skipping those whose stamps match."""
+    by_name = {s.name: s for s in stages}
+    for s in stages:
+        for dep in s.deps:
+            if dep not in by_name:
+                raise ValueError(f"stage {s.name} depends on unknown stage {dep}")
+
+    hashes = {}
+    done = set()
+    running = {}
+
+    def ready():
+        if any(by_name[name].exclusive for name in running.values()):
+            return []
+        return [
+            s for s in stages
+            if s.name not in done and s.name not in running.values()
+            and all(dep in done for dep in s.deps)
+        ]
+
+    def start(pool, s):
+        """Skip a stage if its stamp matches, otherwise submit it."""
+        if s.inputs is not None:
+            hashes[s.name] = _stamp_hash(s, hashes)
+            outputs_ok = all(path.exists() for path in (s.outputs() if s.outputs else ()))
+            if not force and outputs_ok and _read_stamp(stamp_dir, s.name) == hashes[s.name]:
+                print(f"✓ {s.name}: up to date, skipping")
+                done.add(s.name)
+                return
+        else:
+            hashes[s.name] = ""
+        print(f"▶ {s.name}")
+        running[pool.submit(s.func)] = s.name
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while len(done) < len(stages):
+            progressed = True
+            while progressed:
+                progressed = False
+                for s in ready():
+                    if s.exclusive and running:
+                        continue
+                    before = len(done)
+                    start(pool, s)
+                    progressed = progressed or len(done) > before
+                    if s.exclusive and running:
+                        break
+            if not running:
+                break
+
+            finished, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                try:
+                    future.result()
+                except BaseException:
+                    print(f"❌ Stage {name} failed; rerun to resume from here")
+                    for other in running:
+                        other.cancel()
+                    raise
+                if by_name[name].inputs is not None:
+                    _write_stamp(stamp_dir, name, hashes[name])
+                done.add(name)
@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+"""
+Build performance analytics for Better Chromium
+Reads new .ninja_log entries after each build, keeps per-build summaries in
+a local SQLite history and reports slow edges, the critical path, per-patch
+cost and per-directory regressions.
+
+Usage: ./build_stats.py [--top N] [--patches] [--against-version VERSION] [--profile NAME]
+"""
+
+import argparse
+import json
+import sqlite3
+import time
+from collections import defaultdict
+from contextlib import closing
+from pathlib import Path
+
+from build_profiles import add_profile_argument, load_profile
+from impact_index import INDEX_FILE, ImpactIndex
+from ninja_graph import read_ninja_log_entries, rule_kind
+from patch_series import PATCHES_DIR, read_series, touched_files
+
+# Configuration
+SCRIPT_DIR = Path(__file__).parent.resolve()
+SRC_DIR = SCRIPT_DIR / "chromium-src" / "src"
+HISTORY_FILE = ".better-chromium-history.sqlite"
+
+# A directory is flagged when its mean edge time grows by this much
+REGRESSION_THRESHOLD = 0.25
+REGRESSION_MIN_EDGES = 10
+REGRESSION_MIN_MS = 30_000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS builds (
+    id INTEGER PRIMARY KEY,
+    finished REAL,
+    chromium_version TEXT,
+    inputs TEXT,
+    returncode INTEGER,
+    edges INTEGER,
+    wall_ms INTEGER,
+    cpu_ms INTEGER,
+    link_ms INTEGER,
+    critical_ms INTEGER
+);
+CREATE TABLE IF NOT EXISTS edges (
+    build_id INTEGER,
+    output TEXT,
+    kind TEXT,
+    start_ms INTEGER,
+    end_ms INTEGER
+);
+CREATE INDEX IF NOT EXISTS edges_by_build ON edges (build_id);
+"""
+
+
+def connect(out_dir):
+    """Open the build history database for an out directory."""
+    db = sqlite3.connect(out_dir / HISTORY_FILE)
+    db.executescript(SCHEMA)
+    return db
+
+
+def log_offset(out_dir):
+    """Return the .ninja_log position to read the next build from."""
+    try:
+        return (out_dir / ".ninja_log").stat().st_size
+    except OSError:
+        return 0
+
+
+def _last_run(entries):
+    """Keep only the entries written by the most recent ninja run.
+
+    Ninja appends entries as edges finish with times relative to the start
+    of the run, so end times only go backwards where a new run begins.
+    """
+    start = 0
+    for i in range(1, len(entries)):
+        if entries[i][1] < entries[i - 1][1]:
+            start = i
+    return entries[start:]
+
+
+def _guess_kind(output):
+    """Classify an output by name when no build graph is available."""
+    name = output.rsplit("/", 1)[-1]
+    if name.endswith((".o", ".obj")):
+        return "compile"
+    if name.endswith((".a", ".so")) or ("/" not in output and "." not in name):
+        return "link"
+    return "other"
+
+
+def directory_of(output):
+    """Map an object path like obj/net/dns/dns/x.o to a source area."""
+    parts = output.split("/")
+    if parts[0] in ("obj", "gen") and len(parts) > 3:
+        return "/".join(parts[1:3])
+    return parts[0] if len(parts) > 1 else "(root)"
+
+
+def load_graph(out_dir, require_cache=True):
+    """Return the impact index for critical path analysis, if cheap enough."""
+    if not (out_dir / "build.ninja").exists():
+        return None
+    if require_cache and not (out_dir / INDEX_FILE).exists():
+        return None
+    return ImpactIndex(out_dir)
+
+
+def critical_path(edges, index):
+    """Return (duration ms, [outputs]) of the longest dependency chain built."""
+    if index is None or not edges:
+        return 0, []
+
+    built = {}
+    for output, _, start, end in edges:
+        edge_id = index.producer.get(output)
+        if edge_id is not None:
+            built[edge_id] = (end - start, end, output)
+    if not built:
+        return 0, []
+
+    longest = {}
+    previous = {}
+    for edge_id in sorted(built, key=lambda e: built[e][1]):
+        best, best_pred = 0, None
+        for path in index.edges[edge_id].inputs:
+            pred = index.producer.get(path)
+            if pred in longest and longest[pred] > best:
+                best, best_pred = longest[pred], pred
+        longest[edge_id] = best + built[edge_id][0]
+        previous[edge_id] = best_pred
+
+    tail = max(longest, key=longest.get)
+    chain = []
+    node = tail
+    while node is not None:
+        chain.append(built[node][2])
+        node = previous[node]
+    return longest[tail], list(reversed(chain))
+
+
+def record_build(out_dir, offset, fingerprint, returncode=0):
+    """Store the edges of the build that just finished and return its id."""
+    entries, size = read_ninja_log_entries(out_dir, offset)
+    if size < offset:
+        # Ninja recompacted the log, so only the newest run can be ours
+        entries = _last_run(entries)
+    index = load_graph(out_dir)
+
+    edges = []
+    for start, end, output, _ in entries:
+        edge_id = index.producer.get(output) if index else None
+        kind = rule_kind(index.edges[edge_id].rule) if edge_id is not None else _guess_kind(output)
+        edges.append((output, kind, start, end))
+
+    wall_ms = max((e[3] for e in edges), default=0) - min((e[2] for e in edges), default=0)
+    cpu_ms = sum(e[3] - e[2] for e in edges)
+    link_ms = sum(e[3] - e[2] for e in edges if e[1] == "link")
+    critical_ms, _ = critical_path(edges, index)
+
+    with closing(connect(out_dir)) as db, db:
+        cursor = db.execute(
+            "INSERT INTO builds (finished, chromium_version, inputs, returncode,"
+            " edges, wall_ms, cpu_ms, link_ms, critical_ms) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (time.time(), fingerprint["chromium_version"], json.dumps(fingerprint["series"]),
+             returncode, len(edges), wall_ms, cpu_ms, link_ms, critical_ms),
+        )
+        build_id = cursor.lastrowid
+        db.executemany(
+            "INSERT INTO edges (build_id, output, kind, start_ms, end_ms) VALUES (?, ?, ?, ?, ?)",
+            [(build_id,) + edge for edge in edges],
+        )
+    return build_id
+
+
+def _edges(db, build_id):
+    return db.execute(
+        "SELECT output, kind, start_ms, end_ms FROM edges WHERE build_id = ?", (build_id,)
+    ).fetchall()
+
+
+def _directory_means(edges):
+    totals = defaultdict(lambda: [0, 0])
+    for output, kind, start, end in edges:
+        if kind == "compile":
+            entry = totals[directory_of(output)]
+            entry[0] += end - start
+            entry[1] += 1
+    return totals
+
+
+def regressions(db, build_id, baseline_id):
+    """Return directories whose mean compile time grew noticeably."""
+    if baseline_id is None:
+        return []
+    current = _directory_means(_edges(db, build_id))
+    baseline = _directory_means(_edges(db, baseline_id))
+
+    flagged = []
+    for directory, (total, count) in current.items():
+        if directory not in baseline or count < REGRESSION_MIN_EDGES or total < REGRESSION_MIN_MS:
+            continue
+        base_total, base_count = baseline[directory]
+        if base_count < REGRESSION_MIN_EDGES:
+            continue
+        before = base_total / base_count
+        after = total / count
+        if before and (after - before) / before >= REGRESSION_THRESHOLD:
+            flagged.append((directory, before, after, count))
+    return sorted(flagged, key=lambda r: r[2] / r[1], reverse=True)
+
+
+def _baseline(db, build_id, against_version=None):
+    """Pick the build to compare against: previous, or last of a version."""
+    if against_version:
+        row = db.execute(
+            "SELECT id FROM builds WHERE id < ? AND chromium_version = ? ORDER BY id DESC LIMIT 1",
+            (build_id, against_version),
+        ).fetchone()
+    else:
+        row = db.execute(
+            "SELECT id FROM builds WHERE id < ? AND edges > 0 ORDER BY id DESC LIMIT 1",
+            (build_id,),
+        ).fetchone()
+    return row[0] if row else None
+
+
+def _minutes(ms):
+    seconds = ms / 1000
+    if seconds < 60:
+        return f"{seconds:.1f}s"
+    return f"{int(seconds // 60)}m{int(seconds % 60):02d}s"
+
+
+def print_summary(out_dir, build_id=None):
+    """Print a short summary of a recorded build (the latest by default)."""
+    if not (out_dir / HISTORY_FILE).exists():
+        return
+    with closing(connect(out_dir)) as db:
+        row = db.execute(
+            "SELECT id, edges, wall_ms, cpu_ms, link_ms, critical_ms FROM builds "
+            + ("WHERE id = ?" if build_id else "ORDER BY id DESC LIMIT 1"),
+            (build_id,) if build_id else (),
+        ).fetchone()
+        if row is None:
+            return
+
+        build_id, count, wall_ms, cpu_ms, link_ms, critical_ms = row
+        print()
+        print("Build summary:")
+        if not count:
+            print("  Nothing was rebuilt")
+            return
+        print(f"  {count} steps in {_minutes(wall_ms)} wall, {_minutes(cpu_ms)} CPU")
+        print(f"  Link time: {_minutes(link_ms)}")
+        if critical_ms:
+            print(f"  Critical path: {_minutes(critical_ms)}")
+        slowest = max(_edges(db, build_id), key=lambda e: e[3] - e[2])
+        print(f"  Slowest step: {slowest[0]} ({_minutes(slowest[3] - slowest[2])})")
+        baseline = _baseline(db, build_id)
+        for directory, before, after, edges in regressions(db, build_id, baseline):
+            print(f"  ⚠ {directory} now takes {(after - before) / before:.0%} longer per file "
+                  f"({before / 1000:.1f}s -> {after / 1000:.1f}s, {edges} files)")
+
+
+def report(out_dir, top, with_patches, against_version):
+    """Print the full report for the latest build."""
+    with closing(connect(out_dir)) as db:
+        row = db.execute(
+            "SELECT id, chromium_version FROM builds ORDER BY id DESC LIMIT 1"
+        ).fetchone()
+        if row is None:
+            print("No builds recorded yet")
+            return
+        build_id, version = row
+        edges = _edges(db, build_id)
+        print(f"Build #{build_id} (Chromium {version})")
+        print_summary(out_dir, build_id)
+
+        print()
+        print(f"Top {top} slowest steps:")
+        for output, kind, start, end in sorted(edges, key=lambda e: e[2] - e[3])[:top]:
+            print(f"  {_minutes(end - start):>8}  {kind:<7}  {output}")
+
+        index = load_graph(out_dir, require_cache=False)
+        critical_ms, chain = critical_path(edges, index)
+        if chain:
+            print()
+            print(f"Critical path ({_minutes(critical_ms)}):")
+            durations = {e[0]: e[3] - e[2] for e in edges}
+            for output in chain:
+                print(f"  {_minutes(durations[output]):>8}  {output}")
+
+        if with_patches and index is not None:
+            print()
+            print("Cost attributed to each patch in this build:")
+            durations = {e[0]: e[3] - e[2] for e in edges}
+            for name in read_series():
+                affected = index.affected_edges(touched_files(PATCHES_DIR / name))
+                outputs = {index.edges[e].outputs[0] for e in affected if index.edges[e].outputs}
+                cost = sum(durations.get(o, 0) for o in outputs)
+                rebuilt = len(outputs & durations.keys())
+                print(f"  {_minutes(cost):>8}  {rebuilt:>5} steps  {name}")
+
+        baseline = _baseline(db, build_id, against_version)
+        flagged = regressions(db, build_id, baseline)
+        print()
+        if baseline is None:
+            print("No earlier build to compare against")
+        elif not flagged:
+            print(f"No regressions against build #{baseline}")
+        else:
+            print(f"Regressions against build #{baseline}:")
+            for directory, before, after, count in flagged:
+                print(f"  {directory}: {(after - before) / before:.0%} longer per file "
+                      f"({before / 1000:.1f}s -> {after / 1000:.1f}s, {count} files)")
+
+
+def main():
+    """Report on the latest recorded build."""
+    parser = argparse.ArgumentParser(description="Report build performance")
+    parser.add_argument("--top", type=int, default=20, help="number of slow steps to list")
+    parser.add_argument("--patches", action="store_true", help="attribute cost to each patch")
+    parser.add_argument("--against-version", help="compare with the last build of this version")
+    add_profile_argument(parser)
+    args = parser.parse_args()
+    out_dir = SRC_DIR / load_profile(args.profile).out_dir
+    report(out_dir, args.top, args.patches, args.against_version)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,12 @@
+#!/bin/sh
+# gn cc_wrapper for build profiles that add compiler flags
+# Usage: cflags_wrapper.sh FLAG... -- [ccache] COMPILER ARG...
+# Runs the compiler (through ccache if given) with the flags appended, so
+# they override the defaults from //build/config and reach ccache's hash.
+flags=""
+while [ "$#" -gt 0 ] && [ "$1" != "--" ]; do
+    flags="$flags $1"
+    shift
+done
+shift
+exec "$@" $flags
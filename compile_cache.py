@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Local compile cache for Better Chromium
+Wires ccache in through gn's cc_wrapper with a bounded, path-independent
+cache shared by every checkout and out directory on the machine.
+
+Usage: ./compile_cache.py [--clear]
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+from pathlib import Path
+
+# Configuration (overridable from the environment)
+CACHE_DIR = Path(os.environ.get(
+    "BETTER_CHROMIUM_CCACHE_DIR", Path.home() / ".cache" / "better-chromium" / "ccache"
+))
+CACHE_SIZE = os.environ.get("BETTER_CHROMIUM_CCACHE_SIZE", "50G")
+CACHE_ENABLED = os.environ.get("BETTER_CHROMIUM_CCACHE", "1") != "0"
+
+HIT_KEYS = ("direct_cache_hit", "preprocessed_cache_hit")
+MISS_KEYS = ("cache_miss",)
+
+
+def cache_available():
+    """Return True when the compile cache is enabled and ccache is installed."""
+    return CACHE_ENABLED and shutil.which("ccache") is not None
+
+
+def gn_cache_args():
+    """Return the gn args that route compiles through the cache."""
+    if not cache_available():
+        return []
+    return ['cc_wrapper="ccache"']
+
+
+def ccache_env(src_dir):
+    """Return environment settings for ccache during a build."""
+    return {
+        "CCACHE_DIR": str(CACHE_DIR),
+        "CCACHE_MAXSIZE": CACHE_SIZE,
+        # Rewrite absolute paths under the checkout so keys match across workspaces
+        "CCACHE_BASEDIR": str(src_dir),
+        "CCACHE_NOHASHDIR": "true",
+        "CCACHE_COMPILERCHECK": "content",
+        "CCACHE_SLOPPINESS": "time_macros,include_file_mtime,include_file_ctime,file_stat_matches",
+    }
+
+
+def read_stats():
+    """Return ccache's counters as a dict, or {} if unavailable."""
+    if not cache_available():
+        return {}
+    env = dict(os.environ, CCACHE_DIR=str(CACHE_DIR))
+    try:
+        result = subprocess.run(
+            ["ccache", "--print-stats"], capture_output=True, text=True, env=env, check=True
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return {}
+    stats = {}
+    for line in result.stdout.splitlines():
+        key, _, value = line.partition("\t")
+        if value.strip().isdigit():
+            stats[key] = int(value)
+    return stats
+
+
+def stats_delta(before, after):
+    """Return (hits, misses) between two stats snapshots."""
+    def total(stats, keys):
+        return sum(stats.get(key, 0) for key in keys)
+    hits = total(after, HIT_KEYS) - total(before, HIT_KEYS)
+    misses = total(after, MISS_KEYS) - total(before, MISS_KEYS)
+    return max(hits, 0), max(misses, 0)
+
+
+def print_build_report(before, after):
+    """Print this build's cache hit rate and the cache's current size."""
+    if not after:
+        return
+    hits, misses = stats_delta(before, after)
+    lookups = hits + misses
+    rate = f"{hits / lookups:.0%}" if lookups else "n/a"
+    print(f"  Compile cache: {hits} hits, {misses} misses ({rate} hit rate)")
+    size_kib = after.get("cache_size_kibibyte")
+    if size_kib is not None:
+        print(f"  Cache size: {size_kib / 1024 ** 2:.1f} GiB of {CACHE_SIZE}")
+
+
+def main():
+    """Show compile cache status or clear it."""
+    parser = argparse.ArgumentParser(description="Inspect the local compile cache")
+    parser.add_argument("--clear", action="store_true", help="remove every cached object")
+    args = parser.parse_args()
+
+    if not cache_available():
+        print("⚠ Compile cache disabled or ccache not installed")
+        return
+
+    env = dict(os.environ, CCACHE_DIR=str(CACHE_DIR), CCACHE_MAXSIZE=CACHE_SIZE)
+    if args.clear:
+        subprocess.run(["ccache", "--clear"], env=env, check=False)
+        print("✓ Compile cache cleared")
+    subprocess.run(["ccache", "--show-stats"], env=env, check=False)
+
+
+if __name__ == "__main__":
+    main()
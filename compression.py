@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Compression backends for Better Chromium release archives
+Parallel block gzip that any gunzip can read, multi-threaded zstd and xz,
+all exposed as writable streams so tarfile can feed them directly.
+"""
+
+import multiprocessing
+import shutil
+import subprocess
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# Archive suffix, default level and level range for each format
+FORMATS = {
+    "gz": (".tar.gz", 6, range(1, 10)),
+    "zst": (".tar.zst", 19, range(1, 23)),
+    "xz": (".tar.xz", 6, range(0, 10)),
+}
+DEFAULT_FORMAT = "gz"
+
+# Each gzip block becomes its own member; gunzip reads concatenated members
+GZIP_BLOCK_SIZE = 4 * 1024 * 1024
+# xz writes different streams in single- and multi-threaded mode, so it is
+# always run multi-threaded, with blocks that don't depend on the level
+XZ_BLOCK_SIZE = 24 * 1024 * 1024
+
+
+def default_threads():
+    return multiprocessing.cpu_count()
+
+
+def _gzip_member(data, level):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+class ParallelGzipWriter:
+    """Writable stream that gzips fixed-size blocks on a thread pool."""
+
+    def __init__(self, fileobj, level, threads):
+        self.fileobj = fileobj
+        self.level = level
+        self.threads = threads
+        self.pool = ThreadPoolExecutor(max_workers=threads)
+        self.pending = deque()
+        self.buffer = bytearray()
+        self.bytes_in = 0
+
+    def _submit(self, block):
+        self.pending.append(self.pool.submit(_gzip_member, bytes(block), self.level))
+        # Bound memory: keep only a couple of blocks per thread in flight
+        while len(self.pending) > 2 * self.threads:
+            self.fileobj.write(self.pending.popleft().result())
+
+    def write(self, data):
+        self.bytes_in += len(data)
+        self.buffer += data
+        while len(self.buffer) >= GZIP_BLOCK_SIZE:
+            self._submit(self.buffer[:GZIP_BLOCK_SIZE])
+            del self.buffer[:GZIP_BLOCK_SIZE]
+        return len(data)
+
+    def close(self):
+        if self.buffer or not self.bytes_in:
+            self._submit(self.buffer)
+            self.buffer = bytearray()
+        while self.pending:
+            self.fileobj.write(self.pending.popleft().result())
+        self.pool.shutdown()
+
+    def abort(self):
+        """Drop queued blocks and stop the workers without writing anything more."""
+        self.pending.clear()
+        self.pool.shutdown(cancel_futures=True)
+
+
+class PipeWriter:
+    """Writable stream that pipes into an external compressor."""
+
+    def __init__(self, cmd, fileobj):
+        self.process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=fileobj)
+        self.cmd = cmd
+        self.bytes_in = 0
+
+    def write(self, data):
+        self.bytes_in += len(data)
+        self.process.stdin.write(data)
+        return len(data)
+
+    def close(self):
+        self.process.stdin.close()
+        if self.process.wait() != 0:
+            raise OSError(f"{self.cmd[0]} exited with code {self.process.returncode}")
+
+    def abort(self):
+        """Kill the compressor and reap it, leaving its output incomplete."""
+        self.process.kill()
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+        self.process.wait()
+
+
+def check_format(fmt, level=None):
+    """Raise ValueError if a format cannot be written with this level here."""
+    _, _, levels = FORMATS[fmt]
+    if level is not None and level not in levels:
+        raise ValueError(f"{fmt} level must be between {levels.start} and {levels.stop - 1}")
+    tool = {"zst": "zstd", "xz": "xz"}.get(fmt)
+    if tool and shutil.which(tool) is None:
+        raise ValueError(f"{tool} is not installed")
+
+
+def open_compressor(fileobj, fmt=DEFAULT_FORMAT, level=None, threads=None):
+    """Return a writable stream compressing into fileobj."""
+    check_format(fmt, level)
+    level = FORMATS[fmt][1] if level is None else level
+    threads = threads or default_threads()
+    if fmt == "gz":
+        return ParallelGzipWriter(fileobj, level, threads)
+    if fmt == "zst":
+        cmd = ["zstd", "-q", "-c", f"-T{threads}", f"-{level}"]
+        if level > 19:
+            cmd.insert(1, "--ultra")
+    else:
+        cmd = ["xz", "-q", "-c", f"-T{max(threads, 2)}", f"--block-size={XZ_BLOCK_SIZE}",
+               f"-{level}"]
+    return PipeWriter(cmd, fileobj)
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Trimmed dependency sync for Linux-only Chromium builds
+A curated list of DEPS entries, checkout vars and hooks that building chrome
+for Linux never uses (test data, benchmark corpora, other platforms' and
+developer tools), dropped from .gclient through custom_deps, custom_vars and
+custom_hooks. Vars that some gn args do need are only switched off when no
+profile sets those args. `verify` proves that gn gen and the chrome target
+still resolve without them; `report` shows what the trim saves.
+
+Usage: ./deps_trim.py [report | verify [--profile NAME]]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from build_profiles import (
+    add_profile_argument, list_profiles, load_profile, load_profiles, profile_args,
+)
+
+# Configuration (overridable from the environment)
+SCRIPT_DIR = Path(__file__).parent.resolve()
+CHROMIUM_DIR = SCRIPT_DIR / "chromium-src"
+DEPOT_TOOLS_DIR = SCRIPT_DIR / "depot_tools"
+SYNC_LOG = CHROMIUM_DIR / ".deps-sync.json"
+VERIFY_DIR = "out/.deps-trim-verify"
+TRIM_ENABLED = os.environ.get("BETTER_CHROMIUM_DEPS_TRIM", "1") != "0"
+
+# Test data, fuzzing corpora and benchmarks: nothing in the chrome target reads them
+EXCLUDED_DEPS = [
+    "src/chrome/test/data/perf/canvas_bench",
+    "src/chrome/test/data/perf/frame_rate/content",
+    "src/chrome/test/data/xr/webvr_info",
+    "src/testing/libfuzzer/fuzzers/wasm_corpus",
+    "src/third_party/blink/renderer/core/css/perftest_data",
+    "src/third_party/crossbench",
+    "src/third_party/freetype-testing/src",
+    "src/third_party/google_benchmark/src",
+    "src/third_party/jetstream/main",
+    "src/third_party/pywebsocket3/src",
+    "src/third_party/speedometer/main",
+    "src/third_party/webgl/src",
+    "src/third_party/webpagereplay",
+    "src/v8/test/test262/data",
+]
+
+# Checkout vars that only fetch developer, test or benchmark tooling
+DISABLED_VARS = [
+    "checkout_clang_coverage_tools",
+    "checkout_clang_tidy",
+    "checkout_clangd",
+    "checkout_instrumented_libraries",
+    "checkout_rts_model",
+    "checkout_telemetry_dependencies",
+    "checkout_wpr_archives",
+    "generate_location_tags",
+]
+
+# Checkout vars some gn args depend on: on if any profile's args need them
+CONDITIONAL_VARS = {
+    # chrome_pgo_phase defaults to 2 (use profiles) in official builds
+    "checkout_pgo_profiles": lambda args: args.get(
+        "chrome_pgo_phase", "2" if args.get("is_official_build") == "true" else "0"
+    ) != "0",
+    "checkout_nacl": lambda args: args.get("enable_nacl") == "true",
+}
+
+# DEPS hooks to skip; a custom hook with just a name suppresses the DEPS one
+SKIPPED_HOOKS = [
+    "ciopfs_linux",
+    "Generate component metadata for tests",
+    "wasm_fuzzer",
+]
+
+
+def _gn_args(profile):
+    return dict(
+        (key.strip(), value.strip())
+        for key, value in (arg.split("=", 1) for arg in profile.gn_args)
+    )
+
+
+def all_profiles():
+    """Every defined profile; the checkout is shared by all of them."""
+    return [load_profile(name) for name in list_profiles()]
+
+
+def gclient_overrides(profiles):
+    """Return (custom_deps, custom_vars, custom_hooks) for the src solution."""
+    if not TRIM_ENABLED:
+        return {}, {"checkout_pgo_profiles": True}, []
+    gn_args = [_gn_args(profile) for profile in profiles]
+    custom_vars = {var: False for var in DISABLED_VARS}
+    for var, needed in CONDITIONAL_VARS.items():
+        custom_vars[var] = any(needed(args) for args in gn_args)
+    custom_deps = {dep: None for dep in EXCLUDED_DEPS}
+    custom_hooks = [{"name": name} for name in SKIPPED_HOOKS]
+    return custom_deps, custom_vars, custom_hooks
+
+
+def _size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+def _load_log():
+    try:
+        return json.loads(SYNC_LOG.read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def measure_excluded():
+    """Record the size of excluded deps still on disk, before a trimmed sync removes them."""
+    sizes = {
+        dep: _size(CHROMIUM_DIR / dep)
+        for dep in EXCLUDED_DEPS if (CHROMIUM_DIR / dep).is_dir()
+    }
+    if sizes:
+        log = _load_log()
+        log["excluded_bytes"] = {**log.get("excluded_bytes", {}), **sizes}
+        SYNC_LOG.write_text(json.dumps(log, indent=2, sort_keys=True) + "\n")
+
+
+def record_timing(step, seconds):
+    """Remember how long a sync or hooks run took, per trimmed or full mode."""
+    log = _load_log()
+    mode = "trimmed" if TRIM_ENABLED else "full"
+    log.setdefault(mode, {})[step] = round(seconds, 1)
+    SYNC_LOG.parent.mkdir(parents=True, exist_ok=True)
+    SYNC_LOG.write_text(json.dumps(log, indent=2, sort_keys=True) + "\n")
+
+
+def print_report():
+    """Show the bytes and seconds the trim saves, as far as they've been measured."""
+    log = _load_log()
+    print(f"Dependency trim: {'on' if TRIM_ENABLED else 'off (BETTER_CHROMIUM_DEPS_TRIM=0)'}")
+    print(f"  {len(EXCLUDED_DEPS)} deps, {len(DISABLED_VARS)} vars and "
+          f"{len(SKIPPED_HOOKS)} hooks excluded")
+    sizes = log.get("excluded_bytes", {})
+    if sizes:
+        print(f"  {sum(sizes.values()) / 1024 ** 2:.0f} MiB saved on disk "
+              f"(measured on {len(sizes)} of {len(EXCLUDED_DEPS)} excluded deps)")
+    else:
+        print("  Disk savings not measured yet (needs a full checkout to compare)")
+    full, trimmed = log.get("full", {}), log.get("trimmed", {})
+    for step in ["sync", "hooks"]:
+        if step in full and step in trimmed:
+            print(f"  gclient {step}: {trimmed[step]:.0f}s trimmed vs {full[step]:.0f}s full, "
+                  f"{full[step] - trimmed[step]:.0f}s saved")
+        elif step in trimmed or step in full:
+            mode, seconds = ("trimmed", trimmed[step]) if step in trimmed else ("full", full[step])
+            print(f"  gclient {step}: {seconds:.0f}s {mode}, no other mode measured to compare")
+
+
+def verify(profiles):
+    """Prove gn gen and the chrome target resolve in the trimmed checkout.
+
+    Each profile is generated into a scratch out directory and the chrome
+    target dry-run with ninja, which fails on any missing input. Returns
+    True if every profile resolves.
+    """
+    src_dir = CHROMIUM_DIR / "src"
+    ok = True
+    for profile in profiles:
+        out_dir = src_dir / VERIFY_DIR / profile.name
+        print(f"Verifying {profile.name}...")
+        start = time.monotonic()
+        gen = subprocess.run(
+            ["gn", "gen", str(out_dir), f"--args={' '.join(profile_args(profile))}"],
+            cwd=src_dir, capture_output=True, text=True,
+        )
+        if gen.returncode != 0:
+            print(f"  ❌ gn gen failed:\n{gen.stdout}{gen.stderr}")
+            ok = False
+            continue
+        dry_run = subprocess.run(
+            ["ninja", "-C", str(out_dir), "-n", "chrome"], capture_output=True, text=True,
+        )
+        if dry_run.returncode != 0:
+            lines = (dry_run.stdout + dry_run.stderr).strip().splitlines()
+            print("  ❌ chrome does not resolve:")
+            for line in lines[-10:]:
+                print(f"    {line}")
+            ok = False
+            continue
+        print(f"  ✓ gn gen and chrome resolve ({time.monotonic() - start:.0f}s)")
+        shutil.rmtree(out_dir, ignore_errors=True)
+    if ok:
+        shutil.rmtree(src_dir / VERIFY_DIR, ignore_errors=True)
+    return ok
+
+
+def main():
+    """Report on or verify the dependency trim."""
+    parser = argparse.ArgumentParser(description="Check the trimmed dependency sync")
+    parser.add_argument("command", nargs="?", default="report", choices=["report", "verify"])
+    add_profile_argument(parser, multiple=True)
+    args = parser.parse_args()
+
+    if args.command == "report":
+        print_report()
+        return
+    if not (CHROMIUM_DIR / "src").exists():
+        print("❌ Chromium source not found. Run ./arch_build.py first.")
+        sys.exit(1)
+    os.environ["PATH"] = f"{DEPOT_TOOLS_DIR}:{os.environ['PATH']}"
+    if shutil.which("gn") is None:
+        print("❌ gn not found; run ./arch_build.py to set up depot_tools first")
+        sys.exit(1)
+    profiles = load_profiles(args.profiles) if args.profiles else all_profiles()
+    if not verify(profiles):
+        print("❌ The trim drops something these profiles need")
+        sys.exit(1)
+    print("✓ The trimmed checkout builds every profile checked")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Build input fingerprints for Better Chromium
+Records what a build was made from so rebuilds only happen on real changes
+"""
+
+import json
+
+from patch_series import PATCHES_DIR, series_hashes
+
+FINGERPRINT_FILE = ".better-chromium-fingerprint.json"
+
+
+def compute_fingerprint(chromium_version, gn_args, patches_dir=PATCHES_DIR):
+    """Fingerprint the inputs that decide what ends up in the binary."""
+    return {
+        "chromium_version": chromium_version,
+        "gn_args": list(gn_args),
+        "series": [
+            {"name": name, "sha256": digest}
+            for name, digest in series_hashes(patches_dir)
+        ],
+    }
+
+
+def load_fingerprint(out_dir):
+    """Load the fingerprint recorded for an out directory, if any."""
+    path = out_dir / FINGERPRINT_FILE
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_fingerprint(out_dir, fingerprint):
+    """Record the fingerprint of a successful build."""
+    out_dir.mkdir(parents=True, exist_ok=True)
+    path = out_dir / FINGERPRINT_FILE
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(fingerprint, f, indent=2)
+        f.write("\n")
+    tmp_path.replace(path)
+
+
+def describe_changes(old, new):
+    """Return human readable reasons why two fingerprints differ."""
+    if old is None:
+        return ["no fingerprint recorded for the previous build"]
+
+    changes = []
+    if old.get("chromium_version") != new["chromium_version"]:
+        changes.append(
+            f"Chromium version {old.get('chromium_version')} -> "
+            f"{new['chromium_version']}"
+        )
+    if old.get("gn_args") != new["gn_args"]:
+        changes.append("gn args changed")
+
+    old_series = {p["name"]: p["sha256"] for p in old.get("series", [])}
+    new_series = {p["name"]: p["sha256"] for p in new["series"]}
+
+    for name, digest in new_series.items():
+        if name not in old_series:
+            changes.append(f"patch added: {name}")
+        elif old_series[name] != digest:
+            changes.append(f"patch modified: {name}")
+    for name in old_series:
+        if name not in new_series:
+            changes.append(f"patch removed: {name}")
+
+    old_order = [n for n in old_series if n in new_series]
+    new_order = [n for n in new_series if n in old_series]
+    if old_order != new_order:
+        changes.append("series order changed")
+
+    return changes
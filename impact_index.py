@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Patch impact index for Better Chromium
+Maps the files each patch touches to the ninja edges that depend on them
+and estimates how many compile and link steps a change will trigger.
+
+Usage: ./impact_index.py [--profile NAME] [patch-name ...]
+"""
+
+import argparse
+import os
+import pickle
+import sys
+from collections import defaultdict
+from pathlib import Path
+
+from build_profiles import add_profile_argument, load_profile
+from ninja_graph import load_build_graph, read_deps, read_ninja_log, rule_kind
+from patch_series import PATCHES_DIR, hash_file, read_series, touched_files
+
+# Configuration
+SCRIPT_DIR = Path(__file__).parent.resolve()
+SRC_DIR = SCRIPT_DIR / "chromium-src" / "src"
+INDEX_FILE = ".better-chromium-impact.pickle"
+INDEX_VERSION = 1
+TARGET = "chrome"
+
+
+class ImpactIndex:
+    """Reverse dependency view of one out directory's build graph."""
+
+    def __init__(self, out_dir, target=TARGET):
+        self.out_dir = out_dir
+        self.index_path = out_dir / INDEX_FILE
+        # ninja names sources relative to the out directory, e.g. ../../base/x.cc
+        self.src_prefix = os.path.relpath(SRC_DIR.resolve(), out_dir.resolve())
+        self.cache = self._load_cache()
+
+        edges, reparsed = load_build_graph(out_dir, self.cache["graph"])
+        self.edges = edges
+        self.producer = {}
+        self.consumers = defaultdict(list)
+        for edge_id, edge in enumerate(edges):
+            if edge.rule == "phony" and not edge.inputs:
+                continue
+            for output in edge.outputs:
+                self.producer[output] = edge_id
+            for path in edge.inputs:
+                self.consumers[path].append(edge_id)
+        self.needed = self._closure(target)
+
+        if reparsed:
+            print(f"  Impact index: reparsed {reparsed} ninja files")
+            self._save_cache()
+
+    def _load_cache(self):
+        try:
+            with open(self.index_path, "rb") as f:
+                cache = pickle.load(f)
+            if cache.get("version") == INDEX_VERSION:
+                return cache
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+            pass
+        return {"version": INDEX_VERSION, "graph": {}, "deps_stamp": None, "deps": {}}
+
+    def _save_cache(self):
+        tmp_path = self.index_path.with_suffix(".tmp")
+        with open(tmp_path, "wb") as f:
+            pickle.dump(self.cache, f, protocol=pickle.HIGHEST_PROTOCOL)
+        tmp_path.replace(self.index_path)
+
+    def _closure(self, target):
+        """Return the ids of every edge the target needs."""
+        needed = set()
+        pending = [target]
+        while pending:
+            edge_id = self.producer.get(pending.pop())
+            if edge_id is None or edge_id in needed:
+                continue
+            needed.add(edge_id)
+            pending.extend(self.edges[edge_id].inputs)
+        return needed
+
+    def _header_dependents(self, paths):
+        """Return {path: outputs} from .ninja_deps, cached until it changes."""
+        try:
+            stat = (self.out_dir / ".ninja_deps").stat()
+            stamp = (stat.st_mtime_ns, stat.st_size, len(self.edges))
+        except OSError:
+            return {path: () for path in paths}
+
+        if self.cache["deps_stamp"] != stamp:
+            self.cache["deps_stamp"] = stamp
+            self.cache["deps"] = {}
+        missing = [path for path in paths if path not in self.cache["deps"]]
+        if missing:
+            found = read_deps(self.out_dir, missing)
+            self.cache["deps"].update({path: tuple(outs) for path, outs in found.items()})
+            self._save_cache()
+        return {path: self.cache["deps"][path] for path in paths}
+
+    def ninja_path(self, src_path):
+        """Return a source-relative path the way this out directory's graph names it."""
+        return f"{self.src_prefix}/{src_path}"
+
+    def unknown_paths(self, src_paths):
+        """Return the source paths no edge or recorded header dependency mentions.
+
+        Files a patch creates and files gn reads fall in here: the graph
+        can't say what they affect until ninja has seen them.
+        """
+        ninja_paths = {self.ninja_path(path): path for path in src_paths}
+        headers = self._header_dependents(list(ninja_paths))
+        return [
+            path for ninja_path, path in ninja_paths.items()
+            if ninja_path not in self.consumers and not headers[ninja_path]
+        ]
+
+    def affected_edges(self, src_paths):
+        """Return the ids of needed edges that rerun when source files change."""
+        ninja_paths = [self.ninja_path(path) for path in src_paths]
+        start = set()
+        for path in ninja_paths:
+            start.update(self.consumers.get(path, ()))
+        for outputs in self._header_dependents(ninja_paths).values():
+            start.update(self.producer[o] for o in outputs if o in self.producer)
+
+        affected = set()
+        pending = list(start)
+        while pending:
+            edge_id = pending.pop()
+            if edge_id in affected or edge_id not in self.needed:
+                continue
+            affected.add(edge_id)
+            for output in self.edges[edge_id].outputs:
+                pending.extend(self.consumers.get(output, ()))
+        return affected
+
+    def estimate(self, src_paths, log=None):
+        """Estimate compile/link steps and last-build seconds for a change."""
+        log = read_ninja_log(self.out_dir) if log is None else log
+        counts = {"compile": 0, "link": 0, "other": 0}
+        seconds = 0.0
+        timed = 0
+        for edge_id in self.affected_edges(src_paths):
+            edge = self.edges[edge_id]
+            if edge.rule == "phony":
+                continue
+            counts[rule_kind(edge.rule)] += 1
+            entry = log.get(edge.outputs[0]) if edge.outputs else None
+            if entry is not None:
+                seconds += (entry[1] - entry[0]) / 1000
+                timed += 1
+        counts["seconds"] = seconds
+        counts["timed"] = timed
+        return counts
+
+
+def format_estimate(estimate):
+    """Render an estimate as a short one-line summary."""
+    steps = estimate["compile"] + estimate["link"] + estimate["other"]
+    text = f"{estimate['compile']} compile, {estimate['link']} link, {estimate['other']} other"
+    if estimate["timed"]:
+        text += f", ~{estimate['seconds'] / 60:.1f} CPU-min last build"
+        if estimate["timed"] < steps:
+            text += f" ({estimate['timed']}/{steps} steps timed)"
+    else:
+        text += ", no timing history"
+    return text
+
+
+def load_index(out_dir):
+    """Return an ImpactIndex, or None if the out directory has no build graph."""
+    if not (out_dir / "build.ninja").exists():
+        return None
+    return ImpactIndex(out_dir)
+
+
+def print_patch_estimates(out_dir, patch_names, patches_dir=PATCHES_DIR):
+    """Print the estimated rebuild cost of each patch."""
+    index = load_index(out_dir)
+    if index is None:
+        print("  No build graph yet, run a build first to enable estimates")
+        return None
+
+    log = read_ninja_log(out_dir)
+    for name in patch_names:
+        paths = touched_files(patches_dir / name)
+        print(f"  {name}: {format_estimate(index.estimate(paths, log))}")
+    return index
+
+
+def main():
+    """Print impact estimates for the given patches or the whole series."""
+    parser = argparse.ArgumentParser(description="Estimate the rebuild cost of patches")
+    parser.add_argument("patches", nargs="*", help="patch names (default: the whole series)")
+    add_profile_argument(parser)
+    args = parser.parse_args()
+    out_dir = SRC_DIR / load_profile(args.profile).out_dir
+
+    names = args.patches or read_series()
+    print(f"Estimated rebuild cost per patch ({out_dir}):")
+    for name in names:
+        if hash_file(PATCHES_DIR / name) is None:
+            print(f"❌ Patch not found: {name}")
+            sys.exit(1)
+    print_patch_estimates(out_dir, names)
+
+
+if __name__ == "__main__":
+    main()
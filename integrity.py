@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Integrity manifests for Better Chromium releases
+Writes sha256sum/b2sum compatible manifests from the digests taken while a
+release is packaged, and verifies an unpacked better-chromium/ tree against
+them with every file hashed in parallel.
+
+Usage: ./integrity.py verify <manifest> [better-chromium dir]
+"""
+
+import argparse
+import hashlib
+import mmap
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+from release_files import APP_DIR
+
+# Manifest suffix for each supported digest, checkable with sha256sum -c / b2sum -c
+ALGORITHMS = {"sha256": ".sha256sums", "blake2b": ".b2sums"}
+DEFAULT_ALGORITHMS = ("sha256",)
+
+# Files this big are hashed straight from a memory map rather than read()
+MMAP_THRESHOLD = 4 * 1024 * 1024
+# Slice of a mapping given to one update(); hashlib drops the GIL while hashing it
+HASH_CHUNK = 64 * 1024 * 1024
+MIB = 1024 ** 2
+
+
+def new_hashes(algorithms):
+    """Return {algorithm: hash object} for the given algorithm names."""
+    return {algorithm: hashlib.new(algorithm) for algorithm in algorithms}
+
+
+def hash_file(path, algorithms=DEFAULT_ALGORITHMS):
+    """Return {algorithm: hex digest} of a file, or None if it cannot be read."""
+    hashes = new_hashes(algorithms)
+    try:
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < MMAP_THRESHOLD:
+                data = f.read()
+                for digest in hashes.values():
+                    digest.update(data)
+            else:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    mapped.madvise(mmap.MADV_SEQUENTIAL)
+                    with memoryview(mapped) as view:
+                        for start in range(0, size, HASH_CHUNK):
+                            chunk = view[start:start + HASH_CHUNK]
+                            for digest in hashes.values():
+                                digest.update(chunk)
+                            chunk.release()
+    except (OSError, ValueError):
+        return None
+    return {algorithm: digest.hexdigest() for algorithm, digest in hashes.items()}
+
+
+def hash_files(root, names, algorithms=DEFAULT_ALGORITHMS, threads=None):
+    """Hash files under root on a thread pool; yield (name, digests) as each finishes.
+
+    A single digest can't be split across threads, so the parallelism is
+    across files; the largest start first so chrome isn't left running alone.
+    """
+    def size_of(name):
+        try:
+            return (root / name).stat().st_size
+        except OSError:
+            return 0
+
+    ordered = sorted(names, key=size_of, reverse=True)
+    with ThreadPoolExecutor(max_workers=threads or multiprocessing.cpu_count()) as pool:
+        futures = {pool.submit(hash_file, root / name, algorithms): name for name in ordered}
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+
+def manifest_path(archive_path, algorithm):
+    return archive_path.with_name(f"{archive_path.name}{ALGORITHMS[algorithm]}")
+
+
+def write_manifests(archive_path, digests):
+    """Write a manifest per algorithm covering the package files and the archive.
+
+    digests maps each algorithm to {name: hex digest} of the package files,
+    as returned by write_tarball; the archive itself is hashed here, once
+    for all algorithms. Returns the manifest paths.
+    """
+    archive_digests = hash_file(archive_path, list(digests))
+    paths = []
+    for algorithm, files in digests.items():
+        lines = [f"{files[name]}  {APP_DIR}/{name}" for name in sorted(files)]
+        lines.append(f"{archive_digests[algorithm]}  {archive_path.name}")
+        path = manifest_path(archive_path, algorithm)
+        path.write_text("\n".join(lines) + "\n")
+        paths.append(path)
+    return paths
+
+
+def read_manifest(path):
+    """Return (algorithm, {name: digest}) for the package files listed in a manifest."""
+    algorithm = next(
+        (algorithm for algorithm, suffix in ALGORITHMS.items() if path.name.endswith(suffix)),
+        None,
+    )
+    if algorithm is None:
+        raise ValueError(f"unknown manifest type: {path.name}")
+    prefix = f"{APP_DIR}/"
+    expected = {}
+    for line in path.read_text().splitlines():
+        if not line.strip():
+            continue
+        digest, name = line.split(maxsplit=1)
+        # sha256sum -b marks names with a leading '*'
+        name = name.lstrip("*")
+        if name.startswith(prefix):
+            expected[name[len(prefix):]] = digest
+    return algorithm, expected
+
+
+def verify(install_dir, algorithm, expected, threads=None):
+    """Check install_dir against {name: digest}, printing problems as they are found.
+
+    Returns the names that are missing or differ.
+    """
+    failed = []
+    for name, digests in hash_files(install_dir, expected, (algorithm,), threads):
+        if digests is None:
+            print(f"  ❌ {name}: missing")
+            failed.append(name)
+        elif digests[algorithm] != expected[name]:
+            print(f"  ❌ {name}: {algorithm} mismatch")
+            failed.append(name)
+
+    unlisted = sorted(
+        path.relative_to(install_dir).as_posix()
+        for path in install_dir.rglob("*")
+        if path.is_file() and path.relative_to(install_dir).as_posix() not in expected
+    )
+    for name in unlisted:
+        print(f"  ⚠ {name}: not in manifest")
+    return sorted(failed)
+
+
+def main():
+    """Verify an installed tree against a release manifest."""
+    parser = argparse.ArgumentParser(description="Check a Better Chromium install")
+    parser.add_argument("command", choices=["verify"])
+    parser.add_argument("manifest", type=Path, help=".sha256sums or .b2sums file")
+    parser.add_argument(
+        "install_dir", type=Path, nargs="?",
+        help=f"unpacked tree (default: {APP_DIR}/ next to the manifest)",
+    )
+    parser.add_argument("--threads", type=int, help="hashing threads (default: all CPUs)")
+    args = parser.parse_args()
+
+    install_dir = args.install_dir or args.manifest.parent / APP_DIR
+    if not install_dir.is_dir():
+        print(f"❌ No install at {install_dir}")
+        sys.exit(1)
+    try:
+        algorithm, expected = read_manifest(args.manifest)
+    except (OSError, ValueError) as e:
+        print(f"❌ Could not read manifest: {e}")
+        sys.exit(1)
+
+    print(f"Verifying {len(expected)} files in {install_dir} ({algorithm})...")
+    start = time.monotonic()
+    failed = verify(install_dir, algorithm, expected, args.threads)
+    elapsed = max(time.monotonic() - start, 1e-6)
+    size = sum((install_dir / name).stat().st_size
+               for name in expected if (install_dir / name).is_file())
+    if failed:
+        print(f"❌ {len(failed)} of {len(expected)} files failed verification")
+        sys.exit(1)
+    print(f"✓ All {len(expected)} files match, {size / MIB:.0f} MiB "
+          f"at {size / MIB / elapsed:.0f} MiB/s")
+
+
+if __name__ == "__main__":
+    main()
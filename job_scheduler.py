@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+Memory-aware ninja job scheduling for Better Chromium
+Sizes compile parallelism and the link pool from available RAM and the peak
+memory of jobs in past builds, pauses ninja under memory pressure, and
+records per-job peak memory so the next build picks better limits.
+"""
+
+import json
+import multiprocessing
+import os
+import signal
+import subprocess
+import threading
+
+from build_progress import BuildProgress, ninja_env, plan_edges
+from compile_cache import ccache_env, print_build_report, read_stats
+
+MEMORY_HISTORY_FILE = ".better-chromium-memory.json"
+GIB = 1024 ** 3
+
+# Used until a build has recorded real peaks
+DEFAULT_COMPILE_PEAK = int(1.5 * GIB)
+DEFAULT_LINK_PEAK = 12 * GIB
+MAX_LINKS = 4
+MAX_SAMPLES = {"compile": 4000, "link": 50}
+
+# gn args sized from this machine and past builds: they change how a build
+# runs, not what it produces, so on their own they never rerun gn gen
+MACHINE_GN_ARGS = ("concurrent_links",)
+
+POLL_INTERVAL = 0.5
+LINKER_NAMES = ("mold", "ld.lld", "ld", "ld.gold", "lld")
+
+
+def read_meminfo():
+    """Return /proc/meminfo values in bytes, or {} if unavailable."""
+    info = {}
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                fields = value.split()
+                if fields:
+                    info[key] = int(fields[0]) * 1024
+    except (OSError, ValueError):
+        return {}
+    return info
+
+
+def load_memory_history(out_dir):
+    """Load recorded per-job peak memory samples."""
+    try:
+        with open(out_dir / MEMORY_HISTORY_FILE) as f:
+            history = json.load(f)
+    except (OSError, ValueError):
+        history = {}
+    return {kind: list(history.get(kind, [])) for kind in MAX_SAMPLES}
+
+
+def save_memory_history(out_dir, history):
+    """Persist per-job peaks, keeping only the most recent samples."""
+    trimmed = {kind: samples[-MAX_SAMPLES[kind]:] for kind, samples in history.items()}
+    with open(out_dir / MEMORY_HISTORY_FILE, "w") as f:
+        json.dump(trimmed, f)
+
+
+def _percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def memory_reserve(total):
+    """Memory kept free for the desktop, page cache and ninja itself."""
+    return max(2 * GIB, total // 20)
+
+
+def plan_jobs(out_dir):
+    """Return (compile jobs, concurrent links) for this machine."""
+    cpu_count = multiprocessing.cpu_count()
+    meminfo = read_meminfo()
+    if "MemTotal" not in meminfo:
+        return cpu_count, 1
+
+    history = load_memory_history(out_dir)
+    compile_peak = (
+        _percentile(history["compile"], 0.95) if history["compile"] else DEFAULT_COMPILE_PEAK
+    )
+    link_peak = max(history["link"]) if history["link"] else DEFAULT_LINK_PEAK
+
+    total = meminfo["MemTotal"]
+    available = meminfo.get("MemAvailable", total)
+    reserve = memory_reserve(total)
+
+    compile_jobs = int((available - reserve) // max(compile_peak, 1))
+    compile_jobs = max(1, min(cpu_count + 2, compile_jobs))
+    links = int((total - reserve) // (2 * max(link_peak, 1)))
+    links = max(1, min(MAX_LINKS, links))
+    return compile_jobs, links
+
+
+def split_jobs(out_dirs, targets):
+    """Divide this machine's compile jobs between builds running at once.
+
+    The total is sized for the most memory-hungry of the builds, and each
+    gets a share proportional to the steps it still has to run.
+    """
+    total = min(plan_jobs(out_dir)[0] for out_dir in out_dirs)
+    steps = {out_dir: len(plan_edges(out_dir, targets) or []) for out_dir in out_dirs}
+    if not sum(steps.values()):
+        steps = dict.fromkeys(out_dirs, 1)
+    return {
+        out_dir: max(1, round(total * count / sum(steps.values())))
+        for out_dir, count in steps.items()
+    }
+
+
+def _process_table():
+    """Return {pid: (ppid, rss bytes, comm, cmdline)} for all processes."""
+    table = {}
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        pid = int(entry)
+        try:
+            with open(f"/proc/{pid}/stat") as f:
+                stat = f.read()
+            with open(f"/proc/{pid}/cmdline", "rb") as f:
+                cmdline = f.read().replace(b"\0", b" ").decode(errors="replace")
+        except OSError:
+            continue
+        # comm may contain spaces, so split after the closing parenthesis
+        comm = stat[stat.find("(") + 1:stat.rfind(")")]
+        fields = stat[stat.rfind(")") + 2:].split()
+        table[pid] = (int(fields[1]), int(fields[21]) * page_size, comm, cmdline)
+    return table
+
+
+def _job_kind(processes):
+    """Classify a job from the processes in its tree."""
+    for _, _, comm, cmdline in processes:
+        if comm in LINKER_NAMES or "link_wrapper" in cmdline or "-fuse-ld=" in cmdline:
+            return "link"
+    for _, _, comm, cmdline in processes:
+        if comm.startswith(("clang", "gcc", "g++", "cc1")) and " -c " in cmdline:
+            return "compile"
+    return "other"
+
+
+class MemoryMonitor(threading.Thread):
+    """Samples ninja's job trees, tracks peaks and pauses ninja under pressure."""
+
+    def __init__(self, ninja_pid):
+        super().__init__(daemon=True)
+        self.ninja_pid = ninja_pid
+        self.stop_event = threading.Event()
+        self.jobs = {}  # job root pid -> [kind, peak rss]
+        self.paused = False
+        self.pauses = 0
+        self.stopped_jobs = []
+
+        total = read_meminfo().get("MemTotal", 0)
+        self.low_water = memory_reserve(total) if total else 0
+        self.high_water = self.low_water * 2
+
+    def _signal(self, pid, sig, group=False):
+        try:
+            # Ninja starts every job in its own process group
+            if group:
+                os.killpg(pid, sig)
+            else:
+                os.kill(pid, sig)
+        except OSError:
+            pass
+
+    def _sample(self):
+        table = _process_table()
+        children = {}
+        for pid, (ppid, _, _, _) in table.items():
+            children.setdefault(ppid, []).append(pid)
+
+        for root in children.get(self.ninja_pid, []):
+            tree = []
+            pending = [root]
+            while pending:
+                pid = pending.pop()
+                tree.append(table[pid])
+                pending.extend(children.get(pid, []))
+            rss = sum(process[1] for process in tree)
+            job = self.jobs.setdefault(root, ["other", 0])
+            if job[0] == "other":
+                job[0] = _job_kind(tree)
+            job[1] = max(job[1], rss)
+
+        available = read_meminfo().get("MemAvailable")
+        if available is None or not self.low_water:
+            return
+        running = children.get(self.ninja_pid, [])
+        if available < self.low_water and not self.paused:
+            # Stop ninja from launching anything new until jobs drain
+            print(f"\n⚠ Memory low ({available // (1024 ** 2)} MiB free), pausing new jobs...")
+            self._signal(self.ninja_pid, signal.SIGSTOP)
+            self.paused = True
+            self.pauses += 1
+        if available < self.low_water // 2:
+            # Still sinking: hold the newest job so older ones can finish
+            active = [pid for pid in running if pid not in self.stopped_jobs]
+            if len(active) > 1:
+                newest = max(active)
+                self._signal(newest, signal.SIGSTOP, group=True)
+                self.stopped_jobs.append(newest)
+        if available > self.high_water and self.paused:
+            for pid in self.stopped_jobs:
+                self._signal(pid, signal.SIGCONT, group=True)
+            self.stopped_jobs = []
+            self._signal(self.ninja_pid, signal.SIGCONT)
+            self.paused = False
+            print("\n✓ Memory recovered, resuming build...")
+        elif self.stopped_jobs and available > self.low_water:
+            # Let held jobs continue one at a time
+            self._signal(self.stopped_jobs.pop(), signal.SIGCONT, group=True)
+
+    def run(self):
+        while not self.stop_event.wait(POLL_INTERVAL):
+            try:
+                self._sample()
+            except OSError:
+                continue
+
+    def stop(self):
+        self.stop_event.set()
+        self.join()
+        for pid in self.stopped_jobs:
+            self._signal(pid, signal.SIGCONT, group=True)
+        if self.paused:
+            self._signal(self.ninja_pid, signal.SIGCONT)
+
+    def peaks(self):
+        """Return {kind: [peak rss, ...]} for the jobs seen so far."""
+        result = {}
+        for kind, peak in self.jobs.values():
+            result.setdefault(kind, []).append(peak)
+        return result
+
+
+def source_root(out_dir):
+    """Return the checkout an out directory belongs to: the nearest parent with a .gn file."""
+    out_dir = out_dir.resolve()
+    for parent in out_dir.parents:
+        if (parent / ".gn").is_file():
+            return parent
+    return out_dir.parents[1]
+
+
+def run_ninja(out_dir, targets, extra_args=None, jobs=None, label=None):
+    """Run ninja with memory-aware parallelism and return its exit code.
+
+    Builds running concurrently pass their share of the machine as jobs and
+    a label to tell their output apart.
+    """
+    compile_jobs, links = plan_jobs(out_dir)
+    if jobs is not None:
+        compile_jobs = jobs
+    prefix = f"[{label}] " if label else ""
+    print(f"{prefix}Building with {compile_jobs} parallel jobs ({links} concurrent links)...")
+
+    cmd = ["ninja", "-C", str(out_dir), f"-j{compile_jobs}"] + list(extra_args or []) + list(targets)
+    progress = BuildProgress(out_dir, targets, label)
+    env = ninja_env()
+    env.update(ccache_env(source_root(out_dir)))
+    cache_before = read_stats()
+
+    print(f"{prefix}Running: {' '.join(cmd)}")
+    process = subprocess.Popen(
+        cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        errors="replace",
+        env=env,
+    )
+
+    monitor = None
+    if os.path.isdir("/proc"):
+        monitor = MemoryMonitor(process.pid)
+        monitor.start()
+    try:
+        for line in process.stdout:
+            progress.feed(line)
+        returncode = process.wait()
+    except KeyboardInterrupt:
+        process.send_signal(signal.SIGINT)
+        returncode = process.wait()
+    finally:
+        if monitor is not None:
+            monitor.stop()
+        progress.finish()
+
+    if monitor is not None:
+        history = load_memory_history(out_dir)
+        peaks = monitor.peaks()
+        for kind in MAX_SAMPLES:
+            history[kind].extend(peaks.get(kind, []))
+        save_memory_history(out_dir, history)
+        if peaks.get("link"):
+            print(f"  {prefix}Peak link memory: {max(peaks['link']) / GIB:.1f} GiB")
+        if peaks.get("compile"):
+            print(f"  {prefix}Compile peak (p95): {_percentile(peaks['compile'], 0.95) / GIB:.2f} GiB")
+        if monitor.pauses:
+            print(f"  {prefix}Paused {monitor.pauses} times for memory pressure")
+    if label is None:
+        # Concurrent builds share the cache, so their caller reports it once
+        print_build_report(cache_before, read_stats())
+
+    return returncode
+
+
+def gn_job_args(out_dir):
+    """Return gn args that size the link pool for this machine."""
+    _, links = plan_jobs(out_dir)
+    return [f"concurrent_links={links}"]
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Readers for the ninja build files in a Chromium out directory
+Parses build.ninja and its subninjas, header deps and .ninja_log
+"""
+
+import subprocess
+from collections import namedtuple
+
+# One build statement; inputs are explicit plus implicit, order-only is dropped
+Edge = namedtuple("Edge", ["rule", "outputs", "inputs"])
+
+COMPILE_RULES = ("cc", "cxx", "objc", "objcxx", "asm", "rc")
+LINK_RULES = ("alink", "solink", "solink_module", "link")
+
+
+def rule_kind(rule):
+    """Classify a GN rule name, including toolchain-prefixed ones."""
+    for name in LINK_RULES:
+        if rule == name or rule.endswith("_" + name):
+            return "link"
+    for name in COMPILE_RULES:
+        if rule == name or rule.endswith("_" + name):
+            return "compile"
+    return "other"
+
+
+def _split_paths(text):
+    """Split a ninja path list on unescaped spaces."""
+    if "$" not in text:
+        return text.split()
+
+    paths = []
+    current = []
+    i = 0
+    while i < len(text):
+        char = text[i]
+        if char == "$" and i + 1 < len(text):
+            current.append(text[i + 1])
+            i += 2
+            continue
+        if char == " ":
+            if current:
+                paths.append("".join(current))
+                current = []
+        else:
+            current.append(char)
+        i += 1
+    if current:
+        paths.append("".join(current))
+    return paths
+
+
+def _find_colon(text):
+    """Return the index of the first unescaped ':' in a build line."""
+    i = 0
+    while i < len(text):
+        if text[i] == "$":
+            i += 2
+            continue
+        if text[i] == ":":
+            return i
+        i += 1
+    return -1
+
+
+def _logical_lines(path):
+    """Yield lines of a ninja file with '$' continuations joined."""
+    pending = ""
+    with open(path, errors="surrogateescape") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if line.endswith("$") and not line.endswith("$$"):
+                pending += line[:-1]
+                continue
+            if pending:
+                line = pending + line.lstrip()
+                pending = ""
+            yield line
+    if pending:
+        yield pending
+
+
+def parse_ninja_file(path):
+    """Return (edges, included files) for one .ninja file."""
+    edges = []
+    children = []
+    for line in _logical_lines(path):
+        if line.startswith("build "):
+            body = line[6:]
+            colon = body.find(":") if "$" not in body else _find_colon(body)
+            if colon < 0:
+                continue
+            outputs = [p for p in _split_paths(body[:colon]) if p != "|"]
+            rest = _split_paths(body[colon + 1:])
+            if not rest:
+                continue
+            inputs = []
+            for token in rest[1:]:
+                if token == "||":
+                    break
+                if token != "|":
+                    inputs.append(token)
+            edges.append(Edge(rest[0], tuple(outputs), tuple(inputs)))
+        elif line.startswith("subninja ") or line.startswith("include "):
+            children.extend(_split_paths(line.split(" ", 1)[1]))
+    return edges, children
+
+
+def load_build_graph(out_dir, cache):
+    """Parse build.ninja and every subninja, reusing unchanged cache entries.
+
+    `cache` maps ninja file -> (mtime_ns, size, edges, children) and is
+    updated in place. Returns (edges, number of files reparsed).
+    """
+    edges = []
+    reparsed = 0
+    seen = set()
+    pending = ["build.ninja"]
+
+    while pending:
+        name = pending.pop()
+        if name in seen:
+            continue
+        seen.add(name)
+        path = out_dir / name
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+
+        entry = cache.get(name)
+        if entry is None or entry[0] != stat.st_mtime_ns or entry[1] != stat.st_size:
+            file_edges, children = parse_ninja_file(path)
+            entry = (stat.st_mtime_ns, stat.st_size, file_edges, children)
+            cache[name] = entry
+            reparsed += 1
+        edges.extend(entry[2])
+        pending.extend(entry[3])
+
+    # Forget files that are no longer part of the graph
+    for name in list(cache):
+        if name not in seen:
+            del cache[name]
+    return edges, reparsed
+
+
+def read_deps(out_dir, paths):
+    """Return {path: set of outputs} for outputs whose header deps list a path.
+
+    Streams `ninja -t deps` so the full dependency database is never held
+    in memory; paths are relative to the out directory.
+    """
+    wanted = set(paths)
+    dependents = {path: set() for path in wanted}
+    if not wanted:
+        return dependents
+
+    try:
+        process = subprocess.Popen(
+            ["ninja", "-C", str(out_dir), "-t", "deps"],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            errors="surrogateescape",
+        )
+    except OSError:
+        return dependents
+    output = None
+    for line in process.stdout:
+        if not line.strip():
+            continue
+        if line.startswith(" "):
+            dep = line.strip()
+            if output is not None and dep in wanted:
+                dependents[dep].add(output)
+        else:
+            output = line.split(": #deps", 1)[0]
+    process.wait()
+    return dependents
+
+
+def read_ninja_log_entries(out_dir, offset=0):
+    """Return ([(start_ms, end_ms, output, command hash)], end offset).
+
+    Reads .ninja_log from a byte offset in file order; starts over from the
+    beginning if the log was rewritten and is now shorter than the offset.
+    """
+    entries = []
+    log_path = out_dir / ".ninja_log"
+    try:
+        with open(log_path, "rb") as f:
+            f.seek(0, 2)
+            size = f.tell()
+            f.seek(offset if offset <= size else 0)
+            data = f.read()
+    except OSError:
+        return entries, 0
+
+    for raw in data.decode(errors="surrogateescape").splitlines():
+        if raw.startswith("#"):
+            continue
+        fields = raw.split("\t")
+        if len(fields) < 5:
+            continue
+        start, end, _, output, command_hash = fields[:5]
+        try:
+            entries.append((int(start), int(end), output, command_hash))
+        except ValueError:
+            continue
+    return entries, size
+
+
+def read_ninja_log(out_dir):
+    """Return {output: (start_ms, end_ms, command hash)} from .ninja_log.
+
+    Later entries for the same output win, as in ninja itself.
+    """
+    entries, _ = read_ninja_log_entries(out_dir)
+    return {output: (start, end, command_hash) for start, end, output, command_hash in entries}
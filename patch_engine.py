@@ -0,0 +1,557 @@
+#!/usr/bin/env python3
+"""
+Native patch engine for Better Chromium
+Parses and applies the unified diffs in patches/series without quilt or patch(1).
+Patches touching disjoint files are applied in parallel worker processes,
+everything is checked in memory before the tree is written, and quilt's .pc
+layout is kept up to date so `quilt applied`, `quilt pop` and `quilt refresh`
+keep working by hand.
+
+Usage: ./patch_engine.py [--dry-run] [--fuzz N] [source-dir]
+"""
+
+import argparse
+import multiprocessing
+import os
+import re
+import shutil
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from patch_series import PATCHES_DIR, read_series
+
+# Configuration
+SCRIPT_DIR = Path(__file__).parent.resolve()
+CHROMIUM_DIR = SCRIPT_DIR / "chromium-src"
+DEFAULT_FUZZ = 2
+
+HUNK_HEADER = re.compile(rb"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+NO_NEWLINE = b"\\ No newline at end of file"
+
+
+class PatchError(Exception):
+    """Raised when a patch cannot be parsed or does not apply."""
+
+
+@dataclass
+class Hunk:
+    """One @@ block of a unified diff."""
+    old_start: int
+    old_len: int
+    new_start: int
+    new_len: int
+    # (tag, content, has_newline) where tag is ' ', '-' or '+'
+    lines: list = field(default_factory=list)
+    # Line of the @@ header within the patch file, counting from 0
+    header_index: int = 0
+
+
+@dataclass
+class FilePatch:
+    """All hunks a patch applies to one file."""
+    old_path: str
+    new_path: str
+    hunks: list = field(default_factory=list)
+
+    @property
+    def path(self):
+        return self.old_path if self.new_path is None else self.new_path
+
+    @property
+    def creates(self):
+        return self.old_path is None
+
+    @property
+    def deletes(self):
+        return self.new_path is None
+
+
+@dataclass
+class HunkResult:
+    """Where a hunk landed compared to its header."""
+    patch: str
+    path: str
+    index: int
+    line: int
+    offset: int
+    fuzz: int
+
+
+@dataclass
+class PatchPlan:
+    """The outcome of applying a series in memory."""
+    # path -> final bytes (None when the file ends up deleted)
+    contents: dict = field(default_factory=dict)
+    # patch name -> {path: bytes or None before the patch}
+    backups: dict = field(default_factory=dict)
+    results: list = field(default_factory=list)
+    errors: list = field(default_factory=list)
+    popped: list = field(default_factory=list)
+    pushed: list = field(default_factory=list)
+
+
+def _strip_path(raw, strip=1):
+    """Turn a diff header path into a source-relative path."""
+    path = raw.split(b"\t", 1)[0].strip().decode("utf-8", "surrogateescape")
+    if path == "/dev/null":
+        return None
+    parts = path.split("/", strip)
+    if len(parts) <= strip:
+        raise PatchError(f"cannot strip {strip} components from {path}")
+    return parts[strip]
+
+
+def _content(line):
+    """Return a line without its end-of-line marker."""
+    if line.endswith(b"\r\n"):
+        return line[:-2]
+    if line.endswith(b"\n") or line.endswith(b"\r"):
+        return line[:-1]
+    return line
+
+
+def parse_patch(data, strip=1):
+    """Parse unified diff bytes into a list of FilePatch objects."""
+    lines = [line[:-1] if line.endswith(b"\r") else line for line in data.split(b"\n")]
+    file_patches = []
+    current = None
+    i = 0
+
+    while i < len(lines):
+        line = lines[i]
+        if line.startswith(b"--- ") and i + 1 < len(lines) and lines[i + 1].startswith(b"+++ "):
+            current = FilePatch(_strip_path(line[4:], strip), _strip_path(lines[i + 1][4:], strip))
+            if current.old_path is None and current.new_path is None:
+                raise PatchError("diff header names /dev/null on both sides")
+            file_patches.append(current)
+            i += 2
+            continue
+
+        match = HUNK_HEADER.match(line)
+        if match:
+            if current is None:
+                raise PatchError(f"hunk without file header at line {i + 1}")
+            old_len = 1 if match.group(2) is None else int(match.group(2))
+            new_len = 1 if match.group(4) is None else int(match.group(4))
+            hunk = Hunk(int(match.group(1)), old_len, int(match.group(3)), new_len, header_index=i)
+            old_left, new_left = old_len, new_len
+            i += 1
+
+            while old_left > 0 or new_left > 0:
+                if i >= len(lines):
+                    raise PatchError(f"truncated hunk in {current.path}")
+                body = lines[i]
+                tag = body[:1] or b" "
+                if tag == b"\\":
+                    i += 1
+                    continue
+                if tag == b" ":
+                    old_left -= 1
+                    new_left -= 1
+                elif tag == b"-":
+                    old_left -= 1
+                elif tag == b"+":
+                    new_left -= 1
+                else:
+                    raise PatchError(f"malformed hunk line {i + 1} in {current.path}")
+                if old_left < 0 or new_left < 0:
+                    raise PatchError(f"hunk line counts do not match in {current.path}")
+                hunk.lines.append([tag.decode(), body[1:], True])
+                i += 1
+
+            # A trailing marker applies to the last line of the hunk
+            while i < len(lines) and lines[i].startswith(NO_NEWLINE):
+                hunk.lines[-1][2] = False
+                i += 1
+            current.hunks.append(hunk)
+            continue
+
+        if line.startswith(b"GIT binary patch") or line.startswith(b"Binary files "):
+            raise PatchError("binary patches are not supported")
+        i += 1
+
+    return file_patches
+
+
+def touched_paths(file_patches):
+    """Return the set of source paths a parsed patch reads or writes."""
+    paths = set()
+    for file_patch in file_patches:
+        for path in (file_patch.old_path, file_patch.new_path):
+            if path is not None:
+                paths.add(path)
+    return paths
+
+
+def _find(lines, pattern, expected, floor):
+    """Find pattern in lines, searching outward from the expected position."""
+    last = len(lines) - len(pattern)
+    if last < floor:
+        return None
+    expected = min(max(expected, floor), last)
+    for distance in range(0, max(expected - floor, last - expected) + 1):
+        for position in (expected - distance, expected + distance):
+            if floor <= position <= last and all(
+                _content(lines[position + k]) == pattern[k] for k in range(len(pattern))
+            ):
+                return position
+            if distance == 0:
+                break
+    return None
+
+
+def _line_ending(lines):
+    """Return the end-of-line marker a file already uses, LF by default."""
+    for line in lines:
+        if line.endswith(b"\r\n"):
+            return b"\r\n"
+        if line.endswith(b"\n"):
+            return b"\n"
+    return b"\n"
+
+
+def apply_hunks(lines, file_patch, patch_name="", max_fuzz=DEFAULT_FUZZ, failed=None):
+    """Apply a FilePatch to a list of lines and return (new lines, results).
+
+    Added lines get the file's own line ending, so CRLF files stay CRLF.
+    If failed is a list, hunks that don't apply are skipped and their
+    indexes appended to it instead of raising PatchError.
+    """
+    lines = list(lines)
+    eol = _line_ending(lines)
+    results = []
+    delta = 0
+    floor = 0
+
+    for index, hunk in enumerate(file_patch.hunks, start=1):
+        body = hunk.lines
+        leading = next((k for k, l in enumerate(body) if l[0] != " "), len(body))
+        trailing = next((k for k, l in enumerate(reversed(body)) if l[0] != " "), len(body))
+
+        expected = hunk.old_start - 1 if hunk.old_len else hunk.old_start
+        expected += delta
+        placed = None
+        for fuzz in range(0, max_fuzz + 1):
+            lead = min(fuzz, leading)
+            trail = min(fuzz, trailing)
+            if fuzz and lead + trail == 0:
+                break
+            trimmed = body[lead:len(body) - trail]
+            pattern = [content for tag, content, _ in trimmed if tag != "+"]
+            position = _find(lines, pattern, expected + lead, floor)
+            if position is not None:
+                placed = (position, fuzz, lead, trimmed)
+                break
+            if lead == leading and trail == trailing:
+                break
+
+        if placed is None and failed is not None:
+            failed.append(index)
+            continue
+        if placed is None:
+            raise PatchError(
+                f"{patch_name}: hunk #{index} FAILED at {hunk.old_start} in {file_patch.path}"
+            )
+
+        position, fuzz, lead, trimmed = placed
+        replacement = []
+        cursor = position
+        for tag, content, has_newline in trimmed:
+            if tag == " ":
+                replacement.append(lines[cursor])
+                cursor += 1
+            elif tag == "-":
+                cursor += 1
+            else:
+                replacement.append(content + eol if has_newline else content)
+        lines[position:cursor] = replacement
+
+        offset = position - lead - expected
+        results.append(HunkResult(patch_name, file_patch.path, index, position - lead + 1, offset, fuzz))
+        delta += len(replacement) - (cursor - position)
+        floor = position + len(replacement)
+
+    return lines, results
+
+
+def read_source(src_dir, path):
+    """Read a source file as bytes, or None if it does not exist."""
+    try:
+        return (src_dir / path).read_bytes()
+    except FileNotFoundError:
+        return None
+
+
+def _apply_group(src_dir, names, parsed, base, max_fuzz):
+    """Apply a group of patches that share files, in series order.
+
+    Runs in a worker process: parsed and base only hold the group's own
+    patches and files, and everything returned is plain data.
+    """
+    state = {}
+    backups = {}
+    results = []
+
+    def current(path):
+        if path not in state:
+            state[path] = base[path] if path in base else read_source(src_dir, path)
+        return state[path]
+
+    for name in names:
+        backups[name] = {path: current(path) for path in touched_paths(parsed[name])}
+        try:
+            for file_patch in parsed[name]:
+                data = current(file_patch.new_path if file_patch.creates else file_patch.old_path)
+                if file_patch.creates and data is not None:
+                    raise PatchError(f"{name}: {file_patch.new_path} already exists")
+                if not file_patch.creates and data is None:
+                    raise PatchError(f"{name}: {file_patch.old_path} does not exist")
+                new_lines, hunk_results = apply_hunks(
+                    (data or b"").splitlines(keepends=True), file_patch, name, max_fuzz
+                )
+                results.extend(hunk_results)
+                new_data = b"".join(new_lines)
+                if file_patch.deletes:
+                    if new_data:
+                        raise PatchError(f"{name}: {file_patch.old_path} not empty after removal")
+                    state[file_patch.old_path] = None
+                else:
+                    if file_patch.old_path and file_patch.old_path != file_patch.new_path:
+                        state[file_patch.old_path] = None
+                    state[file_patch.new_path] = new_data
+        except PatchError as e:
+            return state, backups, results, str(e)
+
+    return state, backups, results, None
+
+
+def group_patches(names, parsed):
+    """Split patches into groups that touch pairwise disjoint files."""
+    owner = {}
+    groups = []
+    for name in names:
+        paths = touched_paths(parsed[name])
+        merged = {owner[p] for p in paths if p in owner}
+        if merged:
+            target = min(merged)
+            for other in sorted(merged - {target}):
+                groups[target].extend(groups[other])
+                for p, g in list(owner.items()):
+                    if g == other:
+                        owner[p] = target
+                groups[other] = []
+        else:
+            target = len(groups)
+            groups.append([])
+        groups[target].append(name)
+        for p in paths:
+            owner[p] = target
+
+    # Keep series order inside each group
+    order = {name: i for i, name in enumerate(names)}
+    return [sorted(g, key=order.__getitem__) for g in groups if g]
+
+
+def read_backups(src_dir, patch_name):
+    """Return {path: bytes or None} from quilt's backup of an applied patch."""
+    backup_dir = src_dir / ".pc" / patch_name
+    backups = {}
+    if not backup_dir.is_dir():
+        return backups
+    for path in backup_dir.rglob("*"):
+        if path.is_file() and path.name != ".timestamp":
+            data = path.read_bytes()
+            # Quilt stores files that did not exist as empty backups
+            backups[str(path.relative_to(backup_dir))] = data if data else None
+    return backups
+
+
+def plan_series(src_dir, pop_names, push_names, patches_dir=PATCHES_DIR, max_fuzz=DEFAULT_FUZZ):
+    """Pop and push patches in memory and return the resulting PatchPlan."""
+    plan = PatchPlan(popped=list(pop_names), pushed=list(push_names))
+
+    # Undo popped patches newest first, straight from their backups
+    base = {}
+    for name in reversed(pop_names):
+        base.update(read_backups(src_dir, name))
+
+    parsed = {}
+    for name in push_names:
+        try:
+            parsed[name] = parse_patch((patches_dir / name).read_bytes())
+        except (OSError, PatchError) as e:
+            plan.errors.append(f"{name}: {e}")
+    if plan.errors:
+        return plan
+
+    groups = group_patches(push_names, parsed)
+    jobs = []
+    for group in groups:
+        paths = set().union(*(touched_paths(parsed[name]) for name in group))
+        jobs.append((
+            src_dir, group, {name: parsed[name] for name in group},
+            {path: data for path, data in base.items() if path in paths}, max_fuzz,
+        ))
+    state = dict(base)
+    workers = min(len(jobs), os.cpu_count() or 1)
+    if workers > 1:
+        # Hunk matching is pure Python, so only processes get past the GIL;
+        # forkserver because the build stages call this from threads
+        with ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("forkserver")
+        ) as pool:
+            outcomes = list(pool.map(_apply_group, *zip(*jobs)))
+    else:
+        outcomes = [_apply_group(*job) for job in jobs]
+    for group_state, backups, results, error in outcomes:
+        state.update(group_state)
+        plan.backups.update(backups)
+        plan.results.extend(results)
+        if error:
+            plan.errors.append(error)
+
+    # Only keep files whose bytes actually change on disk
+    for path, data in state.items():
+        if data != read_source(src_dir, path):
+            plan.contents[path] = data
+    return plan
+
+
+def _write_atomic(path, data, mode=None):
+    """Replace a file's contents atomically, or delete it when data is None."""
+    if data is None:
+        if path.exists():
+            path.unlink()
+        return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.chmod(tmp_name, mode if mode is not None else 0o644)
+        os.replace(tmp_name, path)
+    except BaseException:
+        if os.path.exists(tmp_name):
+            os.unlink(tmp_name)
+        raise
+
+
+def _update_pc(src_dir, plan, patches_dir):
+    """Mirror the applied stack into quilt's .pc directory.
+
+    The new .pc is built in a copy and swapped in by renames, so a failure
+    part way leaves the old one as it was.
+    """
+    pc_dir = src_dir / ".pc"
+    staging = src_dir / ".pc.new"
+    shutil.rmtree(staging, ignore_errors=True)
+    if pc_dir.is_dir():
+        shutil.copytree(pc_dir, staging, symlinks=True)
+    else:
+        staging.mkdir()
+    (staging / ".version").write_text("2\n")
+    (staging / ".quilt_patches").write_text(f"{patches_dir}\n")
+    (staging / ".quilt_series").write_text("series\n")
+
+    applied_file = staging / "applied-patches"
+    applied = applied_file.read_text().split() if applied_file.exists() else []
+    for name in plan.popped:
+        shutil.rmtree(staging / name, ignore_errors=True)
+        if name in applied:
+            applied.remove(name)
+
+    for name in plan.pushed:
+        patch_pc = staging / name
+        shutil.rmtree(patch_pc, ignore_errors=True)
+        for path, data in plan.backups.get(name, {}).items():
+            backup = patch_pc / path
+            backup.parent.mkdir(parents=True, exist_ok=True)
+            backup.write_bytes(data or b"")
+        patch_pc.mkdir(parents=True, exist_ok=True)
+        (patch_pc / ".timestamp").touch()
+        applied.append(name)
+
+    applied_file.write_text("".join(f"{name}\n" for name in applied))
+
+    old = src_dir / ".pc.old"
+    shutil.rmtree(old, ignore_errors=True)
+    if pc_dir.exists():
+        pc_dir.rename(old)
+    try:
+        staging.rename(pc_dir)
+    except BaseException:
+        if old.exists():
+            old.rename(pc_dir)
+        raise
+    shutil.rmtree(old, ignore_errors=True)
+
+
+def write_plan(src_dir, plan, patches_dir=PATCHES_DIR):
+    """Write a successful plan to the tree, rolling back on any failure.
+
+    Source files are written first and .pc last, so on failure the files
+    are restored and .pc still describes them.
+    """
+    if plan.errors:
+        raise PatchError("refusing to write a plan with errors")
+
+    originals = {}
+    try:
+        for path, data in sorted(plan.contents.items()):
+            target = src_dir / path
+            mode = target.stat().st_mode & 0o7777 if target.exists() else None
+            originals[path] = (read_source(src_dir, path), mode)
+            _write_atomic(target, data, mode)
+        _update_pc(src_dir, plan, patches_dir)
+    except BaseException:
+        print("❌ Writing patched files failed, rolling back...")
+        for path, (data, mode) in originals.items():
+            _write_atomic(src_dir / path, data, mode)
+        shutil.rmtree(src_dir / ".pc.new", ignore_errors=True)
+        raise
+
+
+def report(plan):
+    """Print per-hunk offsets and fuzz the way patch(1) does."""
+    for result in plan.results:
+        if result.offset or result.fuzz:
+            notes = []
+            if result.fuzz:
+                notes.append(f"fuzz {result.fuzz}")
+            if result.offset:
+                notes.append(f"offset {result.offset} lines")
+            print(f"  {result.patch}: {result.path} hunk #{result.index} "
+                  f"succeeded at {result.line} ({', '.join(notes)})")
+    for error in plan.errors:
+        print(f"  ❌ {error}")
+
+
+def main():
+    """Check or apply the whole series against a source tree."""
+    parser = argparse.ArgumentParser(description="Apply patches/series natively")
+    parser.add_argument("src_dir", nargs="?", type=Path, default=CHROMIUM_DIR / "src")
+    parser.add_argument("--dry-run", action="store_true", help="check without writing")
+    parser.add_argument("--fuzz", type=int, default=DEFAULT_FUZZ)
+    args = parser.parse_args()
+
+    src_dir = args.src_dir.resolve()
+    applied_file = src_dir / ".pc" / "applied-patches"
+    applied = applied_file.read_text().split() if applied_file.exists() else []
+    plan = plan_series(src_dir, applied, read_series(), max_fuzz=args.fuzz)
+    report(plan)
+
+    if plan.errors:
+        print(f"❌ {len(plan.errors)} patches failed, tree left untouched")
+        sys.exit(1)
+    if args.dry_run:
+        print(f"✓ All patches apply ({len(plan.contents)} files would change)")
+        return
+    write_plan(src_dir, plan)
+    print(f"✓ All patches applied ({len(plan.contents)} files changed)")
+
+
+if __name__ == "__main__":
+    main()
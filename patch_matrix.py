@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""
+Cross-version patch compatibility matrix
+Dry-runs every patch in patches/series against several Chromium source trees
+or tags at once and reports, per patch and version, how many hunks apply
+cleanly, at an offset, only with fuzz, or not at all. Tags are read straight
+from the shared git cache without a checkout. Results are cached per patch and
+source tree, and patches whose hunks only moved can be refreshed automatically.
+
+Usage: ./patch_matrix.py [--refresh] [--fuzz N] [tag | source-dir]...
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from patch_engine import (
+    DEFAULT_FUZZ, HUNK_HEADER, PatchError, apply_hunks, group_patches, parse_patch,
+    read_backups, read_source, touched_paths,
+)
+from patch_series import PATCHES_DIR, read_series
+from source_cache import SRC_MIRROR, update_mirror
+
+# Configuration (overridable from the environment)
+SCRIPT_DIR = Path(__file__).parent.resolve()
+CHROMIUM_DIR = SCRIPT_DIR / "chromium-src"
+REFRESH_DIR = SCRIPT_DIR / "patches-refreshed"
+CACHE_FILE = Path(os.environ.get(
+    "BETTER_CHROMIUM_PATCH_MATRIX_CACHE",
+    str(Path.home() / ".cache" / "better-chromium" / "patch-matrix.json"),
+)).expanduser()
+
+STATUSES = ["clean", "offset", "fuzz", "conflict"]
+SYMBOLS = {"offset": "~", "fuzz": "?", "conflict": "✗"}
+
+
+class DirectoryTree:
+    """A source checkout; files patched by quilt are read from their .pc backups."""
+
+    def __init__(self, src_dir):
+        self.src_dir = src_dir.resolve()
+        self.label = str(src_dir)
+        applied_file = self.src_dir / ".pc" / "applied-patches"
+        applied = applied_file.read_text().split() if applied_file.exists() else []
+        # Newest first, so the oldest backup of a file (the pristine one) wins
+        self.pristine = {}
+        for name in reversed(applied):
+            self.pristine.update(read_backups(self.src_dir, name))
+
+    def read(self, paths):
+        """Return {path: bytes or None} of the unpatched files."""
+        return {
+            path: self.pristine[path] if path in self.pristine
+            else read_source(self.src_dir, path)
+            for path in paths
+        }
+
+    def tree_hash(self, paths):
+        """Hash the unpatched contents of paths; only they decide how a patch applies."""
+        digest = hashlib.sha256()
+        for path, data in sorted(self.read(paths).items()):
+            digest.update(f"{path}\0".encode())
+            digest.update(hashlib.sha256(data).digest() if data is not None else b"-")
+        return digest.hexdigest()
+
+
+class TagTree:
+    """A Chromium tag in the git cache, read without checking it out."""
+
+    def __init__(self, tag):
+        self.tag = tag
+        self.label = tag
+
+    def _git(self, *args, **kwargs):
+        return subprocess.run(["git", "-C", str(SRC_MIRROR)] + list(args),
+                              check=True, capture_output=True, **kwargs)
+
+    def read(self, paths):
+        """Return {path: bytes or None} through a single git cat-file process."""
+        files = {}
+        with subprocess.Popen(
+            ["git", "-C", str(SRC_MIRROR), "cat-file", "--batch"],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+        ) as batch:
+            for path in sorted(paths):
+                batch.stdin.write(f"refs/tags/{self.tag}:{path}\n".encode())
+                batch.stdin.flush()
+                header = batch.stdout.readline().split()
+                if header[-1] == b"missing":
+                    files[path] = None
+                    continue
+                files[path] = batch.stdout.read(int(header[2]))
+                batch.stdout.read(1)
+            batch.stdin.close()
+        return files
+
+    def tree_hash(self, paths):
+        """Hash the blob ids of paths at this tag; no file contents are read."""
+        listing = self._git("ls-tree", f"refs/tags/{self.tag}", "--", *sorted(paths)).stdout
+        return hashlib.sha256(listing).hexdigest()
+
+
+def load_cache():
+    try:
+        return json.loads(CACHE_FILE.read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def save_cache(cache):
+    CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=CACHE_FILE.parent, prefix=f".{CACHE_FILE.name}.")
+    with os.fdopen(fd, "w") as f:
+        json.dump(cache, f, sort_keys=True)
+    os.replace(tmp_name, CACHE_FILE)
+
+
+def _classify(result):
+    if result.fuzz:
+        return "fuzz"
+    return "offset" if result.offset else "clean"
+
+
+def check_group(tree, group, parsed, max_fuzz):
+    """Dry-run a group of patches that share files; return {name: outcome}.
+
+    Each outcome holds one [path, hunk index, status, offset] entry per hunk,
+    the first file-level error, if any, and the earlier patch in the group
+    that conflicted. Hunks that fail are skipped so the rest of the patch,
+    and later patches on the same files, still get checked.
+    """
+    paths = set().union(*(touched_paths(parsed[name]) for name in group))
+    state = tree.read(paths)
+    outcomes = {}
+    after_conflict = None
+    for name in group:
+        hunks = []
+        error = None
+        for file_patch in parsed[name]:
+            data = state[file_patch.new_path if file_patch.creates else file_patch.old_path]
+            if file_patch.creates and data is not None:
+                problem = f"{file_patch.new_path} already exists"
+            elif not file_patch.creates and data is None:
+                problem = f"{file_patch.old_path} does not exist"
+            else:
+                problem = None
+            if problem:
+                error = error or problem
+                hunks += [[file_patch.path, index, "conflict", 0]
+                          for index in range(1, len(file_patch.hunks) + 1)]
+                continue
+
+            failed = []
+            new_lines, results = apply_hunks(
+                (data or b"").splitlines(keepends=True), file_patch, name, max_fuzz, failed
+            )
+            statuses = {r.index: [file_patch.path, r.index, _classify(r), r.offset]
+                        for r in results}
+            statuses.update({index: [file_patch.path, index, "conflict", 0] for index in failed})
+            hunks += [statuses[index] for index in sorted(statuses)]
+            if file_patch.old_path and file_patch.old_path != file_patch.new_path:
+                state[file_patch.old_path] = None
+            if not file_patch.deletes:
+                state[file_patch.new_path] = b"".join(new_lines)
+        outcomes[name] = {"hunks": hunks, "error": error, "after_conflict": after_conflict}
+        if after_conflict is None and any(status == "conflict" for _, _, status, _ in hunks):
+            after_conflict = name
+    return outcomes
+
+
+def check_tree(tree, names, parsed, patch_hashes, cache, max_fuzz):
+    """Return {patch name: outcome} for one tree, from the cache where possible.
+
+    A patch's cache key covers the source files its group touches plus the
+    patches before it in that group, since those change what it applies to.
+    """
+    outcomes = {}
+    for group in group_patches(names, parsed):
+        paths = set().union(*(touched_paths(parsed[name]) for name in group))
+        tree_hash = tree.tree_hash(paths)
+        keys = {}
+        chain = hashlib.sha256(f"{max_fuzz}:{tree_hash}".encode())
+        for name in group:
+            chain.update(patch_hashes[name].encode())
+            keys[name] = chain.hexdigest()
+        if all(key in cache for key in keys.values()):
+            outcomes.update({name: cache[keys[name]] for name in group})
+            continue
+        checked = check_group(tree, group, parsed, max_fuzz)
+        for name in group:
+            cache[keys[name]] = checked[name]
+        outcomes.update(checked)
+    return outcomes
+
+
+def refresh_patch(data, file_patches, hunks):
+    """Return the patch with every hunk header moved by its offset.
+
+    Only valid when all hunks applied without fuzz; everything but the @@
+    line numbers is kept byte for byte.
+    """
+    lines = data.split(b"\n")
+    offsets = iter(offset for _, _, _, offset in hunks)
+    for file_patch in file_patches:
+        for hunk in file_patch.hunks:
+            offset = next(offsets)
+            line = lines[hunk.header_index]
+            match = HUNK_HEADER.match(line)
+            old_len = b"," + match.group(2) if match.group(2) is not None else b""
+            new_len = b"," + match.group(4) if match.group(4) is not None else b""
+            lines[hunk.header_index] = b"@@ -%d%s +%d%s @@" % (
+                hunk.old_start + offset, old_len, hunk.new_start + offset, new_len
+            ) + line[match.end():]
+    return b"\n".join(lines)
+
+
+def _cell(outcome):
+    counts = {status: 0 for status in STATUSES}
+    for _, _, status, _ in outcome["hunks"]:
+        counts[status] += 1
+    if not any(counts[status] for status in SYMBOLS):
+        return "✓"
+    return " ".join(f"{symbol}{counts[status]}"
+                    for status, symbol in SYMBOLS.items() if counts[status])
+
+
+def print_matrix(trees, names, matrix):
+    """Print one row per patch and one column per tree."""
+    width = max(len(name) for name in names)
+    columns = [max(len(tree.label), 9) for tree in trees]
+    print(f"{'':{width}}  " + "  ".join(f"{tree.label:{column}}"
+                                       for tree, column in zip(trees, columns)))
+    for name in names:
+        print(f"{name:{width}}  " + "  ".join(f"{_cell(matrix[tree.label][name]):{column}}"
+                                           for tree, column in zip(trees, columns)))
+    print("✓ clean   ~N hunks at an offset   ?N hunks need fuzz   ✗N hunks conflict")
+
+
+def print_problems(tree, names, outcomes):
+    """List the hunks that need attention in one tree."""
+    for name in names:
+        outcome = outcomes[name]
+        if outcome["error"]:
+            print(f"  ❌ {name}: {outcome['error']}")
+        for path, index, status, _ in outcome["hunks"]:
+            if status == "conflict":
+                print(f"  ❌ {name}: {path} hunk #{index} conflicts")
+            elif status == "fuzz":
+                print(f"  ⚠ {name}: {path} hunk #{index} only applies with fuzz")
+
+
+def main():
+    """Check the patch series against several Chromium versions."""
+    from arch_build import CHROMIUM_URL, CHROMIUM_VERSION
+
+    parser = argparse.ArgumentParser(description="Check patches against Chromium versions")
+    parser.add_argument(
+        "targets", nargs="*",
+        help=f"Chromium tags or source dirs (default: the checkout, or {CHROMIUM_VERSION})",
+    )
+    parser.add_argument("--fuzz", type=int, default=DEFAULT_FUZZ)
+    parser.add_argument(
+        "--refresh", action="store_true",
+        help=f"write patches whose hunks only moved to {REFRESH_DIR.name}/<target>/",
+    )
+    parser.add_argument("--threads", type=int, help="trees checked at once (default: all CPUs)")
+    args = parser.parse_args()
+
+    targets = args.targets
+    if not targets:
+        src_dir = CHROMIUM_DIR / "src"
+        targets = [str(src_dir)] if src_dir.is_dir() else [CHROMIUM_VERSION]
+
+    trees = []
+    for target in targets:
+        if Path(target).is_dir():
+            trees.append(DirectoryTree(Path(target)))
+            continue
+        # Fetching is network bound and serialized by the cache lock anyway
+        try:
+            update_mirror(CHROMIUM_URL, target)
+        except (ValueError, subprocess.CalledProcessError) as e:
+            print(f"❌ Could not get {target}: {e}")
+            sys.exit(1)
+        trees.append(TagTree(target))
+
+    names = read_series()
+    if not names:
+        print("❌ No patches in patches/series")
+        sys.exit(1)
+    raw = {name: (PATCHES_DIR / name).read_bytes() for name in names}
+    try:
+        parsed = {name: parse_patch(data) for name, data in raw.items()}
+    except PatchError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    patch_hashes = {name: hashlib.sha256(data).hexdigest() for name, data in raw.items()}
+
+    print(f"Checking {len(names)} patches against {len(trees)} source trees...")
+    cache = load_cache()
+    with ThreadPoolExecutor(max_workers=args.threads or os.cpu_count() or 1) as pool:
+        results = pool.map(
+            lambda tree: check_tree(tree, names, parsed, patch_hashes, cache, args.fuzz), trees
+        )
+        matrix = {tree.label: outcome for tree, outcome in zip(trees, results)}
+    save_cache(cache)
+
+    print()
+    print_matrix(trees, names, matrix)
+    conflicts = 0
+    for tree in trees:
+        outcomes = matrix[tree.label]
+        statuses = [status for name in names for _, _, status, _ in outcomes[name]["hunks"]]
+        conflicts += statuses.count("conflict")
+        print(f"\n{tree.label}: " + ", ".join(
+            f"{statuses.count(status)} {status}" for status in STATUSES
+        ))
+        print_problems(tree, names, outcomes)
+
+        if not args.refresh:
+            continue
+        refreshable = [
+            name for name in names
+            # Offsets measured on top of a conflicting patch aren't trustworthy
+            if not outcomes[name]["error"] and not outcomes[name].get("after_conflict")
+            and all(status in ("clean", "offset") for _, _, status, _ in outcomes[name]["hunks"])
+            and any(status == "offset" for _, _, status, _ in outcomes[name]["hunks"])
+        ]
+        out_dir = REFRESH_DIR / re.sub(r"[^\w.-]+", "_", tree.label.strip("/"))
+        for name in refreshable:
+            path = out_dir / name
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(refresh_patch(raw[name], parsed[name], outcomes[name]["hunks"]))
+        if refreshable:
+            print(f"  ✓ {len(refreshable)} patches with moved hunks refreshed into {out_dir}")
+
+    if conflicts:
+        print(f"\n❌ {conflicts} conflicting hunks need manual rebasing")
+        sys.exit(1)
+    print("\n✓ Every patch applies to every tree checked")
+
+
+if __name__ == "__main__":
+    main()
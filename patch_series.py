@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Patch series helpers shared by the Better Chromium build scripts
+Reads the quilt series file and hashes patch contents
+"""
+
+import hashlib
+from pathlib import Path
+
+# Configuration
+SCRIPT_DIR = Path(__file__).parent.resolve()
+PATCHES_DIR = SCRIPT_DIR / "patches"
+
+
+def hash_file(path):
+    """Return the SHA-256 hex digest of a file, or None if it is missing."""
+    digest = hashlib.sha256()
+    try:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+
+def read_series(patches_dir=PATCHES_DIR):
+    """Return the patch names listed in the series file, in order."""
+    series_file = patches_dir / "series"
+    if not series_file.exists():
+        return []
+
+    patches = []
+    for line in series_file.read_text().splitlines():
+        # Quilt treats everything after '#' as a comment and allows
+        # options such as -p1 after the patch name
+        line = line.split("#", 1)[0].strip()
+        if line:
+            patches.append(line.split()[0])
+    return patches
+
+
+def series_hashes(patches_dir=PATCHES_DIR):
+    """Return (patch name, content hash) pairs in series order."""
+    return [
+        (name, hash_file(patches_dir / name))
+        for name in read_series(patches_dir)
+    ]
+
+
+def touched_files(patch_path):
+    """Return the source paths a -p1 patch modifies, from its diff headers."""
+    files = []
+    old_path = None
+    try:
+        lines = Path(patch_path).read_text(errors="replace").splitlines()
+    except OSError:
+        return files
+
+    for line in lines:
+        if line.startswith("--- "):
+            old_path = line[4:].split("\t", 1)[0].strip()
+        elif line.startswith("+++ ") and old_path is not None:
+            new_path = line[4:].split("\t", 1)[0].strip()
+            # Deleted files only name the old path
+            path = old_path if new_path == "/dev/null" else new_path
+            old_path = None
+            parts = path.split("/", 1)
+            if len(parts) == 2 and parts[1] not in files:
+                files.append(parts[1])
+    return files
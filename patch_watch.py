@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Watch mode for Better Chromium patch development
+Stays resident and watches patches/ and the series file with inotify. Once a
+burst of saves has settled it re-applies only the patches that changed and
+runs ninja for the profiles whose build graph the changed files reach, or
+that the graph can't vouch for. The series hashes and each out directory's
+impact index stay in memory between rebuilds, so only what changed is re-read.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import subprocess
+import time
+from pathlib import Path
+
+from arch_build import configure_build, run_builds
+from impact_index import format_estimate, load_index
+from patch_series import PATCHES_DIR, series_hashes
+from patching import apply_series
+from source_cache import cache_env
+
+# Configuration (overridable from the environment)
+SCRIPT_DIR = Path(__file__).parent.resolve()
+CHROMIUM_DIR = SCRIPT_DIR / "chromium-src"
+DEPOT_TOOLS_DIR = SCRIPT_DIR / "depot_tools"
+# Editors save in several steps (swap file, rename, chmod): wait this long for quiet
+DEBOUNCE = float(os.environ.get("BETTER_CHROMIUM_WATCH_DEBOUNCE", "0.3"))
+
+# From <sys/inotify.h>
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_Q_OVERFLOW = 0x4000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+EVENT = struct.Struct("iIII")
+READ_SIZE = 64 * 1024
+
+
+class Inotify:
+    """Just enough of inotify(7) through libc, so watching needs no extra packages."""
+
+    def __init__(self):
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = self._libc.inotify_init1(os.O_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, f"inotify_init1: {os.strerror(errno)}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        os.close(self.fd)
+
+    def add_watch(self, path, mask=WATCH_MASK):
+        if self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask) < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), str(path))
+
+    def read(self, timeout=None):
+        """Return the names of changed entries, or [] if none came within timeout.
+
+        A queue overflow is reported as an empty name: something changed.
+        """
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        data = os.read(self.fd, READ_SIZE)
+        names = []
+        pos = 0
+        while pos < len(data):
+            _, mask, _, length = EVENT.unpack_from(data, pos)
+            pos += EVENT.size
+            name = data[pos:pos + length].rstrip(b"\0")
+            pos += length
+            names.append("" if mask & IN_Q_OVERFLOW else os.fsdecode(name))
+        return names
+
+
+def wait_for_changes(inotify, debounce=DEBOUNCE):
+    """Block until something changes, then until debounce seconds pass quietly.
+
+    Returns the set of names changed in the whole burst.
+    """
+    changed = set(inotify.read())
+    while True:
+        names = inotify.read(debounce)
+        if not names:
+            return changed
+        changed.update(names)
+
+
+class Watcher:
+    """Brings the tree and the binaries up to date with the patches, in one process."""
+
+    def __init__(self, profiles):
+        self.profiles = profiles
+        self.src_dir = CHROMIUM_DIR / "src"
+        # Series hashes the binaries were last successfully built from
+        self.series = None
+        # profile name -> (build.ninja mtime, ImpactIndex or None)
+        self.indexes = {}
+        # Profiles whose last build failed get rebuilt whatever changes next
+        self.failed = set()
+
+    def _index(self, profile):
+        """Return the profile's impact index, reloading it only after gn regenerated."""
+        out_path = self.src_dir / profile.out_dir
+        try:
+            stamp = (out_path / "build.ninja").stat().st_mtime_ns
+        except OSError:
+            return None
+        cached = self.indexes.get(profile.name)
+        if cached is None or cached[0] != stamp:
+            cached = (stamp, load_index(out_path))
+            self.indexes[profile.name] = cached
+        return cached[1]
+
+    def _affected(self, changed):
+        """Return the profiles ninja has work for.
+
+        A profile is built anyway when it has no build graph, its last build
+        failed, or a changed file is one the graph can't account for: gn
+        files, which gn tracks outside the chrome closure, and new files.
+        """
+        affected = []
+        for profile in self.profiles:
+            index = self._index(profile)
+            if index is None or profile.name in self.failed:
+                affected.append(profile)
+                continue
+            unknown = {path for path in changed if path.endswith((".gn", ".gni"))}
+            unknown.update(index.unknown_paths(sorted(changed)))
+            if unknown:
+                print(f"  {profile.name}: {len(unknown)} changed files outside the build graph, "
+                      "letting ninja check")
+                affected.append(profile)
+                continue
+            estimate = index.estimate(sorted(changed))
+            steps = estimate["compile"] + estimate["link"] + estimate["other"]
+            if steps:
+                print(f"  {profile.name}: {format_estimate(estimate)}")
+                affected.append(profile)
+            else:
+                print(f"  {profile.name}: no build steps depend on the changed files")
+        return affected
+
+    def update(self, started=None):
+        """Apply what changed in the series and rebuild; return False on failure.
+
+        Failures are reported rather than raised, so the watcher keeps
+        going; the series is only recorded once every build succeeded, so
+        saving again retries.
+        """
+        started = started or time.monotonic()
+        series = series_hashes(PATCHES_DIR)
+        if series == self.series:
+            print("✓ Series unchanged")
+            return True
+        try:
+            return self._update(series, started)
+        except SystemExit as e:
+            # gn gen and the other arch_build helpers exit on failure
+            print(f"❌ Build setup failed (exit code {e.code}); watching for the next save")
+        except subprocess.CalledProcessError as e:
+            print(f"❌ {e}; watching for the next save")
+        self.failed = {profile.name for profile in self.profiles}
+        return False
+
+    def _update(self, series, started):
+        first = self.series is None
+
+        changed = set()
+        if not apply_series(self.src_dir, PATCHES_DIR, changed):
+            print("❌ Fix or refresh the failing patches; watching for the next save")
+            return False
+
+        # Hooks only matter when a patch touches the dependency list
+        if "DEPS" in changed:
+            print("Running gclient hooks...")
+            if subprocess.run(["gclient", "runhooks"], cwd=self.src_dir).returncode != 0:
+                print("⚠ Warning: gclient hooks had issues, continuing anyway...")
+
+        for profile in self.profiles:
+            configure_build(profile)
+        # The first pass can't know what the last build missed, so ninja checks everything
+        profiles = self.profiles if first else self._affected(changed)
+        if not profiles:
+            print("✓ Binaries already up to date")
+            self.series = series
+            return True
+
+        results = run_builds(profiles)
+        self.failed = {name for name, code in results.items() if code != 0}
+        for name in sorted(self.failed):
+            print(f"❌ {name} failed with exit code {results[name]}")
+        if self.failed:
+            return False
+        self.series = series
+        for profile in profiles:
+            print(f"✓ {self.src_dir / profile.out_dir / 'chrome'} rebuilt "
+                  f"in {time.monotonic() - started:.1f}s")
+        return True
+
+
+def watch(profiles):
+    """Rebuild on every settled change to patches/ until interrupted."""
+    # depot_tools must be on PATH for gn and gclient, fetching through the git cache
+    os.environ["PATH"] = f"{DEPOT_TOOLS_DIR}:{os.environ['PATH']}"
+    os.environ.update(cache_env())
+
+    watcher = Watcher(profiles)
+    with Inotify() as inotify:
+        # Editors that save by renaming replace series and patches, so watch the directory
+        inotify.add_watch(PATCHES_DIR)
+        watcher.update()
+        print(f"\n👀 Watching {PATCHES_DIR} (Ctrl+C to stop)")
+        try:
+            while True:
+                names = wait_for_changes(inotify)
+                started = time.monotonic()
+                # Editors' temporary files are gone again by the time the burst settles
+                shown = ", ".join(sorted(
+                    name for name in names if name and (PATCHES_DIR / name).exists()
+                )) or "patches/"
+                print(f"\n🔁 Changed: {shown}")
+                watcher.update(started)
+                print(f"\n👀 Watching {PATCHES_DIR} (Ctrl+C to stop)")
+        except KeyboardInterrupt:
+            print("\nStopped watching")
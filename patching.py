@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Incremental patch application for Better Chromium
+Only pops back to the first patch that changed and pushes forward from there.
+The native patch engine works in memory and only writes files whose bytes
+change, so untouched sources keep their timestamps and ninja skips them.
+"""
+
+import json
+
+from patch_engine import plan_series, report, write_plan
+from patch_series import PATCHES_DIR, series_hashes
+
+APPLIED_STATE_FILE = ".better-chromium-applied.json"
+
+
+def read_applied(src_dir):
+    """Return the patch names quilt has applied to the source tree."""
+    applied_file = src_dir / ".pc" / "applied-patches"
+    if not applied_file.exists():
+        return []
+    return [line.strip() for line in applied_file.read_text().splitlines() if line.strip()]
+
+
+def load_applied_hashes(src_dir):
+    """Load the patch hashes recorded when the applied patches were pushed."""
+    try:
+        with open(src_dir / ".pc" / APPLIED_STATE_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_applied_hashes(src_dir, hashes):
+    """Record the hashes of the patches that are currently applied."""
+    state_path = src_dir / ".pc" / APPLIED_STATE_FILE
+    if not state_path.parent.exists():
+        return
+    with open(state_path, "w") as f:
+        json.dump(hashes, f, indent=2)
+        f.write("\n")
+
+
+def first_changed_index(series, applied, recorded):
+    """Return how many applied patches still match the series exactly."""
+    keep = 0
+    for index, name in enumerate(applied):
+        if index >= len(series):
+            break
+        series_name, digest = series[index]
+        if series_name != name or digest is None or recorded.get(name) != digest:
+            break
+        keep = index + 1
+    return keep
+
+
+def plan_update(src_dir, patches_dir=PATCHES_DIR):
+    """Work out in memory what bringing the tree up to date would change.
+
+    Returns (series, plan) where plan is None when nothing needs doing.
+    """
+    series = series_hashes(patches_dir)
+    applied = read_applied(src_dir)
+    recorded = load_applied_hashes(src_dir)
+    keep = first_changed_index(series, applied, recorded)
+
+    if keep == len(applied) == len(series):
+        print(f"✓ All {len(series)} patches already applied and unchanged")
+        return series, None
+
+    pop_names = applied[keep:]
+    push_names = [name for name, _ in series[keep:]]
+    if pop_names:
+        print(f"Popping {len(pop_names)} patches back to "
+              f"{applied[keep - 1] if keep else 'a clean tree'}...")
+    if push_names:
+        print(f"Applying {len(push_names)} patches from {push_names[0]}...")
+
+    plan = plan_series(src_dir, pop_names, push_names, patches_dir)
+    report(plan)
+    return series, plan
+
+
+def apply_series(src_dir, patches_dir=PATCHES_DIR, changed=None):
+    """Bring the applied patch stack in line with the series.
+
+    Returns True when the whole series ended up applied. If changed is a
+    set, the source paths that were written are added to it.
+    """
+    series, plan = plan_update(src_dir, patches_dir)
+    if plan is None:
+        return True
+    if plan.errors:
+        print("❌ Patches did not apply cleanly, source tree left untouched")
+        return False
+
+    write_plan(src_dir, plan, patches_dir)
+    print(f"✓ {len(plan.contents)} source files changed")
+    if changed is not None:
+        changed.update(plan.contents)
+
+    digests = dict(series)
+    save_applied_hashes(src_dir, {
+        name: digests.get(name) for name in read_applied(src_dir)
+    })
+    return True
@@ -5,18 +5,23 @@ Use this when you've added new patches or made changes to source
 Much faster than full build since Chromium sources are already present
 """
 
+import argparse
 import os
 import sys
 import subprocess
-import multiprocessing
 from pathlib import Path
 
+from arch_build import build_chromium, configure_build
+from build_profiles import add_profile_argument, load_profiles
+from impact_index import format_estimate, print_patch_estimates
+from patching import apply_series, plan_update
+from source_cache import cache_env
+
 # Configuration
 SCRIPT_DIR = Path(__file__).parent.resolve()
 PATCHES_DIR = SCRIPT_DIR / "patches"
 CHROMIUM_DIR = SCRIPT_DIR / "chromium-src"
 DEPOT_TOOLS_DIR = SCRIPT_DIR / "depot_tools"
-OUT_DIR = "out/Default"
 
 # Disable depot_tools auto-update
 os.environ["DEPOT_TOOLS_UPDATE"] = "0"
@@ -46,8 +51,41 @@ def run_command(cmd, cwd=None, check=True):
     return result
 
 
+def parse_args():
+    """Parse command line options."""
+    parser = argparse.ArgumentParser(description="Rebuild Chromium after patch changes")
+    parser.add_argument(
+        "--dry-run", action="store_true",
+        help="show which patches would be re-applied and the estimated rebuild cost",
+    )
+    add_profile_argument(parser, multiple=True)
+    return parser.parse_args()
+
+
+def dry_run(src_dir, profiles):
+    """Report what a rebuild would re-apply and recompile without doing it."""
+    _, plan = plan_update(src_dir, PATCHES_DIR)
+    if plan is None:
+        return
+    if plan.errors:
+        print("❌ Patches would not apply cleanly")
+        sys.exit(1)
+    
+    for profile in profiles:
+        out_path = src_dir / profile.out_dir
+        print()
+        print(f"Estimated rebuild cost ({profile.name}):")
+        index = print_patch_estimates(out_path, plan.pushed)
+        if index is not None:
+            total = index.estimate(sorted(plan.contents))
+            print(f"  Total for {len(plan.contents)} changed files: {format_estimate(total)}")
+
+
 def main():
     """Quick rebuild with patches."""
+    args = parse_args()
+    profiles = load_profiles(args.profiles)
+    
     print("=" * 48)
     print("Better Chromium - Quick Rebuild")
     print("=" * 48)
@@ -60,59 +98,43 @@ def main():
         print("❌ Chromium source not found. Run ./arch_build.py first to do initial setup.")
         sys.exit(1)
     
-    # Add depot_tools to PATH
+    # Add depot_tools to PATH, with fetches going through the shared git cache
     os.environ["PATH"] = f"{DEPOT_TOOLS_DIR}:{os.environ['PATH']}"
+    os.environ.update(cache_env())
     
-    os.chdir(src_dir)
+    if args.dry_run:
+        dry_run(src_dir, profiles)
+        return
     
-    # Set up quilt environment
-    os.environ["QUILT_PATCHES"] = str(PATCHES_DIR)
-    
-    # Pop all patches (reset to clean state)
-    print("Resetting to clean state...")
-    result = run_command(["quilt", "pop", "-a"], check=False)
-    if result.returncode not in (0, 2):
-        print("⚠ Warning: Issue popping patches, continuing anyway...")
-    
-    # Apply patches
+    # Re-apply only the patches that changed since the last run
     series_file = PATCHES_DIR / "series"
     if series_file.exists():
-        print("Applying patches...")
-        result = run_command(["quilt", "push", "-a"], check=False)
-        
-        if result.returncode == 0:
+        if apply_series(src_dir, PATCHES_DIR):
             print("✓ All patches applied successfully")
-        elif result.returncode == 2:
-            print("✓ No patches to apply or already applied")
         else:
-            print("⚠ Warning: Some patches may have failed to apply")
-            print("Continuing with build anyway...")
+            print("❌ Fix or refresh the failing patches and rerun")
+            sys.exit(1)
     else:
         print("⚠ No patches/series file found")
     
     # Run hooks (if needed for new dependencies)
     print("Running gclient hooks...")
-    result = run_command(["gclient", "runhooks"], check=False)
+    result = run_command(["gclient", "runhooks"], cwd=src_dir, check=False)
     if result.returncode != 0:
         print("⚠ Warning: gclient hooks had issues, continuing anyway...")
     
-    # Rebuild
-    print("Rebuilding Chromium with changes...")
-    num_jobs = multiprocessing.cpu_count() * 2
-    print(f"Building with {num_jobs} parallel jobs...")
-    print("Using optimized build configuration...")
+    # Regenerate build files only where a profile's gn args changed
+    for profile in profiles:
+        configure_build(profile)
     
-    cmd = ["ninja", "-C", OUT_DIR, f"-j{num_jobs}", "chrome"]
-    run_command(cmd)
+    # Rebuild every requested variant from the one patched tree
+    print("Rebuilding Chromium with changes...")
+    build_chromium(profiles)
     
-    binary_path = src_dir / OUT_DIR / "chrome"
     print()
-    print("=" * 48)
     print("✓ Rebuild complete!")
-    print(f"Binary location: {binary_path}")
-    print("=" * 48)
-    print()
-    print("Next: Run './release.py' to create release package")
+    options = " ".join(f"--profile {profile.name}" for profile in profiles)
+    print(f"Next: Run './release.py {options}' to create release packages")
 
 
 if __name__ == "__main__":
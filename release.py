@@ -3,17 +3,30 @@
 Create GitHub release package for Better Chromium
 """
 
+import argparse
 import os
 import sys
 import subprocess
 import shutil
+import tarfile
+import time
 from pathlib import Path
-import glob
+
+from artifact_store import publish
+from build_profiles import add_profile_argument, load_profiles
+from compression import DEFAULT_FORMAT, FORMATS, check_format, default_threads
+from fingerprint import load_fingerprint
+from integrity import DEFAULT_ALGORITHMS, write_manifests
+from release_delta import DELTA_SUFFIX, check_delta, find_base, write_delta
+from release_archive import stage_directory, write_tarball
+from release_image import IMAGE_SUFFIX, check_image, write_image
+from release_files import APP_DIR, LOCALES_DIR, collect_files, subset_files
 
 # Configuration
 SCRIPT_DIR = Path(__file__).parent.resolve()
-OUT_DIR = SCRIPT_DIR / "chromium-src" / "src" / "out" / "Default"
+SRC_DIR = SCRIPT_DIR / "chromium-src" / "src"
 RELEASE_DIR = SCRIPT_DIR / "release-build"
+MIB = 1024 ** 2
 
 
 def run_command(cmd, cwd=None, check=True, capture_output=False):
@@ -51,148 +64,243 @@ def get_version():
         return "dev"
 
 
-def clean_old_releases():
-    """Remove old release tarballs."""
+def get_commit_time():
+    """Timestamp for reproducible archives: SOURCE_DATE_EPOCH or the commit time."""
+    if os.environ.get("SOURCE_DATE_EPOCH", "").isdigit():
+        return int(os.environ["SOURCE_DATE_EPOCH"])
+    try:
+        result = subprocess.run(
+            ["git", "log", "-1", "--format=%ct"],
+            cwd=SCRIPT_DIR,
+            capture_output=True,
+            text=True,
+            check=True
+        )
+        return int(result.stdout.strip())
+    except (OSError, subprocess.CalledProcessError, ValueError):
+        return 0
+
+
+def clean_old_releases(keep=()):
+    """Remove old release tarballs and images, except those in keep."""
     print("Cleaning up old releases...")
-    for tarball in SCRIPT_DIR.glob("better-chromium-*.tar.gz"):
-        tarball.unlink()
-        print(f"  Removed: {tarball.name}")
+    keep = {path.resolve() for path in keep}
+    for pattern in ["better-chromium-*.tar*", f"better-chromium-*{IMAGE_SUFFIX}*",
+                    "better-chromium-*.sh"]:
+        for release_file in SCRIPT_DIR.glob(pattern):
+            if release_file.resolve() in keep:
+                print(f"  Kept as delta base: {release_file.name}")
+                continue
+            release_file.unlink()
+            print(f"  Removed: {release_file.name}")
 
 
-def copy_files(src, dest, pattern="*"):
-    """Copy files matching pattern from src to dest."""
-    files = glob.glob(str(src / pattern))
-    copied = 0
-    for file in files:
-        try:
-            if os.path.isfile(file):
-                shutil.copy2(file, dest)
-                copied += 1
-        except Exception as e:
-            print(f"  Warning: Could not copy {file}: {e}")
-    return copied
+def comma_list(value):
+    return [item.strip() for item in value.split(",") if item.strip()]
 
 
-def copy_directory(src, dest):
-    """Copy directory if it exists."""
-    if src.exists():
-        try:
-            shutil.copytree(src, dest)
-            return True
-        except Exception as e:
-            print(f"  Warning: Could not copy {src}: {e}")
-    return False
+def payload(profile, args):
+    """Return (names to ship, names left out) for a profile's build."""
+    return subset_files(collect_files(SRC_DIR / profile.out_dir), args.locales, args.packs)
 
 
-def main():
-    """Create release package."""
-    print("Creating GitHub release package...")
-    print()
-    
-    # Check if binary exists
-    chrome_binary = OUT_DIR / "chrome"
-    if not chrome_binary.exists():
-        print(f"❌ Chrome binary not found at: {chrome_binary}")
-        print("Run ./arch_build.py or ./quick_rebuild.py first")
-        sys.exit(1)
-    
-    version = get_version()
-    clean_old_releases()
-    
-    # Clean and create release directory
-    if RELEASE_DIR.exists():
-        shutil.rmtree(RELEASE_DIR)
-    
-    release_app_dir = RELEASE_DIR / "better-chromium"
-    release_app_dir.mkdir(parents=True)
-    
-    print("Copying binaries and resources...")
+def parse_args():
+    """Parse command line options."""
+    parser = argparse.ArgumentParser(description="Package a build for release")
+    add_profile_argument(parser, multiple=True)
+    parser.add_argument(
+        "--format", choices=sorted(FORMATS), default=DEFAULT_FORMAT,
+        help=f"archive compression (default: {DEFAULT_FORMAT})",
+    )
+    parser.add_argument("--level", type=int, help="compression level (default per format)")
+    parser.add_argument(
+        "--threads", type=int, default=default_threads(),
+        help="compression threads (default: all CPUs)",
+    )
+    parser.add_argument(
+        "--reproducible", action="store_true",
+        help="pin every timestamp to the commit time so identical builds give identical archives",
+    )
+    parser.add_argument(
+        "--locales", type=comma_list, metavar="LIST",
+        help="only ship these locales, e.g. en-US,de (en-US is always kept)",
+    )
+    parser.add_argument(
+        "--packs", type=comma_list, metavar="LIST",
+        help="only ship these top-level .pak files besides the required ones, "
+             "e.g. chrome_200_percent",
+    )
+    parser.add_argument(
+        "--image", action="store_true",
+        help=f"also write a zstd squashfs image ({IMAGE_SUFFIX}) and a launcher "
+             "that runs it without extracting",
+    )
+    parser.add_argument(
+        "--blake2", action="store_true",
+        help="also write a BLAKE2b manifest (.b2sums) next to the SHA-256 one",
+    )
+    parser.add_argument(
+        "--delta-from", type=Path, metavar="PATH",
+        help="also write a delta against a previous release "
+             "(tarball, unpacked tree, or a directory of release tarballs)",
+    )
+    parser.add_argument(
+        "--stage", action="store_true",
+        help=f"also leave an unpacked copy in {RELEASE_DIR.name}/ (hardlinked or reflinked)",
+    )
+    return parser.parse_args()
+
+
+def package(profile, version, args, base=None):
+    """Stream one profile's build into a tarball named for its variant.
+
+    base is an optional (previous release, label) to write a delta against.
+    """
+    out_dir = SRC_DIR / profile.out_dir
+    print(f"Packaging {profile.name} ({profile.variant})...")
+    names, dropped = payload(profile, args)
+    if dropped:
+        kept_size = sum((out_dir / name).stat().st_size for name in names)
+        dropped_size = sum((out_dir / name).stat().st_size for name in dropped)
+        locales = [name for name in dropped if name.startswith(f"{LOCALES_DIR}/")]
+        print(f"  ✓ Left out {len(locales)} locale files and {len(dropped) - len(locales)} packs, "
+              f"saving {dropped_size / MIB:.1f} MiB "
+              f"({dropped_size / max(kept_size + dropped_size, 1):.0%} of the payload)")
     
-    # Copy main binaries
-    for binary in ["chrome", "chrome-wrapper", "chrome_sandbox", "chrome_crashpad_handler"]:
-        src = OUT_DIR / binary
-        if src.exists():
-            shutil.copy2(src, release_app_dir)
-            print(f"  ✓ {binary}")
+    # Create tarball
+    suffix = FORMATS[args.format][0]
+    archive_name = f"better-chromium-{version}-linux-{profile.variant}{suffix}"
+    archive_path = SCRIPT_DIR / archive_name
+    print(f"Creating tarball: {archive_name}")
+    start = time.monotonic()
+    mtime = get_commit_time() if args.reproducible else None
+    algorithms = DEFAULT_ALGORITHMS + (("blake2b",) if args.blake2 else ())
+    result = write_tarball(
+        out_dir, names, archive_path, args.format, args.level, args.threads, mtime, algorithms
+    )
+    elapsed = max(time.monotonic() - start, 1e-6)
+    size = archive_path.stat().st_size
+    print(f"  ✓ {len(names) + 1} files, {result.read / MIB:.0f} MiB read, {size / MIB:.0f} MiB written")
+    print(f"  ✓ {args.format}: {result.tar_size / MIB / elapsed:.0f} MiB/s, "
+          f"ratio {size / max(result.tar_size, 1):.3f} in {elapsed:.1f}s")
+    for manifest_path in write_manifests(archive_path, result.digests):
+        print(f"  ✓ Manifest: {manifest_path.name}")
     
-    # Copy .pak files
-    print("Copying resource files...")
-    pak_count = copy_files(OUT_DIR, release_app_dir, "*.pak")
-    print(f"  ✓ Copied {pak_count} .pak files")
+    if args.image:
+        image_path = archive_path.with_name(
+            f"better-chromium-{version}-linux-{profile.variant}{IMAGE_SUFFIX}"
+        )
+        print(f"Creating image: {image_path.name}")
+        start = time.monotonic()
+        launcher_path = write_image(out_dir, names, image_path, threads=args.threads, mtime=mtime)
+        image_size = image_path.stat().st_size
+        print(f"  ✓ {image_size / MIB:.0f} MiB in {time.monotonic() - start:.1f}s, "
+              f"ratio {image_size / max(result.read, 1):.3f}, run with ./{launcher_path.name}")
+        for manifest_path in write_manifests(image_path, result.digests):
+            print(f"  ✓ Manifest: {manifest_path.name}")
     
-    # Copy directories
-    for dir_name in ["resources", "locales"]:
-        src_dir = OUT_DIR / dir_name
-        dest_dir = release_app_dir / dir_name
-        if copy_directory(src_dir, dest_dir):
-            print(f"  ✓ {dir_name}/")
+    if base:
+        base, label = base
+        delta_path = archive_path.with_name(
+            f"better-chromium-{label}-to-{version}-linux-{profile.variant}{DELTA_SUFFIX}"
+        )
+        print(f"Creating delta from {base.name}: {delta_path.name}")
+        try:
+            patched, added, deleted = write_delta(
+                base, out_dir, names, result.digests["sha256"], delta_path, mtime
+            )
+        except (tarfile.TarError, ValueError, OSError, subprocess.CalledProcessError) as e:
+            print(f"⚠ Could not write a delta from {base.name}, skipping it: {e}")
+        else:
+            print(f"  ✓ {len(patched)} patched, {len(added)} added, {len(deleted)} removed, "
+                  f"{delta_path.stat().st_size / MIB:.1f} MiB (full archive {size / MIB:.0f} MiB)")
     
-    # Copy data files
-    print("Copying data files...")
-    for data_file in ["icudtl.dat", "snapshot_blob.bin", "v8_context_snapshot.bin"]:
-        src = OUT_DIR / data_file
-        if src.exists():
-            shutil.copy2(src, release_app_dir)
-            print(f"  ✓ {data_file}")
+    if args.stage:
+        # Unpacked tree for inspection, sharing data with the out directory;
+        # staged last since it may replace the tree a delta was made from
+        print(f"Staging {RELEASE_DIR / APP_DIR}...")
+        counts = stage_directory(out_dir, names, RELEASE_DIR / APP_DIR)
+        print("  ✓ " + ", ".join(f"{count} {method}" for method, count in sorted(counts.items())))
     
-    # Copy shared libraries
-    print("Copying shared libraries...")
-    so_count = copy_files(OUT_DIR, release_app_dir, "*.so")
-    so_count += copy_files(OUT_DIR, release_app_dir, "*.so.*")
-    print(f"  ✓ Copied {so_count} library files")
+    # Keep the build so an identical configuration is restored, not rebuilt
+    fingerprint = load_fingerprint(out_dir)
+    if fingerprint is None:
+        print(f"⚠ No build fingerprint in {out_dir}, not publishing to the artifact store")
+    else:
+        publish(out_dir, fingerprint)
     
-    # Create launcher script
-    launcher_path = release_app_dir / "better-chromium"
-    with open(launcher_path, 'w') as f:
-        f.write('''#!/usr/bin/env bash
-# Better Chromium launcher - standalone package
-SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
-
-# Set library path to use bundled libraries
-export LD_LIBRARY_PATH="$SCRIPT_DIR:$LD_LIBRARY_PATH"
-
-# Run chrome with necessary flags for standalone mode
-exec "$SCRIPT_DIR/chrome" \\
-    "$@"
-''')
-    launcher_path.chmod(0o755)
-    print("  ✓ Created launcher script")
+    return archive_path
+
+
+def main():
+    """Create release packages."""
+    args = parse_args()
+    profiles = load_profiles(args.profiles)
     
-    # Set permissions
-    print("Setting permissions...")
-    for binary in ["chrome", "chrome_sandbox", "chrome_crashpad_handler", "chrome-wrapper"]:
-        binary_path = release_app_dir / binary
-        if binary_path.exists():
-            binary_path.chmod(0o755)
+    print("Creating GitHub release package...")
+    print()
     
-    for so_file in release_app_dir.glob("*.so*"):
-        so_file.chmod(0o644)
+    # Every variant needs a binary and its own tarball name
+    variants = [profile.variant for profile in profiles]
+    if len(set(variants)) != len(variants):
+        print(f"❌ Profiles share a release variant: {', '.join(variants)}")
+        sys.exit(1)
+    for profile in profiles:
+        chrome_binary = SRC_DIR / profile.out_dir / "chrome"
+        if not chrome_binary.exists():
+            print(f"❌ Chrome binary not found at: {chrome_binary}")
+            print(f"Run ./arch_build.py --profile {profile.name} or ./quick_rebuild.py first")
+            sys.exit(1)
     
-    # Create tarball
-    archive_name = f"better-chromium-{version}-linux-x86_64.tar.gz"
-    print(f"\nCreating tarball: {archive_name}")
+    # Check the options against every build before anything is removed;
+    # delta bases in particular must be found before cleaning deletes them
+    bases = {}
+    try:
+        check_format(args.format, args.level)
+        if args.image:
+            check_image()
+        for profile in profiles:
+            payload(profile, args)
+        if args.delta_from:
+            check_delta()
+            bases = {
+                profile.name: find_base(args.delta_from, profile.variant)
+                for profile in profiles
+            }
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
     
-    result = run_command(
-        ["tar", "czf", archive_name, "better-chromium/"],
-        cwd=RELEASE_DIR,
-        check=True
-    )
+    version = get_version()
+    clean_old_releases(base for base, _ in bases.values())
     
-    # Move tarball to script directory
-    shutil.move(RELEASE_DIR / archive_name, SCRIPT_DIR / archive_name)
+    if RELEASE_DIR.exists() and not any(
+        RELEASE_DIR in base.resolve().parents for base, _ in bases.values()
+    ):
+        shutil.rmtree(RELEASE_DIR)
+    archives = [
+        package(profile, version, args, bases.get(profile.name)) for profile in profiles
+    ]
     
     print()
     print("=" * 60)
-    print(f"✓ Release package created: {SCRIPT_DIR / archive_name}")
+    for archive in archives:
+        print(f"✓ Release package created: {archive}")
     print("=" * 60)
     print()
     print("Next steps:")
     print("1. Create a GitHub release:")
-    print(f"   gh release create v{version} {SCRIPT_DIR / archive_name}")
+    print(f"   gh release create v{version} {' '.join(str(a) for a in archives)}")
+    print("   (attach the matching manifests and any deltas alongside)")
     print()
     print("2. Users can extract and run with:")
-    print(f"   tar xzf {archive_name}")
+    print(f"   tar xf {archives[0].name}")
     print("   ./better-chromium/better-chromium")
+    print("   or copy the .squashfs image and its .sh launcher and run the launcher")
+    print("   check an install with:")
+    print(f"   ./integrity.py verify {archives[0].name}.sha256sums")
+    print("   update an existing install with:")
+    print("   ./apply_delta.py <delta.tar> better-chromium/")
 
 
 if __name__ == "__main__":
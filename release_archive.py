@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Streaming release archives for Better Chromium
+Writes the release payload straight from the out directory into a tarball,
+with modes set in the tar headers instead of on copies, and stages a
+directory of hardlinks or reflinks when an unpacked tree is wanted.
+"""
+
+import fcntl
+import io
+import os
+import posixpath
+import shutil
+import stat
+import tarfile
+import time
+from collections import Counter, namedtuple
+
+from compression import DEFAULT_FORMAT, open_compressor
+from integrity import DEFAULT_ALGORITHMS, new_hashes
+from release_files import APP_DIR, LAUNCHER, LAUNCHER_NAME, file_mode
+
+# ioctl that shares a file's extents on btrfs, XFS and other CoW filesystems
+FICLONE = 0x40049409
+# Read size while streaming files into the tar; fewer, larger hash updates
+COPY_BUFFER = 1024 * 1024
+
+# read: payload bytes, tar_size: uncompressed tar bytes,
+# digests: {algorithm: {name: hex digest}}
+TarballResult = namedtuple("TarballResult", ["read", "tar_size", "digests"])
+
+
+def _directories(names):
+    """Return every directory that the payload paths live in, parents first."""
+    dirs = set()
+    for name in names:
+        parent = posixpath.dirname(name)
+        while parent:
+            dirs.add(parent)
+            parent = posixpath.dirname(parent)
+    return sorted(dirs)
+
+
+def _info(name, mode, mtime, size=0, directory=False):
+    """Tar header with a normalized owner, so archives don't depend on who packed them."""
+    info = tarfile.TarInfo(name)
+    info.type = tarfile.DIRTYPE if directory else tarfile.REGTYPE
+    info.mode = mode
+    info.mtime = mtime
+    info.size = size
+    info.uid = info.gid = 0
+    info.uname = info.gname = "root"
+    return info
+
+
+class _HashingReader:
+    """File wrapper that hashes data as tarfile reads it."""
+
+    def __init__(self, f, algorithms):
+        self.f = f
+        self.hashes = new_hashes(algorithms)
+
+    def read(self, size=-1):
+        data = self.f.read(size)
+        for digest in self.hashes.values():
+            digest.update(data)
+        return data
+
+
+def _add_payload(tar, out_dir, names, mtime=None, algorithms=DEFAULT_ALGORITHMS):
+    """Add the package tree to tar; return (payload bytes read, digests).
+
+    With mtime set every entry gets that timestamp, otherwise files keep
+    their own and generated entries get the current time.
+    """
+    now = int(time.time()) if mtime is None else mtime
+    tar.addfile(_info(APP_DIR, 0o755, now, directory=True))
+    for directory in _directories(names):
+        tar.addfile(_info(f"{APP_DIR}/{directory}", 0o755, now, directory=True))
+
+    read = 0
+    digests = {algorithm: {} for algorithm in algorithms}
+    for name in names:
+        with open(out_dir / name, "rb") as f:
+            st = os.fstat(f.fileno())
+            info = _info(
+                f"{APP_DIR}/{name}", file_mode(name),
+                int(st.st_mtime) if mtime is None else mtime, st.st_size,
+            )
+            reader = _HashingReader(f, algorithms)
+            tar.addfile(info, reader)
+        read += st.st_size
+        for algorithm, digest in reader.hashes.items():
+            digests[algorithm][name] = digest.hexdigest()
+
+    launcher = LAUNCHER.encode()
+    tar.addfile(
+        _info(f"{APP_DIR}/{LAUNCHER_NAME}", file_mode(LAUNCHER_NAME), now, len(launcher)),
+        io.BytesIO(launcher),
+    )
+    for algorithm, digest in new_hashes(algorithms).items():
+        digest.update(launcher)
+        digests[algorithm][LAUNCHER_NAME] = digest.hexdigest()
+    return read, digests
+
+
+def write_tarball(out_dir, names, archive_path, fmt=DEFAULT_FORMAT, level=None,
+                  threads=None, mtime=None, algorithms=DEFAULT_ALGORITHMS):
+    """Stream the payload from out_dir into a compressed tarball.
+
+    Entries are written in sorted order, so with a fixed mtime the same
+    payload always produces the same archive. Files are hashed with each
+    of algorithms as they are read, so the manifest needs no second pass.
+    """
+    tmp_path = archive_path.with_name(f"{archive_path.name}.tmp")
+    try:
+        with open(tmp_path, "wb") as out:
+            compressor = open_compressor(out, fmt, level, threads)
+            try:
+                with tarfile.open(fileobj=compressor, mode="w|", format=tarfile.PAX_FORMAT,
+                                  copybufsize=COPY_BUFFER) as tar:
+                    read, digests = _add_payload(tar, out_dir, names, mtime, algorithms)
+                compressor.close()
+            except BaseException:
+                # Don't leave a compressor process or worker threads behind
+                compressor.abort()
+                raise
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    tmp_path.replace(archive_path)
+    return TarballResult(read, compressor.bytes_in, digests)
+
+
+def _reflink(src, dst):
+    with open(src, "rb") as s, open(dst, "wb") as d:
+        fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+
+
+def place_file(src, dst, mode):
+    """Put src at dst sharing its data where possible; return how it was done.
+
+    A hardlink shares the inode and so the mode, so it is only used when the
+    file already has the mode it ships with.
+    """
+    if stat.S_IMODE(src.stat().st_mode) == mode:
+        try:
+            os.link(src, dst)
+            return "hardlink"
+        except OSError:
+            pass
+    try:
+        _reflink(src, dst)
+        method = "reflink"
+    except OSError:
+        shutil.copyfile(src, dst)
+        method = "copy"
+    dst.chmod(mode)
+    return method
+
+
+def stage_directory(out_dir, names, dest):
+    """Build an unpacked package tree at dest; return {method: file count}."""
+    if dest.exists():
+        shutil.rmtree(dest)
+    dest.mkdir(parents=True)
+    counts = Counter()
+    for name in names:
+        target = dest / name
+        target.parent.mkdir(parents=True, exist_ok=True)
+        counts[place_file(out_dir / name, target, file_mode(name))] += 1
+
+    launcher_path = dest / LAUNCHER_NAME
+    launcher_path.write_text(LAUNCHER)
+    launcher_path.chmod(file_mode(LAUNCHER_NAME))
+    return counts
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Binary delta releases for Better Chromium
+Diffs a build against a previous release with zstd --patch-from: changed
+files become patches, unchanged files are left out and removed files are
+listed, so an installed tree can be brought up to date with apply_delta.py.
+"""
+
+import json
+import re
+import shutil
+import subprocess
+import tarfile
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+
+from integrity import hash_files
+from release_files import APP_DIR, LAUNCHER, LAUNCHER_NAME, file_mode
+
+DELTA_FORMAT = 1
+DELTA_SUFFIX = ".delta.tar"
+PATCH_LEVEL = 19
+# zstd needs a window covering the whole base file to find matches in it
+MIN_WINDOW_LOG = 27
+MAX_WINDOW_LOG = 31
+
+ARCHIVE_NAME = re.compile(r"^better-chromium-(.+)-linux-(.+?)\.tar\.(gz|zst|xz)$")
+
+
+def window_log(*paths):
+    """Return the zstd window log needed to diff files of these sizes."""
+    size = max(path.stat().st_size for path in paths)
+    return min(MAX_WINDOW_LOG, max(MIN_WINDOW_LOG, size.bit_length()))
+
+
+@contextmanager
+def _open_archive(path):
+    """Open a release tarball for streaming reads, whatever its compression."""
+    if path.name.endswith(".zst"):
+        process = subprocess.Popen(["zstd", "-q", "-dc", str(path)], stdout=subprocess.PIPE)
+        try:
+            with tarfile.open(fileobj=process.stdout, mode="r|") as tar:
+                yield tar
+        finally:
+            process.stdout.close()
+            process.wait()
+    else:
+        # Not a stream: parallel gzip writes one member per block, which
+        # only GzipFile reads past the first of
+        with tarfile.open(path, "r:*") as tar:
+            yield tar
+
+
+def _extract_payload(archive, dest):
+    """Unpack the regular files under APP_DIR/ of a release into dest."""
+    prefix = f"{APP_DIR}/"
+    with _open_archive(archive) as tar:
+        for member in tar:
+            if not member.isfile() or not member.name.startswith(prefix):
+                continue
+            name = member.name[len(prefix):]
+            if name.startswith("/") or ".." in name.split("/"):
+                continue
+            target = dest / name
+            target.parent.mkdir(parents=True, exist_ok=True)
+            with tar.extractfile(member) as src, open(target, "wb") as out:
+                shutil.copyfileobj(src, out)
+
+
+def find_base(path, variant):
+    """Resolve --delta-from to (release archive or unpacked tree, label).
+
+    path may be a release tarball, an unpacked better-chromium/ tree or a
+    directory of previous release tarballs to pick this variant's from.
+    """
+    if path.is_file():
+        match = ARCHIVE_NAME.match(path.name)
+        return path, match.group(1) if match else path.stem
+    for tree in (path, path / APP_DIR):
+        if (tree / "chrome").is_file():
+            return tree, tree.resolve().name
+    candidates = [
+        p for p in path.glob(f"better-chromium-*-linux-{variant}.tar.*")
+        if ARCHIVE_NAME.match(p.name) and ARCHIVE_NAME.match(p.name).group(2) == variant
+    ]
+    if not candidates:
+        raise ValueError(f"no {variant} release to diff against in {path}")
+    newest = max(candidates, key=lambda p: p.stat().st_mtime)
+    return newest, ARCHIVE_NAME.match(newest.name).group(1)
+
+
+def _files_of(tree):
+    return sorted(
+        p.relative_to(tree).as_posix() for p in tree.rglob("*") if p.is_file()
+    )
+
+
+def _run_zstd(args):
+    subprocess.run(["zstd", "-q", "-f"] + args, check=True)
+
+
+def check_delta():
+    """Raise ValueError if deltas cannot be written here."""
+    if shutil.which("zstd") is None:
+        raise ValueError("zstd is not installed")
+
+
+def write_delta(base, out_dir, names, digests, delta_path, mtime=None, level=PATCH_LEVEL):
+    """Write a delta package from base to the payload in out_dir.
+
+    digests maps every new payload name (including the launcher) to its
+    SHA-256, as returned by write_tarball. Returns (patched, added, deleted).
+    """
+    check_delta()
+
+    with tempfile.TemporaryDirectory(prefix="better-chromium-delta-") as tmp:
+        tmp = Path(tmp)
+        if base.is_dir():
+            base_dir = base
+        else:
+            base_dir = tmp / "base"
+            _extract_payload(base, base_dir)
+        launcher_path = tmp / LAUNCHER_NAME
+        launcher_path.write_text(LAUNCHER)
+        sources = {name: out_dir / name for name in names}
+        sources[LAUNCHER_NAME] = launcher_path
+
+        base_digests = {}
+        for name, base_digest in hash_files(base_dir, _files_of(base_dir)):
+            if base_digest is None:
+                # Shipped in full instead; apply_delta won't expect it on the install
+                print(f"⚠ Cannot read {name} in the base, leaving it out of the delta's base")
+            else:
+                base_digests[name] = base_digest["sha256"]
+        patched, added = [], []
+        window_logs = {}
+        content = tmp / "delta"
+        for name in sorted(digests):
+            if base_digests.get(name) == digests[name]:
+                continue
+            target = content / ("patches" if name in base_digests else "files") / f"{name}.zst"
+            target.parent.mkdir(parents=True, exist_ok=True)
+            if name in base_digests:
+                wlog = window_log(base_dir / name, sources[name])
+                _run_zstd([f"-{level}", "--ultra", "-T0", f"--long={wlog}",
+                           f"--patch-from={base_dir / name}", str(sources[name]), "-o", str(target)])
+                window_logs[name] = wlog
+                patched.append(name)
+            else:
+                _run_zstd([f"-{level}", "-T0", str(sources[name]), "-o", str(target)])
+                added.append(name)
+        deleted = sorted(set(base_digests) - set(digests))
+
+        (content / "delta.json").write_text(json.dumps({
+            "format": DELTA_FORMAT,
+            "from": base_digests,
+            "to": digests,
+            "modes": {name: file_mode(name) for name in digests},
+            "patched": patched,
+            "added": added,
+            "deleted": deleted,
+            "window_log": window_logs,
+        }, indent=2, sort_keys=True) + "\n")
+
+        tmp_path = delta_path.with_name(f"{delta_path.name}.tmp")
+        try:
+            with tarfile.open(tmp_path, "w", format=tarfile.PAX_FORMAT) as tar:
+                for name in _files_of(content):
+                    info = tar.gettarinfo(content / name, name)
+                    info.mode = 0o644
+                    info.uid = info.gid = 0
+                    info.uname = info.gname = "root"
+                    if mtime is not None:
+                        info.mtime = mtime
+                    with open(content / name, "rb") as f:
+                        tar.addfile(info, f)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+        tmp_path.replace(delta_path)
+    return patched, added, deleted
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Release payload of a Better Chromium build
+Lists the files of an out directory that make up a runnable browser and the
+modes they ship with, for packaging and the artifact store, and trims the
+locales and resource packs a release doesn't need.
+"""
+
+# Files taken from the top of the out directory
+BINARIES = ["chrome", "chrome-wrapper", "chrome_sandbox", "chrome_crashpad_handler"]
+DATA_FILES = ["icudtl.dat", "snapshot_blob.bin", "v8_context_snapshot.bin"]
+RESOURCE_PATTERNS = ["*.pak"]
+LIBRARY_PATTERNS = ["*.so", "*.so.*"]
+
+# Directories shipped with everything inside them
+DIRECTORIES = ["resources", "locales"]
+LOCALES_DIR = "locales"
+
+# Packs the browser can't start without, never dropped by a subset
+REQUIRED_PACKS = ["resources.pak", "chrome_100_percent.pak"]
+# Chromium loads this locale when the UI language has no pack, so it always ships
+FALLBACK_LOCALE = "en-US"
+
+# Top-level directory of the package and the launcher generated into it
+APP_DIR = "better-chromium"
+LAUNCHER_NAME = "better-chromium"
+LAUNCHER = '''#!/usr/bin/env bash
+# Better Chromium launcher - standalone package
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+
+# Set library path to use bundled libraries
+export LD_LIBRARY_PATH="$SCRIPT_DIR:$LD_LIBRARY_PATH"
+
+# Run chrome with necessary flags for standalone mode
+exec "$SCRIPT_DIR/chrome" \\
+    "$@"
+'''
+
+# Generated next to a release image as <image name>.sh; mounts the image
+# on first use and runs the packaged launcher from inside it
+IMAGE_LAUNCHER = '''#!/usr/bin/env bash
+# Better Chromium launcher - runs from the compressed image without extracting it
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+NAME="$(basename "${BASH_SOURCE[0]}" .sh)"
+IMAGE="$SCRIPT_DIR/$NAME.squashfs"
+MOUNT_DIR="${XDG_RUNTIME_DIR:-/tmp/better-chromium-$(id -u)}/$NAME"
+
+# Another window may already have the image mounted
+if mountpoint -q "$MOUNT_DIR"; then
+    exec "$MOUNT_DIR/better-chromium/better-chromium" "$@"
+fi
+
+if ! command -v squashfuse >/dev/null; then
+    echo "squashfuse is needed to run $IMAGE without extracting it," >&2
+    echo "or mount it yourself: sudo mount -o loop,ro $IMAGE <dir>" >&2
+    exit 1
+fi
+mkdir -p "$MOUNT_DIR"
+squashfuse "$IMAGE" "$MOUNT_DIR" || exit 1
+
+# Pages are decompressed as chrome touches them; unmount once it exits
+"$MOUNT_DIR/better-chromium/better-chromium" "$@"
+status=$?
+fusermount -u -z "$MOUNT_DIR" 2>/dev/null || fusermount3 -u -z "$MOUNT_DIR" 2>/dev/null
+rmdir "$MOUNT_DIR" 2>/dev/null
+exit $status
+'''
+
+
+def collect_files(out_dir):
+    """Return the release payload as sorted paths relative to out_dir."""
+    names = {name for name in BINARIES + DATA_FILES if (out_dir / name).is_file()}
+    for pattern in RESOURCE_PATTERNS + LIBRARY_PATTERNS:
+        names.update(path.name for path in out_dir.glob(pattern) if path.is_file())
+    for directory in DIRECTORIES:
+        names.update(
+            path.relative_to(out_dir).as_posix()
+            for path in (out_dir / directory).rglob("*") if path.is_file()
+        )
+    return sorted(names)
+
+
+def file_mode(name):
+    """Return the permissions a payload file ships with."""
+    return 0o755 if name in BINARIES or name == LAUNCHER_NAME else 0o644
+
+
+def locale_of(name):
+    """Return the locale a locales/ payload file belongs to, e.g. "en-US"."""
+    return name.split("/")[-1].split(".")[0]
+
+
+def _pack_name(name):
+    return name if name.endswith(".pak") else f"{name}.pak"
+
+
+def subset_files(names, locales=None, packs=None):
+    """Leave out unwanted locales and top-level packs; return (kept, dropped).
+
+    locales and packs name the ones to keep, or are None to keep them all.
+    The fallback locale and REQUIRED_PACKS are always kept. Raises
+    ValueError if a requested locale or pack is not in the build.
+    """
+    dropped = set()
+    if locales is not None:
+        available = {locale_of(name) for name in names if name.startswith(f"{LOCALES_DIR}/")}
+        missing = set(locales) - available
+        if missing:
+            raise ValueError(f"locales not in this build: {', '.join(sorted(missing))}")
+        wanted = set(locales) | {FALLBACK_LOCALE}
+        dropped.update(
+            name for name in names
+            if name.startswith(f"{LOCALES_DIR}/") and locale_of(name) not in wanted
+        )
+    if packs is not None:
+        available = {name for name in names if "/" not in name and name.endswith(".pak")}
+        wanted = {_pack_name(pack) for pack in packs}
+        missing = wanted - available
+        if missing:
+            raise ValueError(f"packs not in this build: {', '.join(sorted(missing))}")
+        dropped.update(available - wanted - set(REQUIRED_PACKS))
+    return [name for name in names if name not in dropped], sorted(dropped)
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Compressed read-only release images for Better Chromium
+Packs the release payload into a zstd squashfs image that is mounted and
+run in place, so deploying is a single file copy and the parts of chrome
+and the .pak files a launch never touches are never decompressed.
+"""
+
+import shutil
+import subprocess
+
+from release_archive import stage_directory
+from release_files import APP_DIR, IMAGE_LAUNCHER
+
+IMAGE_SUFFIX = ".squashfs"
+LAUNCHER_SUFFIX = ".sh"
+IMAGE_LEVEL = 19
+# Each page fault decompresses a whole block, so keep blocks small for startup
+BLOCK_SIZE = "128K"
+
+
+def check_image():
+    """Raise ValueError if images cannot be built here."""
+    if shutil.which("mksquashfs") is None:
+        raise ValueError("mksquashfs is not installed (squashfs-tools)")
+
+
+def write_image(out_dir, names, image_path, level=IMAGE_LEVEL, threads=None, mtime=None):
+    """Pack the payload from out_dir into a squashfs image; return its launcher's path.
+
+    The image holds the same better-chromium/ tree as the tarball. It is
+    built from a hardlinked staging tree, so the payload isn't copied first.
+    """
+    check_image()
+    staging = image_path.with_name(f"{image_path.name}.staging")
+    tmp_path = image_path.with_name(f"{image_path.name}.tmp")
+    cmd = [
+        "mksquashfs", str(staging), str(tmp_path), "-noappend", "-quiet",
+        "-comp", "zstd", "-Xcompression-level", str(level), "-b", BLOCK_SIZE, "-all-root",
+    ]
+    if threads:
+        cmd += ["-processors", str(threads)]
+    if mtime is not None:
+        cmd += ["-all-time", str(mtime), "-mkfs-time", str(mtime)]
+    try:
+        stage_directory(out_dir, names, staging / APP_DIR)
+        subprocess.run(cmd, check=True)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+    tmp_path.replace(image_path)
+
+    launcher_path = image_path.with_suffix(LAUNCHER_SUFFIX)
+    launcher_path.write_text(IMAGE_LAUNCHER)
+    launcher_path.chmod(0o755)
+    return launcher_path
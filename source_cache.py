@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Shared git cache for Chromium checkouts
+Keeps a bare mirror of every Chromium tag that has been fetched, plus a
+gclient cache_dir that all dependency fetches read through. The cache is
+shared by every workspace and builder using it, so a new checkout or a
+version bump only downloads objects that aren't cached yet. With
+BETTER_CHROMIUM_OFFLINE=1 nothing is fetched and every git URL is served
+from the mirrors.
+
+Usage: ./source_cache.py [status | fetch VERSION]
+"""
+
+import argparse
+import fcntl
+import multiprocessing
+import os
+import subprocess
+import sys
+from contextlib import contextmanager
+from pathlib import Path
+
+# Configuration (overridable from the environment)
+CACHE_DIR = Path(os.environ.get(
+    "BETTER_CHROMIUM_GIT_CACHE",
+    str(Path.home() / ".cache" / "better-chromium" / "git"),
+)).expanduser()
+CACHE_ENABLED = os.environ.get("BETTER_CHROMIUM_GIT_CACHING", "1") != "0"
+OFFLINE = os.environ.get("BETTER_CHROMIUM_OFFLINE", "0") != "0"
+# Dependency fetches are network bound, so run more of them than there are CPUs
+FETCH_JOBS = int(os.environ.get(
+    "BETTER_CHROMIUM_FETCH_JOBS", str(min(32, 2 * multiprocessing.cpu_count()))
+))
+
+SRC_MIRROR = CACHE_DIR / "chromium-src.git"
+GCLIENT_CACHE = CACHE_DIR / "gclient"
+CIPD_CACHE = CACHE_DIR / "cipd"
+LOCK_FILE = CACHE_DIR / ".lock"
+MIB = 1024 ** 2
+
+
+@contextmanager
+def cache_lock():
+    """Hold the cache's exclusive lock, waiting for other builders if needed."""
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    with open(LOCK_FILE, "w") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            print(f"Waiting for another build using the git cache at {CACHE_DIR}...")
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _mirror_git(*args, check=True, capture=False):
+    return subprocess.run(
+        ["git", "-C", str(SRC_MIRROR)] + list(args),
+        check=check, capture_output=capture, text=True,
+    )
+
+
+def has_tag(version):
+    """Check whether the mirror already holds a Chromium tag."""
+    if not SRC_MIRROR.exists():
+        return False
+    result = _mirror_git("rev-parse", "--verify", "-q", f"refs/tags/{version}^{{commit}}",
+                         check=False, capture=True)
+    return result.returncode == 0
+
+
+def update_mirror(url, version):
+    """Make sure the mirror holds a tag, fetching only the objects it lacks.
+
+    Raises ValueError if the tag isn't cached and the cache is offline.
+    """
+    with cache_lock():
+        if not SRC_MIRROR.exists():
+            subprocess.run(["git", "init", "-q", "--bare", str(SRC_MIRROR)], check=True)
+            _mirror_git("remote", "add", "origin", url)
+        if has_tag(version):
+            print(f"✓ {version} already in the git cache")
+            return
+        if OFFLINE:
+            raise ValueError(f"{version} is not in the git cache at {CACHE_DIR} "
+                             "and BETTER_CHROMIUM_OFFLINE is set")
+        print(f"Fetching {version} into the git cache (only objects not cached yet)...")
+        _mirror_git("fetch", "--depth=1", "--no-tags", "origin",
+                    f"+refs/tags/{version}:refs/tags/{version}")
+
+
+def clone_from_cache(url, version, dest):
+    """Check out a Chromium tag at dest from the mirror; origin stays url."""
+    update_mirror(url, version)
+    with cache_lock():
+        subprocess.run([
+            "git", "-c", "advice.detachedHead=false", "clone", "-q", "--depth=1",
+            "--branch", version, "--single-branch", SRC_MIRROR.as_uri(), str(dest),
+        ], check=True)
+    subprocess.run(["git", "-C", str(dest), "remote", "set-url", "origin", url], check=True)
+
+
+def gclient_config():
+    """Return the .gclient lines that send dependency fetches through the cache."""
+    if not CACHE_ENABLED:
+        return ""
+    return f'cache_dir = "{GCLIENT_CACHE}"\n'
+
+
+def sync_args():
+    """Return extra gclient sync options for the cache."""
+    args = ["--jobs", str(FETCH_JOBS)]
+    if CACHE_ENABLED and OFFLINE:
+        # Don't try to seed missing mirrors from Google Storage either
+        args.append("--no-bootstrap")
+    return args
+
+
+def _mirror_urls():
+    """Return {remote url: mirror path} for the cached dependency mirrors."""
+    urls = {}
+    for mirror in sorted(GCLIENT_CACHE.glob("*")) if GCLIENT_CACHE.is_dir() else []:
+        result = subprocess.run(
+            ["git", "-C", str(mirror), "config", "remote.origin.url"],
+            capture_output=True, text=True,
+        )
+        if result.returncode == 0 and result.stdout.strip():
+            urls[result.stdout.strip()] = mirror
+    return urls
+
+
+def cache_env():
+    """Return environment variables that point git, gclient and cipd at the cache.
+
+    Offline, every mirrored URL is rewritten to its mirror through git's
+    url.<base>.insteadOf, so gclient's own fetches never leave the machine.
+    """
+    if not CACHE_ENABLED:
+        return {}
+    env = {"GIT_CACHE_PATH": str(GCLIENT_CACHE), "CIPD_CACHE_DIR": str(CIPD_CACHE)}
+    if OFFLINE:
+        rewrites = _mirror_urls()
+        env["GIT_CONFIG_COUNT"] = str(len(rewrites))
+        for i, (url, mirror) in enumerate(rewrites.items()):
+            env[f"GIT_CONFIG_KEY_{i}"] = f"url.{mirror}.insteadOf"
+            env[f"GIT_CONFIG_VALUE_{i}"] = url
+    return env
+
+
+def _size(path):
+    return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+
+
+def print_status():
+    """Show what the cache holds."""
+    print(f"Git cache: {CACHE_DIR}{' (offline)' if OFFLINE else ''}")
+    if not CACHE_DIR.exists():
+        print("  empty")
+        return
+    if SRC_MIRROR.exists():
+        tags = _mirror_git("tag", "--list", capture=True).stdout.split()
+        print(f"  chromium/src: {', '.join(tags) or 'no tags'}, {_size(SRC_MIRROR) / MIB:.0f} MiB")
+    mirrors = _mirror_urls()
+    if mirrors:
+        print(f"  dependencies: {len(mirrors)} mirrors, {_size(GCLIENT_CACHE) / MIB:.0f} MiB")
+    if CIPD_CACHE.exists():
+        print(f"  cipd: {_size(CIPD_CACHE) / MIB:.0f} MiB")
+
+
+def main():
+    """Show or pre-populate the git cache."""
+    from arch_build import CHROMIUM_URL, CHROMIUM_VERSION
+
+    parser = argparse.ArgumentParser(description="Manage the shared Chromium git cache")
+    parser.add_argument("command", nargs="?", default="status", choices=["status", "fetch"])
+    parser.add_argument("version", nargs="?", default=CHROMIUM_VERSION,
+                        help=f"tag to fetch (default: {CHROMIUM_VERSION})")
+    args = parser.parse_args()
+
+    if args.command == "fetch":
+        try:
+            update_mirror(CHROMIUM_URL, args.version)
+        except (ValueError, subprocess.CalledProcessError) as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+    print_status()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Chromium source tarball bootstrap
+Sets up chromium-src/src from a release source tarball (a local file or a
+local HTTP mirror) instead of git and gclient sync. The tarball is hashed as
+it streams through a multi-threaded decompressor straight into tar, so a
+cold checkout costs one sequential read and the extraction itself.
+"""
+
+import hashlib
+import re
+import shutil
+import subprocess
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+# Decompressors per tarball suffix, first one installed wins. xz only
+# decompresses in parallel for multi-block archives; a mirror that
+# recompresses to zstd extracts at close to disk speed.
+DECOMPRESSORS = {
+    ".tar.xz": [["xz", "-dc", "-T0"]],
+    ".tar.zst": [["zstd", "-dc", "-T0"]],
+    ".tar.gz": [["pigz", "-dc"], ["gzip", "-dc"]],
+}
+CHUNK_SIZE = 4 * 1024 * 1024
+SHA256 = re.compile(r"^[0-9a-f]{64}$")
+
+
+def tarball_location(source, version):
+    """Resolve a tarball path, a directory of tarballs or a mirror URL for version.
+
+    Directories and URLs ending in / get Chromium's own file name appended.
+    """
+    name = f"chromium-{version}.tar.xz"
+    if "://" in source:
+        return source + name if source.endswith("/") else source
+    path = Path(source).expanduser()
+    return str(path / name) if path.is_dir() else str(path)
+
+
+def _open(location):
+    if "://" in location:
+        return urllib.request.urlopen(location, timeout=60)
+    return open(location, "rb")
+
+
+def expected_sha256(location, digest=None):
+    """Return the SHA-256 the tarball must have.
+
+    Uses digest if given, otherwise the <tarball>.hashes file Chromium
+    publishes next to its tarballs, or a sha256sum-style <tarball>.sha256.
+    """
+    if digest:
+        if not SHA256.match(digest.lower()):
+            raise ValueError(f"not a SHA-256 digest: {digest}")
+        return digest.lower()
+    for suffix in [".hashes", ".sha256"]:
+        try:
+            with _open(location + suffix) as f:
+                text = f.read().decode()
+        except (OSError, urllib.error.URLError):
+            continue
+        for line in text.splitlines():
+            fields = line.split()
+            if suffix == ".hashes" and len(fields) >= 2 and fields[0] == "sha256":
+                return fields[1].lower()
+            if suffix == ".sha256" and fields and SHA256.match(fields[0].lower()):
+                return fields[0].lower()
+    raise ValueError(f"no checksum for {location}: pass --source-sha256 "
+                     f"or put a .hashes or .sha256 file next to it")
+
+
+def _decompressor(location):
+    for suffix, commands in DECOMPRESSORS.items():
+        if location.endswith(suffix):
+            for cmd in commands:
+                if shutil.which(cmd[0]):
+                    return cmd
+            raise ValueError(f"{commands[0][0]} is needed to unpack {suffix} tarballs")
+    raise ValueError(f"unsupported tarball type: {location} "
+                     f"(expected {', '.join(DECOMPRESSORS)})")
+
+
+def extract_tarball(location, dest, sha256):
+    """Stream, verify and unpack a source tarball into dest; return (bytes read, seconds).
+
+    The tree is unpacked next to dest and only renamed into place once the
+    checksum matches, so a bad or truncated download never leaves a tree
+    behind that looks complete.
+    """
+    decompress = _decompressor(location)
+    partial = dest.with_name(f"{dest.name}.partial")
+    shutil.rmtree(partial, ignore_errors=True)
+    partial.mkdir(parents=True)
+
+    start = time.monotonic()
+    digest = hashlib.sha256()
+    size = 0
+    with _open(location) as source:
+        unpack = subprocess.Popen(decompress, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        # The tarball holds a chromium-<version>/ directory; its contents become src/
+        tar = subprocess.Popen(
+            ["tar", "-x", "--strip-components=1", "-C", str(partial)], stdin=unpack.stdout
+        )
+        unpack.stdout.close()
+        try:
+            for chunk in iter(lambda: source.read(CHUNK_SIZE), b""):
+                digest.update(chunk)
+                size += len(chunk)
+                unpack.stdin.write(chunk)
+            unpack.stdin.close()
+        except BrokenPipeError:
+            # The decompressor gave up; its exit code says why
+            pass
+        except BaseException:
+            unpack.kill()
+            tar.kill()
+            unpack.wait()
+            tar.wait()
+            shutil.rmtree(partial, ignore_errors=True)
+            raise
+        failed = unpack.wait() != 0 or tar.wait() != 0
+
+    if failed:
+        shutil.rmtree(partial, ignore_errors=True)
+        raise ValueError(f"could not unpack {location}")
+    if digest.hexdigest() != sha256:
+        shutil.rmtree(partial, ignore_errors=True)
+        raise ValueError(f"checksum mismatch for {location}: "
+                         f"expected {sha256}, got {digest.hexdigest()}")
+    partial.rename(dest)
+    return size, time.monotonic() - start
@@ -0,0 +1,113 @@
+import os
+import time
+
+import pytest
+
+import artifact_store
+from artifact_store import DirectoryStore, artifact_key, parse_size, publish, restore
+from fingerprint import load_fingerprint
+
+FINGERPRINT = {"chromium_version": "144.0.7521.1", "args": [], "series": [["0001.patch", "a"]]}
+
+
+def _build(out_dir, chrome=b"chrome", pak=b"resources"):
+    out_dir.mkdir(parents=True, exist_ok=True)
+    (out_dir / "chrome").write_bytes(chrome)
+    (out_dir / "resources.pak").write_bytes(pak)
+    (out_dir / "obj.o").write_bytes(b"not part of the payload")
+    return out_dir
+
+
+def _fingerprint(n):
+    return dict(FINGERPRINT, series=[["0001.patch", str(n)]])
+
+
+@pytest.fixture
+def store(tmp_path):
+    return DirectoryStore(tmp_path / "store")
+
+
+def test_parse_size():
+    assert parse_size("20G") == 20 * 1024 ** 3
+    assert parse_size("1.5MiB") == int(1.5 * 1024 ** 2)
+    with pytest.raises(ValueError):
+        parse_size("lots")
+
+
+def test_publish_and_restore(tmp_path, store):
+    built = _build(tmp_path / "built")
+    assert publish(built, FINGERPRINT, store) == artifact_key(FINGERPRINT)
+
+    out_dir = tmp_path / "out"
+    assert restore(out_dir, FINGERPRINT, store)
+    assert (out_dir / "chrome").read_bytes() == b"chrome"
+    assert (out_dir / "chrome").stat().st_mode & 0o777 == 0o755
+    assert not (out_dir / "obj.o").exists()
+    assert load_fingerprint(out_dir) == FINGERPRINT
+
+    assert not restore(tmp_path / "other", _fingerprint(2), store)
+
+
+def test_restore_syncs_the_source_tree_first(tmp_path, store, monkeypatch):
+    publish(_build(tmp_path / "built"), FINGERPRINT, store)
+    calls = []
+
+    def apply_series(src_dir):
+        calls.append((src_dir, (tmp_path / "out" / "chrome").exists()))
+        return len(calls) == 1
+
+    monkeypatch.setattr(artifact_store, "apply_series", apply_series)
+    assert restore(tmp_path / "out", FINGERPRINT, store, src_dir=tmp_path / "src")
+    # The tree was patched before anything was fetched
+    assert calls == [(tmp_path / "src", False)]
+
+    # Patches that don't apply mean nothing is restored
+    assert not restore(tmp_path / "out2", FINGERPRINT, store, src_dir=tmp_path / "src")
+    assert not (tmp_path / "out2").exists()
+
+
+def test_corrupt_object_is_not_restored(tmp_path, store):
+    publish(_build(tmp_path / "built"), FINGERPRINT, store)
+    digest = next(f["sha256"] for f in store.get_manifest(artifact_key(FINGERPRINT))["files"]
+                  if f["path"] == "chrome")
+    store._object(digest).write_bytes(b"tampered")
+    assert not restore(tmp_path / "out", FINGERPRINT, store)
+    assert load_fingerprint(tmp_path / "out") is None
+
+
+def test_put_stream_checks_the_digest(store, tmp_path):
+    (tmp_path / "f").write_bytes(b"data")
+    with pytest.raises(ValueError, match="does not match"):
+        store.put_object("0" * 64, tmp_path / "f")
+
+
+def test_evict_least_recently_used(tmp_path, store):
+    # Every build shares resources.pak; each chrome is 1000 bytes
+    for n in range(3):
+        publish(_build(tmp_path / f"b{n}", chrome=bytes([n]) * 1000), _fingerprint(n), store)
+        past = time.time() - 100 + n
+        os.utime(store._manifest(artifact_key(_fingerprint(n))), (past, past))
+    # Using the oldest artifact makes it the most recent
+    assert store.get_manifest(artifact_key(_fingerprint(0)))
+
+    removed, freed = store.evict(2100)
+    assert (removed, freed) == (1, 1000)
+    assert [m["fingerprint"]["series"][0][1] for _, m in store.manifests()] == ["2", "0"]
+    # The shared pack stays while anything references it
+    assert restore(tmp_path / "out", _fingerprint(0), store)
+    assert (tmp_path / "out" / "resources.pak").read_bytes() == b"resources"
+
+
+def test_evict_removes_old_orphans_only(store, tmp_path):
+    publish(_build(tmp_path / "built"), FINGERPRINT, store)
+    orphans = []
+    for age in (0, artifact_store.ORPHAN_GRACE + 10):
+        digest = f"{age:064x}"
+        path = store._object(digest)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"x" * 10)
+        os.utime(path, (time.time() - age,) * 2)
+        orphans.append(path)
+
+    assert store.evict(parse_size("1G")) == (0, 10)
+    assert orphans[0].exists() and not orphans[1].exists()
@@ -0,0 +1,136 @@
+import threading
+import time
+
+import pytest
+
+from build_stages import run_stages, stage
+
+
+class Recorder:
+    def __init__(self):
+        self.calls = []
+        self.lock = threading.Lock()
+        self.active = 0
+        self.overlaps = []
+
+    def func(self, name, fail=False, gate=None):
+        def run():
+            with self.lock:
+                self.calls.append(name)
+                self.active += 1
+                self.overlaps.append((name, self.active))
+            try:
+                if gate is not None:
+                    assert gate.wait(5), f"{name} never ran alongside its sibling"
+                if fail:
+                    raise RuntimeError(f"{name} failed")
+            finally:
+                with self.lock:
+                    self.active -= 1
+        return run
+
+
+def test_unchanged_stages_are_skipped(tmp_path):
+    inputs = {"a": "1", "b": "1"}
+    recorder = Recorder()
+
+    def stages():
+        return [
+            stage("a", recorder.func("a"), inputs=lambda: [inputs["a"]]),
+            stage("b", recorder.func("b"), deps=["a"], inputs=lambda: [inputs["b"]]),
+            stage("always", recorder.func("always"), deps=["b"]),
+        ]
+
+    run_stages(stages(), tmp_path)
+    assert recorder.calls == ["a", "b", "always"]
+
+    recorder.calls.clear()
+    run_stages(stages(), tmp_path)
+    assert recorder.calls == ["always"]
+
+    # A changed input reruns its stage and everything depending on it
+    recorder.calls.clear()
+    inputs["a"] = "2"
+    run_stages(stages(), tmp_path)
+    assert recorder.calls == ["a", "b", "always"]
+
+    recorder.calls.clear()
+    run_stages(stages(), tmp_path, force=True)
+    assert recorder.calls == ["a", "b", "always"]
+
+
+def test_missing_output_reruns_stage(tmp_path):
+    output = tmp_path / "out.txt"
+    recorder = Recorder()
+
+    def stages():
+        return [stage("a", recorder.func("a"), inputs=lambda: ["x"], outputs=lambda: [output])]
+
+    output.write_text("built")
+    run_stages(stages(), tmp_path / "stamps")
+    output.unlink()
+    run_stages(stages(), tmp_path / "stamps")
+    assert recorder.calls == ["a", "a"]
+
+
+def test_failed_build_resumes_from_failed_stage(tmp_path):
+    recorder = Recorder()
+    failing = {"b": True}
+
+    def stages():
+        return [
+            stage("a", recorder.func("a"), inputs=lambda: ["x"]),
+            stage("b", recorder.func("b", fail=failing["b"]), deps=["a"], inputs=lambda: ["x"]),
+            stage("c", recorder.func("c"), deps=["b"], inputs=lambda: ["x"]),
+        ]
+
+    with pytest.raises(RuntimeError):
+        run_stages(stages(), tmp_path)
+    assert recorder.calls == ["a", "b"]
+
+    recorder.calls.clear()
+    failing["b"] = False
+    run_stages(stages(), tmp_path)
+    assert recorder.calls == ["b", "c"]
+
+
+def test_independent_stages_run_concurrently(tmp_path):
+    recorder = Recorder()
+    both = threading.Barrier(2)
+
+    class Gate:
+        def wait(self, timeout):
+            both.wait(timeout)
+            return True
+
+    run_stages([
+        stage("a", recorder.func("a", gate=Gate())),
+        stage("b", recorder.func("b", gate=Gate())),
+    ], tmp_path, max_workers=2)
+    assert sorted(recorder.calls) == ["a", "b"]
+
+
+def test_exclusive_stage_runs_alone(tmp_path):
+    recorder = Recorder()
+    seen_at_end = []
+
+    def sudo():
+        recorder.func("sudo")()
+        time.sleep(0.2)
+        seen_at_end.append(list(recorder.calls))
+
+    run_stages([
+        stage("a", recorder.func("a")),
+        stage("sudo", sudo, exclusive=True),
+        stage("b", recorder.func("b")),
+        stage("c", recorder.func("c"), deps=["sudo"]),
+    ], tmp_path, max_workers=3)
+    # sudo waited for what was running, and nothing started until it was done
+    assert seen_at_end == [["a", "b", "sudo"]]
+    assert ("sudo", 1) in recorder.overlaps
+    assert recorder.calls == ["a", "b", "sudo", "c"]
+
+
+def test_unknown_dependency(tmp_path):
+    with pytest.raises(ValueError, match="unknown stage"):
+        run_stages([stage("a", lambda: None, deps=["missing"])], tmp_path)
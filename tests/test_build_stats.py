@@ -0,0 +1,55 @@
+import sqlite3
+
+import build_stats
+from build_stats import HISTORY_FILE, print_summary, record_build, report
+
+FINGERPRINT = {"chromium_version": "144.0.7521.1", "series": [["0001.patch", "h"]]}
+
+
+def _ninja_log(out_dir, entries):
+    with open(out_dir / ".ninja_log", "a") as f:
+        if f.tell() == 0:
+            f.write("# ninja log v5\n")
+        for start, end, output in entries:
+            f.write(f"{start}\t{end}\t0\t{output}\tabc\n")
+
+
+def _open_connections(monkeypatch):
+    opened = []
+    real_connect = sqlite3.connect
+
+    def tracking_connect(*args, **kwargs):
+        opened.append(real_connect(*args, **kwargs))
+        return opened[-1]
+
+    monkeypatch.setattr(build_stats.sqlite3, "connect", tracking_connect)
+    return opened
+
+
+def _is_closed(db):
+    try:
+        db.execute("SELECT 1")
+    except sqlite3.ProgrammingError:
+        return True
+    return False
+
+
+def test_report_without_builds_closes_the_database(tmp_path, monkeypatch, capsys):
+    opened = _open_connections(monkeypatch)
+    report(tmp_path, 5, False, None)
+    assert "No builds recorded yet" in capsys.readouterr().out
+    assert opened and all(_is_closed(db) for db in opened)
+
+
+def test_recorded_build_is_summarized(tmp_path, monkeypatch, capsys):
+    _ninja_log(tmp_path, [(0, 4000, "obj/base/a.o"), (0, 9000, "obj/base/b.o"),
+                          (9000, 20000, "chrome")])
+    opened = _open_connections(monkeypatch)
+    build_id = record_build(tmp_path, 0, FINGERPRINT)
+    assert build_id == 1 and (tmp_path / HISTORY_FILE).exists()
+
+    print_summary(tmp_path)
+    out = capsys.readouterr().out
+    assert "3 steps" in out
+    assert "Slowest step: chrome" in out
+    assert all(_is_closed(db) for db in opened)
@@ -0,0 +1,16 @@
+from compile_cache import ccache_env
+from job_scheduler import source_root
+
+
+def test_ccache_env_rewrites_paths_under_the_checkout(tmp_path):
+    env = ccache_env(tmp_path)
+    assert env["CCACHE_BASEDIR"] == str(tmp_path)
+    assert env["CCACHE_NOHASHDIR"] == "true"
+    assert "CCACHE_CPP2" not in env
+
+
+def test_source_root_at_any_out_dir_depth(tmp_path):
+    (tmp_path / ".gn").write_text("")
+    for out_dir in ("out/Default", "out/release/x86_64-v3", "out"):
+        (tmp_path / out_dir).mkdir(parents=True, exist_ok=True)
+        assert source_root(tmp_path / out_dir) == tmp_path.resolve()
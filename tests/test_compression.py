@@ -0,0 +1,29 @@
+import os
+import shutil
+
+import pytest
+
+from compression import GZIP_BLOCK_SIZE
+from release_archive import write_tarball
+
+
+@pytest.fixture(scope="module")
+def out_dir(tmp_path_factory):
+    out_dir = tmp_path_factory.mktemp("out")
+    # Compressible, and spanning several gzip blocks
+    (out_dir / "chrome").write_bytes(os.urandom(1024) * (3 * GZIP_BLOCK_SIZE // 1024))
+    (out_dir / "resources.pak").write_bytes(b"resources")
+    return out_dir
+
+
+@pytest.mark.parametrize("fmt, tool", [("gz", None), ("zst", "zstd"), ("xz", "xz")])
+def test_same_archive_at_any_thread_count(out_dir, tmp_path, fmt, tool):
+    if tool and shutil.which(tool) is None:
+        pytest.skip(f"{tool} is not installed")
+    names = ["chrome", "resources.pak"]
+    archives = []
+    for threads in (1, 4):
+        archive = tmp_path / f"{threads}.tar.{fmt}"
+        write_tarball(out_dir, names, archive, fmt, threads=threads, mtime=0)
+        archives.append(archive.read_bytes())
+    assert archives[0] == archives[1]
@@ -0,0 +1,80 @@
+import json
+
+import pytest
+
+import deps_trim
+from build_profiles import Profile
+from deps_trim import (
+    DISABLED_VARS, EXCLUDED_DEPS, SKIPPED_HOOKS, all_profiles, gclient_overrides,
+    measure_excluded, print_report, record_timing,
+)
+
+
+def _profile(*gn_args):
+    return Profile("test", "", "out/Test", list(gn_args), [], None)
+
+
+@pytest.fixture
+def checkout(tmp_path, monkeypatch):
+    monkeypatch.setattr(deps_trim, "CHROMIUM_DIR", tmp_path)
+    monkeypatch.setattr(deps_trim, "SYNC_LOG", tmp_path / ".deps-sync.json")
+    monkeypatch.setattr(deps_trim, "TRIM_ENABLED", True)
+    return tmp_path
+
+
+def test_overrides_drop_deps_vars_and_hooks(checkout):
+    custom_deps, custom_vars, custom_hooks = gclient_overrides([_profile("is_debug=false")])
+    assert custom_deps == {dep: None for dep in EXCLUDED_DEPS}
+    assert all(custom_vars[var] is False for var in DISABLED_VARS)
+    assert custom_hooks == [{"name": name} for name in SKIPPED_HOOKS]
+    assert custom_vars["checkout_pgo_profiles"] is False
+    assert custom_vars["checkout_nacl"] is False
+
+
+@pytest.mark.parametrize("gn_args, pgo", [
+    (["is_official_build=true"], True),
+    (["is_official_build=true", "chrome_pgo_phase=0"], False),
+    (["chrome_pgo_phase=2"], True),
+    (["is_official_build=false"], False),
+])
+def test_pgo_profiles_follow_the_args(checkout, gn_args, pgo):
+    assert gclient_overrides([_profile(*gn_args)])[1]["checkout_pgo_profiles"] is pgo
+
+
+def test_any_profile_needing_a_var_keeps_it(checkout):
+    profiles = [_profile("enable_nacl=false"), _profile("enable_nacl = true")]
+    assert gclient_overrides(profiles)[1]["checkout_nacl"] is True
+
+
+def test_repo_profiles_keep_pgo_for_official_builds(checkout):
+    custom_vars = gclient_overrides(all_profiles())[1]
+    assert custom_vars["checkout_pgo_profiles"] is True
+    assert custom_vars["checkout_nacl"] is False
+
+
+def test_trim_disabled_syncs_everything(checkout, monkeypatch):
+    monkeypatch.setattr(deps_trim, "TRIM_ENABLED", False)
+    assert gclient_overrides([_profile()]) == ({}, {"checkout_pgo_profiles": True}, [])
+
+
+def test_measure_and_report(checkout, capsys, monkeypatch):
+    dep = checkout / EXCLUDED_DEPS[0]
+    dep.mkdir(parents=True)
+    (dep / "data.bin").write_bytes(b"x" * 3 * 1024 ** 2)
+    measure_excluded()
+    # A later measurement without the dep on disk keeps the earlier size
+    (dep / "data.bin").unlink()
+    dep.rmdir()
+    measure_excluded()
+    record_timing("sync", 100.04)
+    log = json.loads((checkout / ".deps-sync.json").read_text())
+    assert log["excluded_bytes"] == {EXCLUDED_DEPS[0]: 3 * 1024 ** 2}
+    assert log["trimmed"] == {"sync": 100.0}
+
+    monkeypatch.setattr(deps_trim, "TRIM_ENABLED", False)
+    record_timing("sync", 160)
+    monkeypatch.setattr(deps_trim, "TRIM_ENABLED", True)
+    print_report()
+    out = capsys.readouterr().out
+    assert "3 MiB saved on disk" in out
+    assert "gclient sync: 100s trimmed vs 160s full, 60s saved" in out
@@ -0,0 +1,36 @@
+import pytest
+
+import impact_index
+from impact_index import ImpactIndex
+
+BUILD_NINJA = """\
+rule cxx
+  command = clang++ -c $in -o $out
+rule link
+  command = clang++ $in -o $out
+build obj/base/a.o: cxx {prefix}/base/a.cc
+build obj/base/b.o: cxx {prefix}/base/b.cc
+build obj/tools/unused.o: cxx {prefix}/tools/unused.cc
+build chrome: link obj/base/a.o obj/base/b.o
+"""
+
+
+@pytest.mark.parametrize("out_dir, prefix", [
+    ("out/Default", "../.."),
+    ("out/release/x86_64-v3", "../../.."),
+])
+def test_estimates_for_out_dirs_at_any_depth(tmp_path, monkeypatch, out_dir, prefix):
+    monkeypatch.setattr(impact_index, "SRC_DIR", tmp_path)
+    out_path = tmp_path / out_dir
+    out_path.mkdir(parents=True)
+    (out_path / "build.ninja").write_text(BUILD_NINJA.format(prefix=prefix))
+
+    index = ImpactIndex(out_path)
+    assert index.ninja_path("base/a.cc") == f"{prefix}/base/a.cc"
+    estimate = index.estimate(["base/a.cc"], log={})
+    assert (estimate["compile"], estimate["link"]) == (1, 1)
+    # Outside the chrome closure, so nothing that matters rebuilds
+    assert index.estimate(["tools/unused.cc"], log={})["compile"] == 0
+    assert index.unknown_paths(["base/b.cc", "base/new.cc", "BUILD.gn"]) == [
+        "base/new.cc", "BUILD.gn",
+    ]
@@ -0,0 +1,60 @@
+import pytest
+
+import job_scheduler
+from arch_build import args_gn_matches
+from job_scheduler import GIB, load_memory_history, plan_jobs, save_memory_history
+
+
+@pytest.fixture
+def machine(monkeypatch):
+    def configure(cpus, total, available=None):
+        monkeypatch.setattr(job_scheduler.multiprocessing, "cpu_count", lambda: cpus)
+        monkeypatch.setattr(job_scheduler, "read_meminfo", lambda: {
+            "MemTotal": total, "MemAvailable": total if available is None else available,
+        })
+    return configure
+
+
+def test_defaults_without_history(machine, tmp_path):
+    machine(cpus=64, total=128 * GIB)
+    # Memory fits 81 default 1.5 GiB compiles, so the CPUs decide
+    assert plan_jobs(tmp_path) == (66, 4)
+
+
+def test_memory_bounds_compile_jobs(machine, tmp_path):
+    machine(cpus=64, total=32 * GIB, available=20 * GIB)
+    compile_jobs, links = plan_jobs(tmp_path)
+    assert compile_jobs == int((20 * GIB - 2 * GIB) // int(1.5 * GIB))
+    assert links == 1
+
+
+def test_recorded_peaks_size_the_next_build(machine, tmp_path):
+    machine(cpus=64, total=128 * GIB)
+    save_memory_history(tmp_path, {"compile": [4 * GIB] * 100, "link": [30 * GIB]})
+    compile_jobs, links = plan_jobs(tmp_path)
+    assert compile_jobs == int((128 * GIB - 128 * GIB // 20) // (4 * GIB))
+    assert links == 2
+
+
+def test_history_keeps_recent_samples(tmp_path, monkeypatch):
+    monkeypatch.setitem(job_scheduler.MAX_SAMPLES, "link", 3)
+    save_memory_history(tmp_path, {"compile": [1, 2], "link": [1, 2, 3, 4, 5]})
+    assert load_memory_history(tmp_path) == {"compile": [1, 2], "link": [3, 4, 5]}
+
+
+def test_small_machine_gets_one_job(machine, tmp_path):
+    machine(cpus=4, total=4 * GIB, available=GIB)
+    assert plan_jobs(tmp_path) == (1, 1)
+
+
+def test_without_meminfo_fall_back_to_cpus(monkeypatch, tmp_path):
+    monkeypatch.setattr(job_scheduler.multiprocessing, "cpu_count", lambda: 8)
+    monkeypatch.setattr(job_scheduler, "read_meminfo", lambda: {})
+    assert plan_jobs(tmp_path) == (8, 1)
+
+
+def test_link_pool_does_not_change_configured_args(tmp_path):
+    (tmp_path / "args.gn").write_text('is_debug=false\nconcurrent_links=2\n')
+    assert args_gn_matches(tmp_path, ["is_debug=false", "concurrent_links=4"])
+    assert args_gn_matches(tmp_path, ["is_debug=false"])
+    assert not args_gn_matches(tmp_path, ["is_debug=true", "concurrent_links=2"])
@@ -0,0 +1,186 @@
+import pytest
+
+import patch_engine
+from patch_engine import (
+    PatchError, apply_hunks, parse_patch, plan_series, read_source, write_plan,
+)
+from patching import apply_series, read_applied
+
+ORIGINAL = b"".join(b"line %d\n" % n for n in range(1, 21))
+
+CHANGE_10 = b"""--- a/file.txt
++++ b/file.txt
+@@ -9,3 +9,3 @@
+ line 9
+-line 10
++line ten
+ line 11
+"""
+
+
+def _apply(data, patch, **kwargs):
+    (file_patch,) = parse_patch(patch)
+    lines, results = apply_hunks(data.splitlines(keepends=True), file_patch, **kwargs)
+    return b"".join(lines), results
+
+
+def _write_series(patches_dir, patches):
+    patches_dir.mkdir(exist_ok=True)
+    for name, data in patches.items():
+        (patches_dir / name).write_bytes(data)
+    (patches_dir / "series").write_text("".join(f"{name}\n" for name in patches))
+
+
+def _snapshot(root):
+    return {
+        str(path.relative_to(root)): path.read_bytes()
+        for path in sorted(root.rglob("*")) if path.is_file()
+    }
+
+
+def test_exact_match():
+    data, (result,) = _apply(ORIGINAL, CHANGE_10)
+    assert data == ORIGINAL.replace(b"line 10\n", b"line ten\n")
+    assert (result.offset, result.fuzz) == (0, 0)
+
+
+def test_offset():
+    data, (result,) = _apply(b"new 1\nnew 2\nnew 3\n" + ORIGINAL, CHANGE_10)
+    assert b"line ten\n" in data and b"line 10\n" not in data
+    assert (result.offset, result.fuzz, result.line) == (3, 0, 12)
+
+
+def test_fuzz():
+    # The leading context line no longer matches, so it takes fuzz 1
+    data, (result,) = _apply(ORIGINAL.replace(b"line 9\n", b"line nine\n"), CHANGE_10)
+    assert b"line ten\n" in data
+    assert result.fuzz == 1
+
+
+def test_fuzz_limit():
+    with pytest.raises(PatchError, match="hunk #1 FAILED"):
+        _apply(ORIGINAL.replace(b"line 9\n", b"line nine\n"), CHANGE_10, max_fuzz=0)
+
+
+def test_failed_hunks_are_collected():
+    failed = []
+    data, results = _apply(ORIGINAL.replace(b"line 10\n", b"line X\n"), CHANGE_10,
+                           max_fuzz=0, failed=failed)
+    assert failed == [1] and results == []
+    assert data == ORIGINAL.replace(b"line 10\n", b"line X\n")
+
+
+def test_no_newline_at_end_of_file():
+    patch = b"""--- a/file.txt
++++ b/file.txt
+@@ -1,2 +1,2 @@
+ one
+-two
+\\ No newline at end of file
++TWO
+\\ No newline at end of file
+"""
+    assert _apply(b"one\ntwo", patch)[0] == b"one\nTWO"
+
+    adds_newline = b"""--- a/file.txt
++++ b/file.txt
+@@ -1 +1 @@
+-two
+\\ No newline at end of file
++two
+"""
+    assert _apply(b"two", adds_newline)[0] == b"two\n"
+
+
+def test_crlf_file_keeps_its_line_endings():
+    crlf = ORIGINAL.replace(b"\n", b"\r\n")
+    data, _ = _apply(crlf, CHANGE_10)
+    assert data == crlf.replace(b"line 10\r\n", b"line ten\r\n")
+
+
+def test_create_delete_and_pc_round_trip(tmp_path, monkeypatch):
+    # Three disjoint groups, applied by worker processes even on one CPU
+    monkeypatch.setattr(patch_engine.os, "cpu_count", lambda: 4)
+    src_dir = tmp_path / "src"
+    src_dir.mkdir()
+    (src_dir / "file.txt").write_bytes(ORIGINAL)
+    (src_dir / "gone.txt").write_bytes(b"bye\n")
+    before = _snapshot(src_dir)
+
+    patches_dir = tmp_path / "patches"
+    _write_series(patches_dir, {
+        "change.patch": CHANGE_10,
+        "create.patch": b"--- /dev/null\n+++ b/new/added.txt\n@@ -0,0 +1,2 @@\n+hello\n+world\n",
+        "delete.patch": b"--- a/gone.txt\n+++ /dev/null\n@@ -1 +0,0 @@\n-bye\n",
+    })
+    assert apply_series(src_dir, patches_dir)
+    assert (src_dir / "new" / "added.txt").read_bytes() == b"hello\nworld\n"
+    assert not (src_dir / "gone.txt").exists()
+    assert read_applied(src_dir) == ["change.patch", "create.patch", "delete.patch"]
+    # quilt keeps the pre-patch files, with an empty backup for created ones
+    assert (src_dir / ".pc" / "change.patch" / "file.txt").read_bytes() == ORIGINAL
+    assert (src_dir / ".pc" / "create.patch" / "new" / "added.txt").read_bytes() == b""
+    assert (src_dir / ".pc" / "delete.patch" / "gone.txt").read_bytes() == b"bye\n"
+
+    # Emptying the series pops everything back off, from the backups
+    (patches_dir / "series").write_text("")
+    assert apply_series(src_dir, patches_dir)
+    assert read_applied(src_dir) == []
+    assert {k: v for k, v in _snapshot(src_dir).items() if not k.startswith(".pc")} == before
+    assert not (src_dir / ".pc" / "change.patch").exists()
+
+
+def test_create_refuses_existing_empty_file(tmp_path):
+    (tmp_path / "empty.txt").write_bytes(b"")
+    patches_dir = tmp_path / "patches"
+    _write_series(patches_dir, {
+        "create.patch": b"--- /dev/null\n+++ b/empty.txt\n@@ -0,0 +1 @@\n+text\n",
+    })
+    plan = plan_series(tmp_path, [], ["create.patch"], patches_dir)
+    assert plan.errors == ["create.patch: empty.txt already exists"]
+
+
+def test_failing_hunk_leaves_tree_untouched(tmp_path, monkeypatch):
+    monkeypatch.setattr(patch_engine.os, "cpu_count", lambda: 2)
+    src_dir = tmp_path / "src"
+    src_dir.mkdir()
+    (src_dir / "file.txt").write_bytes(ORIGINAL)
+    (src_dir / "other.txt").write_bytes(b"one\ntwo\n")
+    patches_dir = tmp_path / "patches"
+    _write_series(patches_dir, {
+        "good.patch": b"--- a/other.txt\n+++ b/other.txt\n@@ -1,2 +1,2 @@\n-one\n+uno\n two\n",
+        "bad.patch": CHANGE_10.replace(b"-line 10", b"-line 99"),
+    })
+    before = _snapshot(src_dir)
+    assert not apply_series(src_dir, patches_dir)
+    assert _snapshot(src_dir) == before
+
+
+def test_failed_write_rolls_back_files_and_pc(tmp_path, monkeypatch):
+    src_dir = tmp_path / "src"
+    src_dir.mkdir()
+    (src_dir / "file.txt").write_bytes(ORIGINAL)
+    (src_dir / "other.txt").write_bytes(b"one\ntwo\n")
+    patches_dir = tmp_path / "patches"
+    _write_series(patches_dir, {"change.patch": CHANGE_10})
+    assert apply_series(src_dir, patches_dir)
+    before = _snapshot(src_dir)
+
+    # Pop change.patch and push another, failing while .pc is rewritten
+    _write_series(patches_dir, {
+        "other.patch": b"--- a/other.txt\n+++ b/other.txt\n@@ -1,2 +1,2 @@\n-one\n+uno\n two\n",
+    })
+    plan = plan_series(src_dir, ["change.patch"], ["other.patch"], patches_dir)
+    assert not plan.errors
+    real_write_text = patch_engine.Path.write_text
+
+    def failing_write_text(path, *args, **kwargs):
+        if path.name == "applied-patches":
+            raise OSError("disk full")
+        return real_write_text(path, *args, **kwargs)
+
+    monkeypatch.setattr(patch_engine.Path, "write_text", failing_write_text)
+    with pytest.raises(OSError):
+        write_plan(src_dir, plan, patches_dir)
+    assert _snapshot(src_dir) == before
+    assert read_source(src_dir, ".pc.new/applied-patches") is None
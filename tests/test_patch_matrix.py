@@ -0,0 +1,67 @@
+import sys
+
+import pytest
+
+import patch_matrix
+from patch_series import read_series
+
+ORIGINAL = b"".join(b"line %d\n" % n for n in range(1, 21))
+
+# Made against ORIGINAL; the tree checked has two lines more at the top
+MOVED = b"""--- a/file.txt
++++ b/file.txt
+@@ -9,3 +9,3 @@ context
+ line 9
+-line 10
++line ten
+ line 11
+"""
+REFRESHED = MOVED.replace(b"@@ -9,3 +9,3 @@", b"@@ -11,3 +11,3 @@")
+
+CLEAN = b"""--- a/other.txt
++++ b/other.txt
+@@ -1,2 +1,2 @@
+-one
++uno
+ two
+"""
+
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+    patches_dir = tmp_path / "patches"
+    patches_dir.mkdir()
+    (patches_dir / "series").write_text("moved.patch\nclean.patch\n")
+    (patches_dir / "moved.patch").write_bytes(MOVED)
+    (patches_dir / "clean.patch").write_bytes(CLEAN)
+
+    src_dir = tmp_path / "src"
+    src_dir.mkdir()
+    (src_dir / "file.txt").write_bytes(b"new 1\nnew 2\n" + ORIGINAL)
+    (src_dir / "other.txt").write_bytes(b"one\ntwo\n")
+
+    monkeypatch.setattr(patch_matrix, "PATCHES_DIR", patches_dir)
+    monkeypatch.setattr(patch_matrix, "read_series", lambda: read_series(patches_dir))
+    monkeypatch.setattr(patch_matrix, "REFRESH_DIR", tmp_path / "refreshed")
+    monkeypatch.setattr(patch_matrix, "CACHE_FILE", tmp_path / "cache.json")
+    return tmp_path, src_dir
+
+
+def test_refresh_writes_patches_with_moved_hunks(workspace, monkeypatch, capsys):
+    tmp_path, src_dir = workspace
+    monkeypatch.setattr(sys, "argv", ["patch_matrix.py", "--refresh", str(src_dir)])
+    patch_matrix.main()
+
+    out_dir = tmp_path / "refreshed" / str(src_dir).strip("/").replace("/", "_")
+    assert sorted(p.name for p in out_dir.iterdir()) == ["moved.patch"]
+    assert (out_dir / "moved.patch").read_bytes() == REFRESHED
+    assert "1 patches with moved hunks refreshed" in capsys.readouterr().out
+
+
+def test_refresh_skips_trees_with_conflicts(workspace, monkeypatch):
+    tmp_path, src_dir = workspace
+    (src_dir / "file.txt").write_bytes(ORIGINAL.replace(b"line 10\n", b"line X\n"))
+    monkeypatch.setattr(sys, "argv", ["patch_matrix.py", "--refresh", str(src_dir)])
+    with pytest.raises(SystemExit):
+        patch_matrix.main()
+    assert not (tmp_path / "refreshed").exists()
@@ -0,0 +1,168 @@
+import subprocess
+from collections import namedtuple
+
+import pytest
+
+import patch_watch
+from patch_watch import Watcher, wait_for_changes
+
+Profile = namedtuple("Profile", ["name", "out_dir"])
+PROFILES = [Profile("a", "out/a"), Profile("b", "out/b")]
+
+
+class FakeInotify:
+    """Hands out one batch of names per read; an empty batch is a quiet period."""
+
+    def __init__(self, batches):
+        self.batches = list(batches)
+        self.timeouts = []
+
+    def read(self, timeout=None):
+        self.timeouts.append(timeout)
+        return self.batches.pop(0) if self.batches else []
+
+
+def test_debounce_collects_a_burst_of_saves():
+    inotify = FakeInotify([["0001.patch"], [".0001.patch.swp"], ["0001.patch", "series"], []])
+    assert wait_for_changes(inotify, debounce=0.3) == {"0001.patch", ".0001.patch.swp", "series"}
+    # The first read blocks, the rest wait for quiet
+    assert inotify.timeouts == [None, 0.3, 0.3, 0.3]
+
+
+def test_debounce_returns_after_one_quiet_period():
+    inotify = FakeInotify([["series"], [], ["later.patch"]])
+    assert wait_for_changes(inotify, debounce=0.1) == {"series"}
+    assert inotify.batches == [["later.patch"]]
+
+
+class FakeIndex:
+    def __init__(self, steps, known=()):
+        self.steps = steps
+        self.known = set(known)
+
+    def unknown_paths(self, paths):
+        return [path for path in paths if path not in self.known]
+
+    def estimate(self, paths):
+        return {"compile": self.steps, "link": 0, "other": 0, "seconds": 0, "timed": 0}
+
+
+@pytest.fixture
+def watcher(monkeypatch):
+    """A Watcher whose patching, gn and ninja are stubbed out."""
+    state = {
+        "series": [("0001.patch", "h1")],
+        "changed": set(),
+        "apply_ok": True,
+        "results": {},
+        "built": [],
+        "configure_error": None,
+        "indexes": {"a": FakeIndex(1, {"x.cc"}), "b": FakeIndex(0, {"x.cc"})},
+    }
+
+    def apply_series(src_dir, patches_dir, changed):
+        changed.update(state["changed"])
+        return state["apply_ok"]
+
+    def configure_build(profile):
+        if state["configure_error"]:
+            raise state["configure_error"]
+
+    def run_builds(profiles):
+        state["built"].append([p.name for p in profiles])
+        return {p.name: state["results"].get(p.name, 0) for p in profiles}
+
+    monkeypatch.setattr(patch_watch, "series_hashes", lambda patches_dir: list(state["series"]))
+    monkeypatch.setattr(patch_watch, "apply_series", apply_series)
+    monkeypatch.setattr(patch_watch, "configure_build", configure_build)
+    monkeypatch.setattr(patch_watch, "run_builds", run_builds)
+    w = Watcher(PROFILES)
+    monkeypatch.setattr(w, "_index", lambda profile: state["indexes"][profile.name])
+    return w, state
+
+
+def test_first_update_builds_everything(watcher):
+    w, state = watcher
+    assert w.update()
+    assert state["built"] == [["a", "b"]]
+
+
+def test_only_profiles_the_change_reaches_are_built(watcher):
+    w, state = watcher
+    w.update()
+    state["series"] = [("0001.patch", "h2")]
+    state["changed"] = {"x.cc"}
+    assert w.update()
+    assert state["built"][-1] == ["a"]
+
+
+def test_nothing_reached_builds_nothing(watcher):
+    w, state = watcher
+    w.update()
+    state["indexes"]["a"] = FakeIndex(0, {"x.cc"})
+    state["series"] = [("0001.patch", "h2")]
+    state["changed"] = {"x.cc"}
+    assert w.update()
+    assert len(state["built"]) == 1
+
+
+def test_unchanged_series_does_nothing(watcher):
+    w, state = watcher
+    w.update()
+    assert w.update()
+    assert len(state["built"]) == 1
+
+
+@pytest.mark.parametrize("path", ["chrome/BUILD.gn", "build/config/features.gni", "new_file.cc"])
+def test_files_outside_the_graph_build_every_profile(watcher, path):
+    w, state = watcher
+    w.update()
+    state["series"] = [("0001.patch", "h2")]
+    state["changed"] = {path}
+    assert w.update()
+    assert state["built"][-1] == ["a", "b"]
+
+
+def test_failed_build_is_retried_on_the_next_save(watcher):
+    w, state = watcher
+    w.update()
+    state["series"] = [("0001.patch", "h2")]
+    state["changed"] = {"x.cc"}
+    state["results"] = {"a": 1}
+    assert not w.update()
+
+    # Saving the same content again retries the failed profile only
+    state["changed"] = set()
+    state["results"] = {}
+    assert w.update()
+    assert state["built"][-1] == ["a"]
+    assert w.update() and len(state["built"]) == 3
+
+
+@pytest.mark.parametrize("error", [
+    SystemExit(1), subprocess.CalledProcessError(1, ["gn", "gen"]),
+])
+def test_gn_failure_keeps_watching(watcher, error):
+    w, state = watcher
+    w.update()
+    state["series"] = [("0001.patch", "h2")]
+    state["changed"] = {"x.cc"}
+    state["configure_error"] = error
+    assert not w.update()
+
+    state["configure_error"] = None
+    state["changed"] = set()
+    assert w.update()
+    assert state["built"][-1] == ["a", "b"]
+
+
+def test_failing_patches_are_retried(watcher):
+    w, state = watcher
+    w.update()
+    state["series"] = [("0001.patch", "broken")]
+    state["apply_ok"] = False
+    assert not w.update()
+    state["apply_ok"] = True
+    state["changed"] = {"x.cc"}
+    assert w.update()
+    assert state["built"][-1] == ["a"]
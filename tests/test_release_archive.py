@@ -0,0 +1,91 @@
+import hashlib
+import shutil
+import tarfile
+
+import pytest
+
+import release_archive
+from release_archive import stage_directory, write_tarball
+from release_files import APP_DIR, LAUNCHER, LAUNCHER_NAME
+
+
+@pytest.fixture
+def out_dir(tmp_path):
+    out_dir = tmp_path / "out"
+    (out_dir / "locales").mkdir(parents=True)
+    (out_dir / "chrome").write_bytes(b"\x7fELF chrome")
+    (out_dir / "chrome").chmod(0o644)
+    (out_dir / "resources.pak").write_bytes(b"resources")
+    (out_dir / "locales" / "en-US.pak").write_bytes(b"english")
+    return out_dir
+
+
+NAMES = ["chrome", "locales/en-US.pak", "resources.pak"]
+
+
+def test_tarball_layout_and_digests(out_dir, tmp_path):
+    archive = tmp_path / "release.tar.gz"
+    result = write_tarball(out_dir, NAMES, archive, "gz", mtime=1234)
+
+    with tarfile.open(archive) as tar:
+        members = tar.getmembers()
+        assert [m.name for m in members] == [
+            APP_DIR, f"{APP_DIR}/locales",
+            f"{APP_DIR}/chrome", f"{APP_DIR}/locales/en-US.pak", f"{APP_DIR}/resources.pak",
+            f"{APP_DIR}/{LAUNCHER_NAME}",
+        ]
+        assert {m.mtime for m in members} == {1234}
+        assert {(m.uname, m.gname, m.uid, m.gid) for m in members} == {("root", "root", 0, 0)}
+        modes = {m.name: m.mode for m in members}
+        # Modes come from the payload rules, not from the files on disk
+        assert modes[f"{APP_DIR}/chrome"] == 0o755
+        assert modes[f"{APP_DIR}/resources.pak"] == 0o644
+        assert tar.extractfile(f"{APP_DIR}/{LAUNCHER_NAME}").read() == LAUNCHER.encode()
+
+    expected = {name: hashlib.sha256((out_dir / name).read_bytes()).hexdigest() for name in NAMES}
+    expected[LAUNCHER_NAME] = hashlib.sha256(LAUNCHER.encode()).hexdigest()
+    assert result.digests == {"sha256": expected}
+    assert result.read == sum((out_dir / name).stat().st_size for name in NAMES)
+    assert not archive.with_name(f"{archive.name}.tmp").exists()
+
+
+def test_extra_digest_algorithms(out_dir, tmp_path):
+    result = write_tarball(out_dir, NAMES, tmp_path / "r.tar.gz", "gz",
+                           algorithms=("sha256", "blake2b"))
+    assert result.digests["blake2b"]["chrome"] == hashlib.blake2b(b"\x7fELF chrome").hexdigest()
+
+
+@pytest.mark.parametrize("fmt, tool", [("gz", None), ("zst", "zstd"), ("xz", "xz")])
+def test_failure_cleans_up_compressor(out_dir, tmp_path, monkeypatch, fmt, tool):
+    if tool and shutil.which(tool) is None:
+        pytest.skip(f"{tool} is not installed")
+    compressors = []
+    real_open = release_archive.open_compressor
+
+    def recording_open(*args, **kwargs):
+        compressors.append(real_open(*args, **kwargs))
+        return compressors[-1]
+
+    monkeypatch.setattr(release_archive, "open_compressor", recording_open)
+    archive = tmp_path / f"release.tar.{fmt}"
+    with pytest.raises(FileNotFoundError):
+        write_tarball(out_dir, NAMES + ["missing.so"], archive, fmt)
+
+    (compressor,) = compressors
+    if fmt == "gz":
+        assert compressor.pool._shutdown
+    else:
+        assert compressor.process.poll() is not None
+    assert not archive.exists()
+    assert not archive.with_name(f"{archive.name}.tmp").exists()
+
+
+def test_stage_directory(out_dir, tmp_path):
+    dest = tmp_path / "staged"
+    counts = stage_directory(out_dir, NAMES, dest)
+    assert sum(counts.values()) == len(NAMES)
+    assert (dest / "locales" / "en-US.pak").read_bytes() == b"english"
+    assert (dest / "chrome").stat().st_mode & 0o777 == 0o755
+    assert (dest / LAUNCHER_NAME).read_text() == LAUNCHER
+    # chrome has the wrong mode on disk, so it must not share the out dir's inode
+    assert (out_dir / "chrome").stat().st_mode & 0o777 == 0o644
@@ -0,0 +1,69 @@
+import os
+import shutil
+import tarfile
+
+import pytest
+
+import integrity
+import release_delta
+from apply_delta import apply_delta
+from compression import GZIP_BLOCK_SIZE
+from release_archive import write_tarball
+from release_delta import DELTA_SUFFIX, write_delta
+from release_files import APP_DIR
+
+pytestmark = pytest.mark.skipif(shutil.which("zstd") is None, reason="zstd is not installed")
+
+
+def _payload(out_dir, chrome):
+    out_dir.mkdir(exist_ok=True)
+    (out_dir / "chrome").write_bytes(chrome)
+    (out_dir / "resources.pak").write_bytes(b"resources")
+    return ["chrome", "resources.pak"]
+
+
+def test_delta_from_parallel_gzip_release(tmp_path):
+    # Larger than a gzip block, so the base archive has several members
+    chrome = os.urandom(GZIP_BLOCK_SIZE + 4096)
+    names = _payload(tmp_path / "old", chrome)
+    base = tmp_path / "better-chromium-old-linux-x86-64.tar.gz"
+    old = write_tarball(tmp_path / "old", names, base, "gz", threads=2, mtime=0)
+
+    names = _payload(tmp_path / "new", chrome[:-4096] + os.urandom(4096))
+    new = write_tarball(tmp_path / "new", names, tmp_path / "new.tar.gz", "gz", mtime=0)
+    delta_path = tmp_path / f"better-chromium-old-to-new-linux-x86-64{DELTA_SUFFIX}"
+    patched, added, deleted = write_delta(
+        base, tmp_path / "new", names, new.digests["sha256"], delta_path, 0
+    )
+    assert (patched, added, deleted) == (["chrome"], [], [])
+
+    with tarfile.open(base, "r:gz") as tar:
+        tar.extractall(tmp_path / "install", filter="data")
+    install_dir = tmp_path / "install" / APP_DIR
+    assert old.digests["sha256"]["chrome"] != new.digests["sha256"]["chrome"]
+    assert apply_delta(delta_path, install_dir)
+    assert (install_dir / "chrome").read_bytes() == (tmp_path / "new" / "chrome").read_bytes()
+
+
+def test_unreadable_base_file_is_shipped_in_full(tmp_path, monkeypatch):
+    base_dir = tmp_path / "base"
+    _payload(base_dir, b"old chrome")
+    names = _payload(tmp_path / "new", b"new chrome")
+    new = write_tarball(tmp_path / "new", names, tmp_path / "new.tar.gz", "gz", mtime=0)
+
+    real_hash_file = integrity.hash_file
+    monkeypatch.setattr(integrity, "hash_file", lambda path, *args: (
+        None if path.name == "chrome" else real_hash_file(path, *args)
+    ))
+    delta_path = tmp_path / f"new{DELTA_SUFFIX}"
+    patched, added, deleted = write_delta(
+        base_dir, tmp_path / "new", names, new.digests["sha256"], delta_path, 0
+    )
+    assert "chrome" in added and "chrome" not in patched
+    assert deleted == []
+
+
+def test_check_delta_needs_zstd(monkeypatch):
+    monkeypatch.setattr(release_delta.shutil, "which", lambda tool: None)
+    with pytest.raises(ValueError, match="zstd is not installed"):
+        release_delta.check_delta()
@@ -0,0 +1,108 @@
+import subprocess
+import threading
+
+import pytest
+
+import source_cache
+from source_cache import cache_env, cache_lock, clone_from_cache, has_tag, update_mirror
+
+
+def _git(*args, cwd=None):
+    subprocess.run(["git", "-c", "user.name=t", "-c", "user.email=t@t", *args],
+                   cwd=cwd, check=True, capture_output=True)
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    root = tmp_path / "cache"
+    monkeypatch.setattr(source_cache, "CACHE_DIR", root)
+    monkeypatch.setattr(source_cache, "LOCK_FILE", root / ".lock")
+    monkeypatch.setattr(source_cache, "SRC_MIRROR", root / "chromium-src.git")
+    monkeypatch.setattr(source_cache, "GCLIENT_CACHE", root / "gclient")
+    monkeypatch.setattr(source_cache, "CIPD_CACHE", root / "cipd")
+    monkeypatch.setattr(source_cache, "CACHE_ENABLED", True)
+    monkeypatch.setattr(source_cache, "OFFLINE", False)
+    return root
+
+
+@pytest.fixture
+def upstream(tmp_path):
+    repo = tmp_path / "upstream"
+    repo.mkdir()
+    _git("init", "-q", cwd=repo)
+    (repo / "README").write_text("chromium\n")
+    _git("add", "README", cwd=repo)
+    _git("commit", "-qm", "release", cwd=repo)
+    _git("tag", "144.0.7521.1", cwd=repo)
+    return repo
+
+
+def test_lock_waits_for_the_holder(cache):
+    events = []
+
+    def second_builder():
+        with cache_lock():
+            events.append("second")
+
+    with cache_lock():
+        waiter = threading.Thread(target=second_builder)
+        waiter.start()
+        waiter.join(0.5)
+        # Still blocked while the first builder holds the lock
+        assert waiter.is_alive()
+        events.append("first done")
+    waiter.join(5)
+    assert events == ["first done", "second"]
+
+
+def test_lock_is_released_on_error(cache):
+    with pytest.raises(RuntimeError):
+        with cache_lock():
+            raise RuntimeError("fetch failed")
+    done = threading.Event()
+
+    def next_builder():
+        with cache_lock():
+            done.set()
+
+    threading.Thread(target=next_builder).start()
+    assert done.wait(5)
+
+
+def test_update_mirror_and_clone(cache, upstream, tmp_path, capsys):
+    url = upstream.as_uri()
+    assert not has_tag("144.0.7521.1")
+    update_mirror(url, "144.0.7521.1")
+    assert has_tag("144.0.7521.1")
+
+    update_mirror(url, "144.0.7521.1")
+    assert "already in the git cache" in capsys.readouterr().out
+
+    dest = tmp_path / "src"
+    clone_from_cache(url, "144.0.7521.1", dest)
+    assert (dest / "README").read_text() == "chromium\n"
+    origin = subprocess.run(["git", "-C", str(dest), "remote", "get-url", "origin"],
+                            capture_output=True, text=True, check=True).stdout.strip()
+    assert origin == url
+
+
+def test_offline_refuses_to_fetch(cache, upstream, monkeypatch):
+    monkeypatch.setattr(source_cache, "OFFLINE", True)
+    with pytest.raises(ValueError, match="not in the git cache"):
+        update_mirror(upstream.as_uri(), "144.0.7521.1")
+
+
+def test_offline_env_rewrites_mirrored_urls(cache, upstream, monkeypatch):
+    mirror = cache / "gclient" / "example.com-dep"
+    _git("clone", "-q", "--mirror", upstream.as_uri(), str(mirror))
+    assert "GIT_CONFIG_COUNT" not in cache_env()
+
+    monkeypatch.setattr(source_cache, "OFFLINE", True)
+    env = cache_env()
+    assert env["GIT_CACHE_PATH"] == str(cache / "gclient")
+    assert env["GIT_CONFIG_COUNT"] == "1"
+    assert env["GIT_CONFIG_KEY_0"] == f"url.{mirror}.insteadOf"
+    assert env["GIT_CONFIG_VALUE_0"] == upstream.as_uri()
+
+    monkeypatch.setattr(source_cache, "CACHE_ENABLED", False)
+    assert cache_env() == {}
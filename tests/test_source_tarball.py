@@ -0,0 +1,109 @@
+import functools
+import hashlib
+import http.server
+import io
+import tarfile
+import threading
+
+import pytest
+
+from source_tarball import expected_sha256, extract_tarball, tarball_location
+
+VERSION = "144.0.7521.1"
+
+
+def _tarball(path, files):
+    with tarfile.open(path, "w:gz") as tar:
+        for name, data in files.items():
+            info = tarfile.TarInfo(f"chromium-{VERSION}/{name}")
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+class QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def mirror(tmp_path):
+    root = tmp_path / "mirror"
+    root.mkdir()
+    handler = functools.partial(QuietHandler, directory=str(root))
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield root, f"http://127.0.0.1:{server.server_port}/"
+    server.shutdown()
+
+
+def test_tarball_location(tmp_path):
+    assert tarball_location(str(tmp_path), VERSION) == str(tmp_path / f"chromium-{VERSION}.tar.xz")
+    assert tarball_location(str(tmp_path / "src.tar.zst"), VERSION) == str(tmp_path / "src.tar.zst")
+    assert tarball_location("https://mirror/", VERSION) == f"https://mirror/chromium-{VERSION}.tar.xz"
+    assert tarball_location("https://mirror/src.tar.xz", VERSION) == "https://mirror/src.tar.xz"
+
+
+def test_expected_sha256(tmp_path):
+    tarball = tmp_path / "chromium.tar.gz"
+    digest = "ab" * 32
+    assert expected_sha256(str(tarball), digest.upper()) == digest
+    with pytest.raises(ValueError, match="not a SHA-256"):
+        expected_sha256(str(tarball), "abc")
+    with pytest.raises(ValueError, match="no checksum"):
+        expected_sha256(str(tarball))
+
+    (tmp_path / "chromium.tar.gz.sha256").write_text(f"{digest}  chromium.tar.gz\n")
+    assert expected_sha256(str(tarball)) == digest
+    # Chromium's own .hashes file takes precedence
+    (tmp_path / "chromium.tar.gz.hashes").write_text(
+        f"md5  {'0' * 32}  chromium.tar.gz\nsha256  {'cd' * 32}  chromium.tar.gz\n"
+    )
+    assert expected_sha256(str(tarball)) == "cd" * 32
+
+
+def test_extract(tmp_path):
+    tarball = tmp_path / "chromium.tar.gz"
+    sha256 = _tarball(tarball, {"BUILD.gn": b"group()\n", "chrome/app.cc": b"int main;\n"})
+    dest = tmp_path / "src"
+    size, _ = extract_tarball(str(tarball), dest, sha256)
+    assert size == tarball.stat().st_size
+    assert (dest / "BUILD.gn").read_bytes() == b"group()\n"
+    assert (dest / "chrome" / "app.cc").exists()
+    assert not (tmp_path / "src.partial").exists()
+
+
+def test_checksum_mismatch_leaves_nothing(tmp_path):
+    tarball = tmp_path / "chromium.tar.gz"
+    _tarball(tarball, {"BUILD.gn": b"group()\n"})
+    dest = tmp_path / "src"
+    with pytest.raises(ValueError, match="checksum mismatch"):
+        extract_tarball(str(tarball), dest, "0" * 64)
+    assert not dest.exists() and not (tmp_path / "src.partial").exists()
+
+
+def test_truncated_tarball_fails(tmp_path):
+    tarball = tmp_path / "chromium.tar.gz"
+    _tarball(tarball, {"BUILD.gn": bytes(range(256)) * 4096})
+    tarball.write_bytes(tarball.read_bytes()[:-200])
+    dest = tmp_path / "src"
+    with pytest.raises(ValueError, match="could not unpack"):
+        extract_tarball(str(tarball), dest, hashlib.sha256(tarball.read_bytes()).hexdigest())
+    assert not dest.exists() and not (tmp_path / "src.partial").exists()
+
+
+def test_unsupported_type(tmp_path):
+    with pytest.raises(ValueError, match="unsupported tarball type"):
+        extract_tarball(str(tmp_path / "chromium.zip"), tmp_path / "src", "0" * 64)
+
+
+def test_extract_from_mirror(tmp_path, mirror):
+    root, url = mirror
+    name = f"chromium-{VERSION}.tar.gz"
+    sha256 = _tarball(root / name, {"BUILD.gn": b"group()\n"})
+    (root / f"{name}.hashes").write_text(f"sha256  {sha256}  {name}\n")
+
+    location = tarball_location(url + name, VERSION)
+    assert expected_sha256(location) == sha256
+    extract_tarball(location, tmp_path / "src", sha256)
+    assert (tmp_path / "src" / "BUILD.gn").read_bytes() == b"group()\n"